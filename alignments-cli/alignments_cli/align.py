@@ -1,2 +1,22 @@
-def align():
-    return 'yes'
+import functools
+
+
+@functools.lru_cache(maxsize=4)
+def load_pipeline(model="bert", token_type="bpe", matching_methods="mai", precision="fp32"):
+    """Load a SimAlignPipeline once per configuration; torch is only imported here."""
+    from alignment_pipelines.simAlignPipeline import SimAlignPipeline
+
+    return SimAlignPipeline(model=model, token_type=token_type, matching_methods=matching_methods,
+                            precision=precision)
+
+
+def align(src_sentence, trg_sentence, model="bert", token_type="bpe", matching_methods="mai"):
+    """
+    Align two parallel sentences word by word.
+
+    :param src_sentence: Source sentence, whitespace tokenized string or list of words.
+    :param trg_sentence: Target sentence, whitespace tokenized string or list of words.
+    :return: ``{matching_method: [(source_index, target_index), ...]}``.
+    """
+    pipeline = load_pipeline(model, token_type, matching_methods)
+    return pipeline.run_batch([(src_sentence, trg_sentence)])[0]
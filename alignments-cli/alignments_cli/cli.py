@@ -0,0 +1,208 @@
+"""
+alignments: word align parallel corpora and evaluate alignments.
+
+usage: alignments align ../data/XL-WA/data/pt/test.tsv ./outputs/pt_test --model bert --matching-methods mai
+       alignments evaluate ./outputs/pt_test-simalign-bert-bpe-mwmf.tsv ../data/XL-WA/data/pt/test.tsv
+       alignments evaluate ./outputs/pt_test-simalign-bert-bpe-mwmf.tsv ../data/XL-WA/data/pt/test.tsv \
+           --compare ./outputs/pt_test-simalign-bert-bpe-itermax.tsv --bootstrap 10000
+       alignments align ../data/XL-WA/data/pt/test.tsv ./outputs/pt_links --format pharaoh
+       alignments convert ../data/XL-WA/data/pt/test.tsv ./pt_test.algn
+       alignments combine ./outputs/pt_gdf.pharaoh fwd.pharaoh rev.pharaoh --method grow-diag-final
+
+Only ``align`` loads torch and the encoder; ``evaluate``, ``convert`` and ``combine`` need NumPy alone.
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+
+from alignment_pipelines.alignment_writer import OUTPUT_FORMATS
+from alignment_pipelines.combine import METHODS
+
+
+def align_command(args):
+    from alignment_pipelines.instrumentation import Instrumentation, profile
+
+    os.makedirs(os.path.dirname(args.output_prefix) or '.', exist_ok=True)
+    instrumentation = Instrumentation() if args.stats else None
+    profiling = profile(args.profile, use_torch=args.torch_profile) if args.profile or args.torch_profile else \
+        contextlib.nullcontext()
+    if args.workers > 1:
+        from alignment_pipelines.sharded import ShardedAligner
+
+        with ShardedAligner(args.model, args.token_type, args.matching_methods, workers=args.workers,
+                            threads_per_worker=args.threads, batch_size=args.batch_size,
+                            output_format=args.format, instrumentation=instrumentation,
+                            precision=args.precision) as aligner, profiling:
+            start = time.perf_counter()
+            aligned = aligner.align_file(args.input_fp, args.output_prefix)
+    else:
+        from alignment_pipelines.corpus_driver import CorpusAlignmentDriver
+        from .align import load_pipeline
+
+        pipeline = load_pipeline(args.model, args.token_type, args.matching_methods, args.precision)
+        if instrumentation is not None:
+            pipeline.instrumentation = instrumentation
+        driver = CorpusAlignmentDriver(pipeline, batch_size=args.batch_size, output_format=args.format)
+        with profiling:
+            start = time.perf_counter()
+            aligned = driver.align_file(args.input_fp, args.output_prefix)
+    elapsed = time.perf_counter() - start
+    print(f"{aligned} pairs aligned in {elapsed:.2f}s", file=sys.stderr)
+    if instrumentation is not None:
+        print(instrumentation.report(), file=sys.stderr)
+
+
+def evaluate_command(args):
+    from alignment_pipelines.calculate_metrics import StreamingAlignmentMetrics
+
+    metrics = StreamingAlignmentMetrics(args.predicted_fp, args.reference_fp, chunk_size=args.chunk_size,
+                                        strict=not args.lenient)
+    names = ("precision", "recall", "f1_score", "aer")
+    if args.compare:
+        other = StreamingAlignmentMetrics(args.compare, args.reference_fp, chunk_size=args.chunk_size,
+                                          strict=not args.lenient)
+        comparison = metrics.compare(other, n_resamples=args.bootstrap or 1000, confidence=args.confidence,
+                                     seed=args.seed)
+        if args.json:
+            print(json.dumps(comparison, indent=2))
+            return
+        print(f"A = {args.predicted_fp}\nB = {args.compare}\n"
+              f"paired bootstrap, {args.bootstrap or 1000} resamples, {args.confidence:.0%} intervals of B - A")
+        print(f"{'':18}{'A':>9}{'B':>9}{'B - A':>9}{'low':>9}{'high':>9}{'p':>8}")
+        for average in ("micro", "macro"):
+            for name in names:
+                row = comparison[f"{average}_average"][name]
+                print(f"{average + ' ' + name:18}{row['a']:9.4f}{row['b']:9.4f}{row['difference']:+9.4f}"
+                      f"{row['low']:+9.4f}{row['high']:+9.4f}{row['p_value']:8.4f}")
+        return
+    if args.bootstrap:
+        intervals = metrics.confidence_intervals(n_resamples=args.bootstrap, confidence=args.confidence,
+                                                 seed=args.seed)
+        if args.json:
+            print(json.dumps(intervals, indent=2))
+            return
+        print(f"{'':8}" + "".join(f"{name:>22}" for name in names))
+        for average in ("micro", "macro"):
+            scores = intervals[f"{average}_average"]
+            print(f"{average:8}" + "".join(f"{scores[name]['estimate']:8.4f} [{scores[name]['low']:.4f},"
+                                           f"{scores[name]['high']:.4f}]" for name in names))
+        return
+
+    metrics = metrics.evaluate()
+    if args.json:
+        print(json.dumps(metrics, indent=2))
+        return
+    print(f"{'':8}{'precision':>10}{'recall':>10}{'f1':>10}{'aer':>10}")
+    for average in ("micro", "macro"):
+        scores = metrics[f"{average}_average"]
+        print(f"{average:8}" + "".join(f"{scores[name]:10.4f}" for name in names))
+
+
+def convert_command(args):
+    from alignment_pipelines import alignment_corpus
+
+    if alignment_corpus.is_alignment_corpus(args.input_fp):
+        corpus = alignment_corpus.AlignmentCorpus(args.input_fp)
+        with open(args.output_fp, 'w') as outf:
+            for i in range(len(corpus)):
+                links = corpus.sentence_links(i).tolist()
+                if corpus.sure is not None:
+                    sure = corpus.sure[corpus.offsets[i]:corpus.offsets[i + 1]]
+                    outf.write(" ".join(f"{s}{'-' if is_sure else 'p'}{t}" for (s, t), is_sure in zip(links, sure)))
+                else:
+                    outf.write(" ".join(f"{s}-{t}" for s, t in links))
+                outf.write("\n")
+    elif args.input_fp.endswith(".tsv"):
+        alignment_corpus.convert_xlwa_tsv(args.input_fp, args.output_fp)
+    else:
+        alignment_corpus.convert_pharaoh(args.input_fp, args.output_fp)
+
+
+def combine_command(args):
+    from alignment_pipelines.combine import combine_files
+
+    written = combine_files(args.input_fps, args.output_fp, args.method, args.min_votes, args.chunk_size)
+    print(f"{written} sentence pairs combined with {args.method}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="alignments", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="log progress, twice to also log every aligned pair")
+    parser.add_argument("--log-json", action="store_true", help="log JSON lines")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    align_parser = subparsers.add_parser(
+            "align", help="align every pair of an XL-WA TSV or 'src ||| trg' file",
+            description="Writes {output_prefix}-simalign-{model}-{token_type}-{method}.{format} per matching "
+                        "method; interrupted runs resume from their checkpoint.")
+    align_parser.add_argument("input_fp")
+    align_parser.add_argument("output_prefix")
+    align_parser.add_argument("--model", default="bert")
+    align_parser.add_argument("--token-type", default="bpe")
+    align_parser.add_argument("--matching-methods", default="mai")
+    align_parser.add_argument("--batch-size", type=int, default=32)
+    align_parser.add_argument("--format", choices=OUTPUT_FORMATS, default="tsv",
+                              help="'src\\ttrg\\talignments' rows, or Pharaoh alignment lines only")
+    align_parser.add_argument("--workers", type=int, default=1, help="worker processes, each loading the model")
+    align_parser.add_argument("--threads", type=int, default=None, help="torch threads per worker")
+    align_parser.add_argument("--precision", choices=("fp32", "bf16", "int8"), default="fp32",
+                              help="encoder inference backend, see benchmarks/inference_modes.py")
+    align_parser.add_argument("--stats", action="store_true", help="report time per stage and counters")
+    align_parser.add_argument("--profile", default=None, metavar="FILE", help="save a cProfile dump")
+    align_parser.add_argument("--torch-profile", action="store_true",
+                              help="use torch.profiler, --profile then saves a chrome trace")
+    align_parser.set_defaults(handler=align_command)
+
+    evaluate_parser = subparsers.add_parser(
+            "evaluate", help="precision, recall, F1 and AER of predicted against reference alignments")
+    evaluate_parser.add_argument("predicted_fp", help="Pharaoh, TSV output of align or .algn file")
+    evaluate_parser.add_argument("reference_fp",
+                                 help="Pharaoh, XL-WA TSV or .algn file, 'p' or '?' marks possible links")
+    evaluate_parser.add_argument("--chunk-size", type=int, default=10000)
+    evaluate_parser.add_argument("--lenient", action="store_true",
+                                 help="warn instead of failing when the files have different numbers of lines")
+    evaluate_parser.add_argument("--json", action="store_true")
+    evaluate_parser.add_argument("--bootstrap", type=int, default=0, metavar="N",
+                                 help="report bootstrap confidence intervals from N resamples")
+    evaluate_parser.add_argument("--compare", default=None, metavar="PREDICTED_FP",
+                                 help="paired bootstrap test of a second system against the same reference")
+    evaluate_parser.add_argument("--confidence", type=float, default=0.95)
+    evaluate_parser.add_argument("--seed", type=int, default=None, help="seed of the bootstrap resampling")
+    evaluate_parser.set_defaults(handler=evaluate_command)
+
+    convert_parser = subparsers.add_parser(
+            "convert", help="convert Pharaoh or XL-WA TSV files to .algn, or .algn back to Pharaoh")
+    convert_parser.add_argument("input_fp")
+    convert_parser.add_argument("output_fp")
+    convert_parser.set_defaults(handler=convert_command)
+
+    combine_parser = subparsers.add_parser(
+            "combine", help="symmetrize or ensemble several alignments of the same corpus",
+            description="grow-diag* symmetrize two directional alignments (e.g. SimAlign fwd and rev); "
+                        "intersection, union and vote combine any number of matching methods or aligners.")
+    combine_parser.add_argument("output_fp", help="Pharaoh output, or .algn")
+    combine_parser.add_argument("input_fps", nargs="+", help="Pharaoh, XL-WA TSV or .algn alignments")
+    combine_parser.add_argument("--method", default="intersection", choices=METHODS)
+    combine_parser.add_argument("--min-votes", type=int, default=None, help="for --method vote, a majority by default")
+    combine_parser.add_argument("--chunk-size", type=int, default=10000)
+    combine_parser.set_defaults(handler=combine_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.verbose or args.log_json:
+        from alignment_pipelines.instrumentation import configure_logging
+
+        configure_logging(logging.DEBUG if args.verbose > 1 else logging.INFO, structured=args.log_json)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
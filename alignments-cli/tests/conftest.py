@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture
+def write_lines(tmp_path):
+    """Write ``lines`` to ``file_name`` in the test's tmp_path, one per line, and return its path as a string."""
+    def write(file_name, lines):
+        file_path = tmp_path / file_name
+        with open(file_path, 'w') as outf:
+            outf.writelines(f"{line}\n" for line in lines)
+        return str(file_path)
+    return write
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory):
+    """A randomly initialized 8-layer BERT saved like a pretrained model, small enough to align with in tests."""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    model_dir = tmp_path_factory.mktemp("tinybert")
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["the", "cat", "sat", "on", "mat", "o", "gato", "sentou", "no", "tapete"]
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *letters, *(f"##{letter}" for letter in letters), *words]
+    (model_dir / "vocab.txt").write_text("\n".join(vocab) + "\n")
+    transformers.BertTokenizer(str(model_dir / "vocab.txt"), do_lower_case=False).save_pretrained(model_dir)
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=8,
+                                     num_attention_heads=2, intermediate_size=64)
+    transformers.BertModel(config).save_pretrained(model_dir)
+    return str(model_dir)
@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+from alignments_cli.cli import build_parser, main
+
+XLWA = ["the cat sat on the mat\to gato sentou no tapete\t0-0 1-1 2-2 3-3 5-4",
+        "cats sat\tgatos sentou\t0-0 1-1",
+        "mat\ttapete\t0-0"]
+
+
+def test_evaluate(capsys, write_lines):
+    reference_fp = write_lines("gold.pharaoh", ["0-0 1-1 2p2", "0-0", "1-0"])
+    predicted_fp = write_lines("predicted.pharaoh", ["0-0 1-1", "0-0", "0-0"])
+    main(["evaluate", predicted_fp, reference_fp, "--json"])
+    scores = json.loads(capsys.readouterr().out)
+    assert scores["micro_average"]["precision"] == pytest.approx(3 / 4)
+    assert scores["micro_average"]["recall"] == pytest.approx(3 / 4)
+
+    main(["evaluate", predicted_fp, reference_fp])
+    table = capsys.readouterr().out.splitlines()
+    assert table[1].split()[0] == "micro" and float(table[1].split()[1]) == pytest.approx(0.75)
+
+    with pytest.raises(ValueError):
+        main(["evaluate", write_lines("short.pharaoh", ["0-0"]), reference_fp])
+
+
+def test_align(tmp_path, capsys, write_lines, tiny_model):
+    input_fp = write_lines("test.tsv", XLWA)
+    output_prefix = str(tmp_path / "outputs" / "test")
+    main(["align", input_fp, output_prefix, "--model", tiny_model, "--format", "pharaoh", "--batch-size", "2"])
+    assert f"{len(XLWA)} pairs aligned" in capsys.readouterr().err
+
+    model = os.path.basename(tiny_model)
+    assert sorted(os.listdir(tmp_path / "outputs")) == [*(f"test-simalign-{model}-bpe-{method}.pharaoh"
+                                                          for method in ("inter", "itermax", "mwmf")),
+                                                        "test.checkpoint"]
+    predicted_fp = f"{output_prefix}-simalign-{model}-bpe-mwmf.pharaoh"
+    with open(predicted_fp) as predictions:
+        lines = predictions.read().splitlines()
+    assert len(lines) == len(XLWA) and all(lines)
+
+    main(["evaluate", predicted_fp, input_fp, "--json"])
+    assert 0.0 <= json.loads(capsys.readouterr().out)["micro_average"]["f1_score"] <= 1.0
+
+
+def test_unknown_format():
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(["align", "in.tsv", "out", "--format", "csv"])
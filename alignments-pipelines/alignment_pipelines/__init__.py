@@ -1,2 +1,22 @@
-# from .simAlignPipeline import SimAlignPipeline
-from .calculate_metrics import AlignmentMetrics
+from .calculate_metrics import AlignmentMetrics, StreamingAlignmentMetrics
+from .alignment_arrays import AlignmentArrays
+from .alignment_corpus import AlignmentCorpus, AlignmentCorpusWriter
+from .embedding_cache import EmbeddingCache
+from .rematch import SimilarityMatrices, SimilarityWriter
+from .instrumentation import Instrumentation, configure_logging, profile
+
+# the aligner pipelines pull in torch/transformers, import them on first use only
+_LAZY_PIPELINES = {
+    "SimAlignPipeline": ".simAlignPipeline",
+    "AwesomeAlignPipeline": ".awesomeAlignPipeline",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_PIPELINES:
+        import importlib
+
+        value = getattr(importlib.import_module(_LAZY_PIPELINES[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
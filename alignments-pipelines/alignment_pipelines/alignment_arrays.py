@@ -0,0 +1,201 @@
+import numpy as np
+
+# links are packed as  sentence_id << 32 | source_index << 16 | target_index
+INDEX_BITS = 16
+SENTENCE_SHIFT = 2 * INDEX_BITS
+MAX_INDEX = (1 << INDEX_BITS) - 1
+
+
+def unique_sorted(values, return_counts=False):
+    """
+    Sorted distinct values, like ``np.unique`` but always sort based, which is
+    several times faster than the hash-based path of recent NumPy on int64 keys.
+    """
+    values = np.sort(values)
+    first = np.empty(len(values), dtype=bool)
+    first[:1] = True
+    np.not_equal(values[1:], values[:-1], out=first[1:])
+    if not return_counts:
+        return values[first]
+    starts = np.flatnonzero(first)
+    return values[starts], np.diff(np.append(starts, len(values)))
+
+
+class AlignmentArrays:
+    """
+    Columnar representation of a corpus of word alignments.
+
+    Links of all sentence pairs are stored in two flat int32 arrays (source and
+    target word index), and ``offsets`` (int64, one entry per sentence plus one)
+    delimits the links of each sentence pair: the links of sentence ``i`` are
+    ``src[offsets[i]:offsets[i + 1]]`` and ``tgt[offsets[i]:offsets[i + 1]]``.
+
+    Gold alignments may distinguish sure links ("0-0") from possible links
+    ("0p0" or "0?0"); ``sure`` flags the sure ones. Sure links are also possible links.
+
+    Indexing or iterating yields sets of ``(source_index, target_index)`` tuples,
+    so instances can be used wherever a list of alignment sets is expected.
+    """
+
+    def __init__(self, src, tgt, offsets, sure=None):
+        """
+        :param src: Source word index of every link.
+        :param tgt: Target word index of every link.
+        :param offsets: Start of the links of every sentence pair, plus the total number of links.
+        :param sure: Whether each link is sure, all links are sure if not given.
+        """
+        self.src = np.asarray(src, dtype=np.int32)
+        self.tgt = np.asarray(tgt, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.sure = np.ones(len(self.src), dtype=bool) if sure is None else np.asarray(sure, dtype=bool)
+        if self.src.shape != self.tgt.shape or self.src.shape != self.sure.shape or self.offsets[-1] != len(self.src):
+            raise ValueError("src, tgt, sure and offsets describe different numbers of links.")
+
+    @classmethod
+    def from_lines(cls, lines):
+        """
+        Parse Pharaoh alignment lines ("0-0 1-1 2p2", one sentence pair per line).
+
+        :param lines: List of alignment strings.
+        :return: AlignmentArrays with one sentence per line.
+        """
+        text = ' '.join(lines)
+        sure = None
+        if 'p' in text or '?' in text:
+            sure = np.fromiter(('-' in link for link in text.split()), dtype=bool)
+            counts = np.fromiter((line.count('-') + line.count('p') + line.count('?') for line in lines),
+                                 dtype=np.int64, count=len(lines))
+            text = text.replace('p', ' ').replace('?', ' ')
+        else:
+            counts = np.fromiter((line.count('-') for line in lines), dtype=np.int64, count=len(lines))
+        values = np.fromstring(text.replace('-', ' '), dtype=np.int64, sep=' ')
+        if values.size != 2 * counts.sum() or (sure is not None and sure.size != counts.sum()):
+            raise ValueError("Alignment lines should only contain 'source_index-target_index' "
+                             "or 'source_index' 'p' 'target_index' pairs.")
+        offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(values[0::2], values[1::2], offsets, sure)
+
+    @classmethod
+    def from_file(cls, file_path):
+        """
+        Load a Pharaoh alignment file, one sentence pair per line.
+
+        :param file_path: Path to the alignment file.
+        :return: AlignmentArrays with one sentence per line of the file.
+        """
+        with open(file_path, 'r') as file:
+            lines = file.read().split('\n')
+        if lines[-1] == '':
+            lines.pop()
+        return cls.from_lines(lines)
+
+    @classmethod
+    def from_sets(cls, alignments):
+        """
+        Build from an iterable of alignment sets (or lists) of ``(source_index, target_index)``.
+
+        :param alignments: One collection of links per sentence pair.
+        :return: AlignmentArrays with the same links.
+        """
+        alignments = [sorted(alignment) for alignment in alignments]
+        counts = np.fromiter((len(alignment) for alignment in alignments), dtype=np.int64, count=len(alignments))
+        offsets = np.zeros(len(alignments) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        links = np.array([link for alignment in alignments for link in alignment], dtype=np.int32).reshape(-1, 2)
+        return cls(links[:, 0], links[:, 1], offsets)
+
+    @classmethod
+    def from_keys(cls, keys, n_sentences):
+        """
+        Build from sorted int64 link keys (``sentence_id << 32 | source_index << 16 | target_index``),
+        the inverse of ``keys()``.
+
+        :param keys: Sorted link keys.
+        :param n_sentences: Number of sentence pairs, including those without links.
+        :return: AlignmentArrays with every link sure.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        offsets = np.searchsorted(keys >> SENTENCE_SHIFT, np.arange(n_sentences + 1, dtype=np.int64))
+        return cls(keys >> INDEX_BITS & MAX_INDEX, keys & MAX_INDEX, offsets)
+
+    def to_lines(self):
+        """Pharaoh line of every sentence pair, possible links written as "0p0"."""
+        separators = np.where(self.sure, '-', 'p').tolist()
+        links = [f"{s}{separator}{t}" for s, separator, t in zip(self.src.tolist(), separators, self.tgt.tolist())]
+        offsets = self.offsets.tolist()
+        return [' '.join(links[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("sentence index out of range")
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return set(zip(self.src[start:end].tolist(), self.tgt[start:end].tolist()))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self):
+        return self.src.nbytes + self.tgt.nbytes + self.offsets.nbytes + self.sure.nbytes
+
+    def sentence_ids(self):
+        """Sentence index of every link."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def link_keys(self):
+        """
+        Encode every link as a single int64 (``source_index << 16 | target_index``),
+        ignoring the sentence it belongs to.
+        """
+        if len(self.src) and max(self.src.max(), self.tgt.max()) > MAX_INDEX:
+            raise ValueError(f"Word indices above {MAX_INDEX} cannot be packed into link keys.")
+        return self.src.astype(np.int64) << INDEX_BITS | self.tgt.astype(np.int64)
+
+    def keys(self, sure_only=False):
+        """
+        Sorted, deduplicated int64 keys (``sentence_id << 32 | source_index << 16 | target_index``)
+        of every link in the corpus.
+
+        :param sure_only: Only keep the sure links.
+        """
+        keys = self.sentence_ids() << SENTENCE_SHIFT | self.link_keys()
+        return unique_sorted(keys[self.sure] if sure_only else keys)
+
+
+def sentence_counts(predicted, reference):
+    """
+    Count, for every sentence pair, the predicted links that are sure reference links,
+    the predicted links that are possible reference links (sure links included), the
+    distinct predicted links and the distinct sure reference links.
+
+    Like ``zip``, only the first ``min(len(predicted), len(reference))`` sentences are counted.
+
+    :param predicted: AlignmentArrays of predicted alignments.
+    :param reference: AlignmentArrays of reference alignments.
+    :return: Tuple of int64 arrays (sure_hits, possible_hits, n_predicted, n_sure).
+    """
+    n_sentences = min(len(predicted), len(reference))
+
+    def truncated(keys):
+        return keys[keys >> SENTENCE_SHIFT < n_sentences]
+
+    predicted_keys = truncated(predicted.keys())
+    possible_keys = truncated(reference.keys())
+    predicted_ids = predicted_keys >> SENTENCE_SHIFT
+    possible_hits = np.isin(predicted_keys, possible_keys, assume_unique=True)
+    if reference.sure.all():
+        sure_keys, sure_hits = possible_keys, possible_hits
+    else:
+        sure_keys = truncated(reference.keys(sure_only=True))
+        sure_hits = np.isin(predicted_keys, sure_keys, assume_unique=True)
+    return (np.bincount(predicted_ids[sure_hits], minlength=n_sentences),
+            np.bincount(predicted_ids[possible_hits], minlength=n_sentences),
+            np.bincount(predicted_ids, minlength=n_sentences),
+            np.bincount(sure_keys >> SENTENCE_SHIFT, minlength=n_sentences))
@@ -0,0 +1,298 @@
+"""
+Compact binary container for word alignment corpora (``.algn`` files).
+
+Layout, all integers little-endian::
+
+    header        magic b"ALGN", version (u16), flags (u16),
+                  n_sentences (u64), n_links (u64), n_text_bytes (u64)
+    offsets       u64[n_sentences + 1]   first link of every sentence pair
+    links         u16[n_links, 2]        (source_index, target_index)
+    sure          u8[n_links]            only with FLAG_SURE, 0 for possible links
+    text_offsets  u64[2 * n_sentences + 1]  only with FLAG_TEXT
+    text          utf-8 bytes            source and target sentence of every pair
+
+AlignmentCorpus memory-maps a file and reads any sentence pair in O(1)
+without loading the rest; AlignmentCorpusWriter builds one incrementally.
+"""
+import itertools
+import os
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from .alignment_arrays import AlignmentArrays
+
+MAGIC = b'ALGN'
+VERSION = 1
+FLAG_SURE = 1
+FLAG_TEXT = 2
+HEADER = struct.Struct('<4sHHQQQ')
+MAX_INDEX = np.iinfo(np.uint16).max
+EXTENSION = '.algn'
+
+
+def is_alignment_corpus(file_path):
+    """Whether ``file_path`` is a binary alignment corpus rather than a text file."""
+    with open(file_path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+class AlignmentCorpus:
+    """
+    Read-only, memory-mapped view of a binary alignment corpus.
+
+    Like AlignmentArrays, indexing or iterating yields sets of
+    ``(source_index, target_index)`` tuples.
+    """
+
+    def __init__(self, file_path):
+        """
+        :param file_path: Path to an ``.algn`` file.
+        """
+        self.file_path = file_path
+        with open(file_path, 'rb') as file:
+            magic, version, self.flags, n_sentences, n_links, n_text_bytes = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{file_path} is not a binary alignment corpus.")
+        if version != VERSION:
+            raise ValueError(f"{file_path} has unsupported format version {version}.")
+
+        position = HEADER.size
+
+        def section(dtype, shape):
+            nonlocal position
+            count = int(np.prod(shape))
+            array = np.memmap(file_path, dtype=dtype, mode='r', offset=position, shape=shape) if count else \
+                np.zeros(shape, dtype=dtype)
+            position += count * np.dtype(dtype).itemsize
+            return array
+
+        self.offsets = section('<u8', (n_sentences + 1,))
+        self.links = section('<u2', (n_links, 2))
+        self.sure = section('u1', (n_links,)) if self.flags & FLAG_SURE else None
+        self.text_offsets = self.text = None
+        if self.flags & FLAG_TEXT:
+            self.text_offsets = section('<u8', (2 * n_sentences + 1,))
+            self.text = section('u1', (n_text_bytes,))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def sentence_links(self, i):
+        """Links of sentence pair ``i`` as a (n_links, 2) uint16 array view."""
+        return self.links[self.offsets[i]:self.offsets[i + 1]]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("sentence index out of range")
+        return set(map(tuple, self.sentence_links(i).tolist()))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def has_text(self):
+        return self.text is not None
+
+    def sentence_text(self, i):
+        """Source and target sentence of pair ``i`` as strings."""
+        if not self.has_text:
+            raise ValueError(f"{self.file_path} holds no sentence text.")
+        start, middle, end = self.text_offsets[2 * i:2 * i + 3]
+        return bytes(self.text[start:middle]).decode('utf-8'), bytes(self.text[middle:end]).decode('utf-8')
+
+    def sentence_pairs(self):
+        """Yield the (source words, target words) of every pair, e.g. to feed an aligner."""
+        for i in range(len(self)):
+            src, tgt = self.sentence_text(i)
+            yield src.split(' ') if src else [], tgt.split(' ') if tgt else []
+
+    def to_arrays(self, start=0, stop=None):
+        """
+        Copy sentence pairs ``start`` to ``stop`` into AlignmentArrays for the metrics engine.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        first, last = int(self.offsets[start]), int(self.offsets[stop])
+        links = np.asarray(self.links[first:last])
+        sure = None if self.sure is None else np.asarray(self.sure[first:last]).astype(bool)
+        offsets = np.asarray(self.offsets[start:stop + 1], dtype=np.int64) - first
+        return AlignmentArrays(links[:, 0], links[:, 1], offsets, sure)
+
+    def iter_chunks(self, chunk_size):
+        """Yield AlignmentArrays of up to ``chunk_size`` consecutive sentence pairs."""
+        for start in range(0, len(self), chunk_size):
+            yield self.to_arrays(start, start + chunk_size)
+
+
+class AlignmentCorpusWriter:
+    """
+    Write a binary alignment corpus one sentence pair at a time.
+
+    Links and text are spooled to temporary files next to the output and
+    assembled on ``close()``, so only the offsets are kept in memory; the
+    output file only appears once it is complete.
+    """
+
+    def __init__(self, file_path, with_text=False):
+        """
+        :param file_path: Path of the ``.algn`` file to write.
+        :param with_text: Whether every pair comes with its source and target sentence.
+        """
+        self.file_path = file_path
+        self.with_text = with_text
+        directory = os.path.dirname(os.path.abspath(file_path))
+        self._links = tempfile.TemporaryFile(dir=directory)
+        self._sure = tempfile.TemporaryFile(dir=directory)
+        self._text = tempfile.TemporaryFile(dir=directory) if with_text else None
+        self.offsets = [0]
+        self.text_offsets = [0]
+        self.has_possible = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def write(self, links, sure=None, src=None, tgt=None):
+        """
+        Append one sentence pair.
+
+        :param links: Iterable of (source_index, target_index).
+        :param sure: Whether each link is sure, all links are sure if not given.
+        :param src: Source sentence (string or list of words), required ``with_text``.
+        :param tgt: Target sentence (string or list of words), required ``with_text``.
+        """
+        links = np.asarray(list(links), dtype=np.int64).reshape(-1, 2)
+        if len(links) and (links.min() < 0 or links.max() > MAX_INDEX):
+            raise ValueError(f"Word indices must be between 0 and {MAX_INDEX}.")
+        self._links.write(links.astype('<u2').tobytes())
+        sure = np.ones(len(links), dtype=bool) if sure is None else np.asarray(sure, dtype=bool)
+        self.has_possible = self.has_possible or not sure.all()
+        self._sure.write(sure.astype('u1').tobytes())
+        self.offsets.append(self.offsets[-1] + len(links))
+
+        if self.with_text:
+            if src is None or tgt is None:
+                raise ValueError("src and tgt are required when writing a corpus with text.")
+            for sentence in (src, tgt):
+                encoded = (sentence if isinstance(sentence, str) else ' '.join(sentence)).encode('utf-8')
+                self._text.write(encoded)
+                self.text_offsets.append(self.text_offsets[-1] + len(encoded))
+
+    def write_arrays(self, alignments):
+        """Append every sentence pair of an AlignmentArrays (for corpora without text)."""
+        if self.with_text:
+            raise ValueError("write() each pair with its text when writing a corpus with text.")
+        links = np.stack([alignments.src, alignments.tgt], axis=1)
+        if len(links) and (links.min() < 0 or links.max() > MAX_INDEX):
+            raise ValueError(f"Word indices must be between 0 and {MAX_INDEX}.")
+        self._links.write(links.astype('<u2').tobytes())
+        self._sure.write(alignments.sure.astype('u1').tobytes())
+        self.has_possible = self.has_possible or not alignments.sure.all()
+        self.offsets.extend((alignments.offsets[1:] + self.offsets[-1]).tolist())
+
+    def close(self):
+        """Assemble the spooled sections into ``file_path``."""
+        flags = (FLAG_SURE if self.has_possible else 0) | (FLAG_TEXT if self.with_text else 0)
+        n_text_bytes = self.text_offsets[-1] if self.with_text else 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.file_path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as outf:
+                outf.write(HEADER.pack(MAGIC, VERSION, flags, len(self.offsets) - 1, self.offsets[-1], n_text_bytes))
+                outf.write(np.asarray(self.offsets, dtype='<u8').tobytes())
+                spooled = [self._links] + ([self._sure] if self.has_possible else [])
+                if self.with_text:
+                    spooled.append(np.asarray(self.text_offsets, dtype='<u8'))
+                    spooled.append(self._text)
+                for section in spooled:
+                    if isinstance(section, np.ndarray):
+                        outf.write(section.tobytes())
+                        continue
+                    section.seek(0)
+                    while chunk := section.read(1 << 20):
+                        outf.write(chunk)
+            os.replace(tmp_path, self.file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        finally:
+            self._discard()
+
+    def _discard(self):
+        for spool in (self._links, self._sure, self._text):
+            if spool is not None:
+                spool.close()
+
+
+def load_alignment_file(file_path):
+    """Load a Pharaoh text file, an XL-WA TSV (alignment column) or a binary alignment corpus as AlignmentArrays."""
+    if is_alignment_corpus(file_path):
+        return AlignmentCorpus(file_path).to_arrays()
+    if _is_tsv(file_path):
+        # the whole file as one chunk
+        return next(_iter_tsv_chunks(file_path, sys.maxsize), AlignmentArrays([], [], [0]))
+    return AlignmentArrays.from_file(file_path)
+
+
+def _is_tsv(file_path):
+    with open(file_path, 'r') as file:
+        return '\t' in file.readline()
+
+
+def _iter_tsv_chunks(file_path, chunk_size):
+    from .corpus_reader import iter_chunks  # corpus_reader reads .algn files through this module
+
+    for chunk in iter_chunks(file_path, chunk_size, file_format="xlwa"):
+        if chunk.alignments is None:
+            raise ValueError(f"{file_path} has no alignment column.")
+        yield chunk.alignments
+
+
+def iter_alignment_chunks(file_path, chunk_size):
+    """
+    Yield AlignmentArrays of up to ``chunk_size`` sentence pairs of a Pharaoh file,
+    an XL-WA TSV (gold or aligner output, read from its alignment column) or a binary file.
+    """
+    if is_alignment_corpus(file_path):
+        yield from AlignmentCorpus(file_path).iter_chunks(chunk_size)
+        return
+    if _is_tsv(file_path):
+        yield from _iter_tsv_chunks(file_path, chunk_size)
+        return
+    with open(file_path, 'r') as file:
+        while True:
+            lines = [line.rstrip('\n') for line in itertools.islice(file, chunk_size)]
+            if not lines:
+                break
+            yield AlignmentArrays.from_lines(lines)
+
+
+def convert_pharaoh(pharaoh_fp, output_fp):
+    """Convert a Pharaoh alignment file ("0-0 1-1 2p2" lines) to a binary alignment corpus."""
+    with AlignmentCorpusWriter(output_fp) as writer:
+        for alignments in iter_alignment_chunks(pharaoh_fp, 10000):
+            writer.write_arrays(alignments)
+
+
+def convert_xlwa_tsv(tsv_fp, output_fp):
+    """Convert an XL-WA TSV ("src\\ttgt\\tgold" lines) to a binary alignment corpus with text."""
+    from .corpus_reader import iter_chunks  # corpus_reader reads .algn files through this module
+
+    with AlignmentCorpusWriter(output_fp, with_text=True) as writer:
+        for chunk in iter_chunks(tsv_fp, 10000, file_format="xlwa"):
+            if chunk.alignments is None:
+                raise ValueError(f"{tsv_fp} has no gold alignment column.")
+            gold = chunk.alignments
+            for k in range(len(chunk)):
+                start, end = gold.offsets[k], gold.offsets[k + 1]
+                writer.write(np.stack([gold.src[start:end], gold.tgt[start:end]], axis=1), gold.sure[start:end],
+                             chunk.src_text(k), chunk.trg_text(k))
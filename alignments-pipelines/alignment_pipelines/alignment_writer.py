@@ -0,0 +1,146 @@
+"""
+Stream the alignments of a corpus into one output file per configuration.
+
+Aligners return one ``{matching_method: links}`` dict per sentence pair;
+AlignmentWriter fans every pair out to the file of each
+(tool, model, token_type, matching_method) as soon as it is aligned, one row
+per pair in input order, so the outputs stay line-aligned with the gold file
+and nothing but the file buffers is held in memory.
+
+Rows go to ``<output>.tmp`` files that are renamed into place by ``close()``;
+an interrupted run never leaves a truncated file under the final name.
+"""
+import os
+
+OUTPUT_FORMATS = ("tsv", "pharaoh")
+
+
+def model_id(tool_name, model, token_type, matching_method):
+    """Output id of a configuration, e.g. "simalign-bert-bpe-mwmf"."""
+    model = os.path.basename(str(model).rstrip(os.sep))  # model may be a local path
+    return f"{tool_name}-{model}-{token_type}-{matching_method}"
+
+
+class AlignmentWriter:
+    '''
+        Given an output prefix and a model configuration
+        open one buffered sink per matching method
+        append every aligned pair to each sink in input order
+        and move the finished files into place atomically
+    '''
+    def __init__(self, output_prefix, tool_name, model, token_type, output_format="tsv", matching_methods=None,
+                 sizes=None, buffer_size=1 << 20):
+        """
+        Args:
+            output_prefix (str): outputs are ``{output_prefix}-{tool}-{model}-{token_type}-{method}.{format}``.
+            tool_name (str): first part of the output model ids, e.g. "simalign".
+            model (str): model name or path.
+            token_type (str): "bpe" or "word".
+            output_format (str): "tsv" for ``src\\ttrg\\talignments`` rows, "pharaoh" for alignments only.
+            matching_methods (iterable): sinks to open right away, so they exist even for an empty corpus;
+                others are opened on their first pair.
+            sizes (dict): bytes to keep of each ``.tmp`` file of an interrupted run, see ``flush()``;
+                the files are started afresh if not given. A ``ValueError`` is raised for a method
+                missing from ``sizes`` or a ``.tmp`` file shorter than its recorded size.
+            buffer_size (int): write buffer of every sink, in bytes.
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"'output_format' must be one of {OUTPUT_FORMATS}.")
+        self.output_prefix = output_prefix
+        self.tool_name = tool_name
+        self.model = model
+        self.token_type = token_type
+        self.output_format = output_format
+        self.sizes = sizes
+        self.buffer_size = buffer_size
+        self.sinks = {}
+        try:
+            for matching_method in matching_methods or ():
+                self.sink(matching_method)
+        except BaseException:
+            self.abort(discard=False)
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def output_fp(self, matching_method):
+        extension = "pharaoh" if self.output_format == "pharaoh" else "tsv"
+        return f"{self.output_prefix}-{model_id(self.tool_name, self.model, self.token_type, matching_method)}" \
+               f".{extension}"
+
+    def sink(self, matching_method):
+        """Open file of ``matching_method``, created (or resumed from ``sizes``) on first use."""
+        if matching_method not in self.sinks:
+            tmp_fp = f"{self.output_fp(matching_method)}.tmp"
+            if self.sizes is None:
+                outf = open(tmp_fp, 'w', buffering=self.buffer_size)
+            else:
+                size = self.sizes.get(matching_method)
+                if size is None or not os.path.exists(tmp_fp) or os.path.getsize(tmp_fp) < size:
+                    # the rows before the checkpoint are lost, resuming would misalign the output
+                    raise ValueError(f"{tmp_fp} does not hold the rows recorded in the checkpoint.")
+                outf = open(tmp_fp, 'a+', buffering=self.buffer_size)
+                outf.truncate(size)
+                outf.seek(0, os.SEEK_END)
+            self.sinks[matching_method] = outf
+        return self.sinks[matching_method]
+
+    def write(self, alignments, src=None, trg=None):
+        """
+        Append one sentence pair to every sink.
+
+        Args:
+            alignments (dict): ``{matching_method: [(source_index, target_index), ...]}``.
+            src: source sentence, string or list of words; required for "tsv".
+            trg: target sentence, string or list of words; required for "tsv".
+        """
+        if self.output_format == "tsv":
+            if src is None or trg is None:
+                raise ValueError("src and trg are required for tsv outputs.")
+            src = src if isinstance(src, str) else " ".join(src)
+            trg = trg if isinstance(trg, str) else " ".join(trg)
+        for matching_method, links in alignments.items():
+            alignments_str = " ".join(f"{sIdx}-{tIdx}" for sIdx, tIdx in links)
+            if self.output_format == "tsv":
+                self.sink(matching_method).write(f"{src}\t{trg}\t{alignments_str}\n")
+            else:
+                self.sink(matching_method).write(f"{alignments_str}\n")
+
+    def flush(self):
+        """
+        Flush and fsync every sink, e.g. before recording a checkpoint.
+
+        Returns:
+            dict: bytes written so far per matching method, the ``sizes`` to resume from.
+        """
+        for outf in self.sinks.values():
+            outf.flush()
+            os.fsync(outf.fileno())
+        return {matching_method: outf.tell() for matching_method, outf in self.sinks.items()}
+
+    def close(self):
+        """Close every sink and rename it to its final name."""
+        for matching_method, outf in self.sinks.items():
+            outf.close()
+            os.replace(outf.name, self.output_fp(matching_method))
+        self.sinks = {}
+
+    def abort(self, discard=True):
+        """
+        Close every sink without finalizing it.
+
+        Args:
+            discard (bool): delete the ``.tmp`` files; keep them to resume from a checkpoint.
+        """
+        for outf in self.sinks.values():
+            outf.close()
+            if discard:
+                os.remove(outf.name)
+        self.sinks = {}
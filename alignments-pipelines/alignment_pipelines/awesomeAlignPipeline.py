@@ -1,62 +1,187 @@
-impot torch
+import itertools
+import sys
+
+import torch
 import transformers
-import itertool
+
+from .alignment_corpus import EXTENSION, AlignmentCorpusWriter
+from .corpus_reader import read_sentence_pairs
+from .embedding_cache import EmbeddingCache
+from .instrumentation import NULL_INSTRUMENTATION
+from .encoding import WindowedEncoder
+from .inference import prepare_encoder
+from .tokenization import SubwordTokenizer, pad_sub2word
+
 
 class AwesomeAlignPipeline:
-    def __init__(self, sentences_fp):
-        sentences_fp = sentences_fp
-
-    def run(self):
-        model = transformers.BertModel.from_pretrained('bert-base-multilingual-cased')
-        tokenizer = transformers.BertTokenizer.from_pretrained('bert-base-multilingual-cased')
-
-        src = 'awesome-align is awesome !'
-        tgt = '牛对齐 是 牛 ！'
-
-        # pre-processing
-        sent_src, sent_tgt = src.strip().split(), tgt.strip().split()
-        token_src, token_tgt = [tokenizer.tokenize(word) for word in sent_src], [tokenizer.tokenize(word) for word in sent_tgt]
-        wid_src, wid_tgt = [tokenizer.convert_tokens_to_ids(x) for x in token_src], [tokenizer.convert_tokens_to_ids(x) for x in token_tgt]
-        ids_src, ids_tgt = tokenizer.prepare_for_model(list(itertools.chain(*wid_src)), return_tensors='pt', model_max_length=tokenizer.model_max_length, truncation=True)['input_ids'], tokenizer.prepare_for_model(list(itertools.chain(*wid_tgt)), return_tensors='pt', truncation=True, model_max_length=tokenizer.model_max_length)['input_ids']
-        sub2word_map_src = []
-        for i, word_list in enumerate(token_src):
-          sub2word_map_src += [i for x in word_list]
-        sub2word_map_tgt = []
-        for i, word_list in enumerate(token_tgt):
-          sub2word_map_tgt += [i for x in word_list]
-
-        # alignment
-        align_layer = 8
-        threshold = 1e-3
-        model.eval()
-        with torch.no_grad():
-          out_src = model(ids_src.unsqueeze(0), output_hidden_states=True)[2][align_layer][0, 1:-1]
-          out_tgt = model(ids_tgt.unsqueeze(0), output_hidden_states=True)[2][align_layer][0, 1:-1]
-
-          dot_prod = torch.matmul(out_src, out_tgt.transpose(-1, -2))
-
-          softmax_srctgt = torch.nn.Softmax(dim=-1)(dot_prod)
-          softmax_tgtsrc = torch.nn.Softmax(dim=-2)(dot_prod)
-
-          softmax_inter = (softmax_srctgt > threshold)*(softmax_tgtsrc > threshold)
-
-        align_subwords = torch.nonzero(softmax_inter, as_tuple=False)
-        align_words = set()
-        for i, j in align_subwords:
-          align_words.add( (sub2word_map_src[i], sub2word_map_tgt[j]) )
-
-        # printing
-        class color:
-           PURPLE = '\033[95m'
-           CYAN = '\033[96m'
-           DARKCYAN = '\033[36m'
-           BLUE = '\033[94m'
-           GREEN = '\033[92m'
-           YELLOW = '\033[93m'
-           RED = '\033[91m'
-           BOLD = '\033[1m'
-           UNDERLINE = '\033[4m'
-           END = '\033[0m'
-
-        for i, j in sorted(align_words):
-          print(f'{color.BOLD}{color.BLUE}{sent_src[i]}{color.END}==={color.BOLD}{color.RED}{sent_tgt[j]}{color.END}')
+    '''
+        Given a parallel sentences file
+        load the awesome-align encoder once
+        align the sentence pairs in padded batches
+        outputting Pharaoh alignments for each parallel pair
+    '''
+    def __init__(self, sentences_fp, model='bert-base-multilingual-cased', align_layer=8, threshold=1e-3,
+                 batch_size=32, device='cpu', embedding_cache=None, instrumentation=None, tokenization_cache_fp=None,
+                 max_length=None, window_stride=None, max_batch_tokens=None, precision='fp32', truncate_layers=True):
+        """
+        :param sentences_fp: Path to the parallel sentences, either XL-WA TSV ("src\\ttrg[\\tgold]")
+                             or "src ||| trg" lines, both whitespace tokenized,
+                             or a binary alignment corpus holding sentence text.
+        :param model: Name or path of the BERT model to take embeddings from.
+        :param align_layer: Hidden layer whose states are used for alignment.
+        :param threshold: Softmax probability threshold for both alignment directions.
+        :param batch_size: Number of sentence pairs encoded per forward pass.
+        :param device: Torch device the model runs on.
+        :param embedding_cache: Optional EmbeddingCache, sentences found in it skip the encoder.
+        :param instrumentation: Optional Instrumentation collecting stage timers and counters.
+        :param tokenization_cache_fp: Optional SQLite file persisting tokenized sentences across runs.
+        :param max_length: Sub-words encoded at once, longer sentences are encoded in overlapping windows.
+        :param window_stride: Sub-words between the starts of two windows.
+        :param max_batch_tokens: Most padded positions per forward pass.
+        :param precision: Inference backend, "fp32", "bf16" or "int8" (dynamic quantization).
+        :param truncate_layers: Drop the layers above ``align_layer``, which do not change the alignments.
+        """
+        self.sentences_fp = sentences_fp
+        self.align_layer = align_layer
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.device = torch.device(device)
+        self.embedding_cache = embedding_cache
+        self.precision = precision
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+
+        self.model = transformers.BertModel.from_pretrained(model)
+        self.model.eval()
+        self.model = prepare_encoder(self.model, align_layer, precision, truncate_layers)
+        self.model.to(self.device)
+        self.tokenizer = transformers.BertTokenizer.from_pretrained(model)
+        self.subword_tokenizer = SubwordTokenizer(self.tokenizer, cache_fp=tokenization_cache_fp)
+        self.encoder = WindowedEncoder(self.model, self.tokenizer, align_layer, device=self.device,
+                                       max_length=max_length, stride=window_stride,
+                                       max_batch_tokens=max_batch_tokens)
+        # the windowing changes the vectors of long sentences, so it is part of the cache namespace
+        self.cache_namespace = EmbeddingCache.namespace("awesome", model, "bpe", align_layer,
+                                                        *([precision] if precision != 'fp32' else []),
+                                                        f"window{self.encoder.max_length}",
+                                                        f"stride{self.encoder.stride}")
+
+    def __call__(self, output_fp=None):
+        return self.run(output_fp)
+
+    def read_sentence_pairs(self):
+        """Yield (source words, target words) from ``sentences_fp``, read in chunks."""
+        return read_sentence_pairs(self.sentences_fp)
+
+    def run(self, output_fp=None):
+        """
+        Align every pair of ``sentences_fp`` and write one Pharaoh line per pair
+        ("i-j" word index links separated by spaces), batch by batch.
+
+        :param output_fp: Path of the Pharaoh output file, stdout if not given.
+                          Paths ending in ".algn" get a binary alignment corpus instead.
+        """
+        if output_fp and output_fp.endswith(EXTENSION):
+            with AlignmentCorpusWriter(output_fp) as writer:
+                for alignments in self.iter_alignments():
+                    with self.instrumentation.stage("write"):
+                        writer.write(alignments)
+            return
+        outf = open(output_fp, 'w') if output_fp else sys.stdout
+        try:
+            for alignments in self.iter_alignments():
+                with self.instrumentation.stage("write"):
+                    outf.write(' '.join(f'{i}-{j}' for i, j in alignments) + '\n')
+        finally:
+            if output_fp:
+                outf.close()
+
+    def iter_alignments(self):
+        """Yield the sorted list of (source word, target word) links of each pair, in file order."""
+        pairs = self.read_sentence_pairs()
+        while True:
+            batch = list(itertools.islice(pairs, self.batch_size))
+            if not batch:
+                break
+            yield from self.align_batch(batch)
+
+    def encode(self, sentences):
+        """
+        Sub-word tokenize whitespace tokenized sentences, memoized by the shared SubwordTokenizer.
+
+        :return: The TokenizedSentence of every sentence and their padded sub-word to word maps (-1 on padding).
+        """
+        tokenized = self.subword_tokenizer.tokenize(sentences)
+        n_subwords = [tokens.n_subwords for tokens in tokenized]
+        self.instrumentation.count("subwords", sum(n_subwords))
+        self.instrumentation.count("windowed_sentences", sum(n > self.encoder.max_length for n in n_subwords))
+        return tokenized, torch.from_numpy(pad_sub2word(tokenized))
+
+    def embed(self, sentences, tokenized):
+        """
+        Hidden states of ``align_layer`` (without [CLS]/[SEP]) of every sentence, zero padded
+        to the longest; sentences found in the embedding cache are not encoded again.
+        """
+        vectors = [None] * len(sentences)
+        if self.embedding_cache is not None:
+            for row, sentence in enumerate(sentences):
+                cached = self.embedding_cache.get(self.cache_namespace, sentence)
+                if cached is not None:
+                    vectors[row] = torch.from_numpy(cached.copy())
+
+        missing = [row for row, vector in enumerate(vectors) if vector is None]
+        encoded = self.encoder.encode([tokenized[row] for row in missing], 2 * self.batch_size, self.instrumentation)
+        for row, vector in zip(missing, encoded):
+            vectors[row] = vector
+            if self.embedding_cache is not None:
+                self.embedding_cache.put(self.cache_namespace, sentences[row], vector.cpu().numpy())
+        return torch.nn.utils.rnn.pad_sequence([vector.to(self.device) for vector in vectors], batch_first=True)
+
+    def align_batch(self, batch):
+        """
+        Align a list of (source words, target words) pairs.
+
+        Source and target sentences are encoded together in length-packed
+        forward passes, then stacked into one padded batch; the
+        softmax-threshold intersection is computed for all pairs at once on
+        masked similarity tensors.
+
+        :return: List with the sorted (source word, target word) links of each pair.
+        """
+        n_pairs = len(batch)
+        sentences = [src for src, _ in batch] + [tgt for _, tgt in batch]
+        instrumentation = self.instrumentation
+        instrumentation.count("pairs", n_pairs)
+        with instrumentation.stage("tokenize"):
+            tokenized, sub2word = self.encode(sentences)
+
+        with torch.no_grad(), instrumentation.stage("encode"):
+            hidden = self.embed(sentences, tokenized)
+
+        with torch.no_grad(), instrumentation.stage("similarity"):
+            sub2word = sub2word.to(self.device)
+            valid = sub2word >= 0
+            src_hidden, tgt_hidden = hidden[:n_pairs], hidden[n_pairs:]
+            src_valid, tgt_valid = valid[:n_pairs], valid[n_pairs:]
+
+            dot_prod = torch.bmm(src_hidden, tgt_hidden.transpose(-1, -2))
+            mask = src_valid.unsqueeze(-1) & tgt_valid.unsqueeze(-2)
+            dot_prod = dot_prod.masked_fill(~mask, float('-inf'))
+
+            softmax_srctgt = torch.nn.Softmax(dim=-1)(dot_prod)
+            softmax_tgtsrc = torch.nn.Softmax(dim=-2)(dot_prod)
+
+            softmax_inter = (softmax_srctgt > self.threshold) & (softmax_tgtsrc > self.threshold) & mask
+
+        with torch.no_grad(), instrumentation.stage("matching"):
+            # map every sub-word link to its word link, then deduplicate all pairs at once
+            pair_ids, i, j = torch.nonzero(softmax_inter, as_tuple=True)
+            word_i = sub2word[:n_pairs][pair_ids, i]
+            word_j = sub2word[n_pairs:][pair_ids, j]
+            n_words = int(sub2word.max()) + 1 if sub2word.numel() else 1
+            keys = torch.unique((pair_ids * n_words + word_i) * n_words + word_j).cpu()
+
+            alignments = [[] for _ in range(n_pairs)]
+            for key in keys.tolist():
+                pair_id, rest = divmod(key, n_words * n_words)
+                alignments[pair_id].append(divmod(rest, n_words))
+        return alignments
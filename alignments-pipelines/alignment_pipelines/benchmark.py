@@ -0,0 +1,113 @@
+"""
+Evaluate many predicted alignment files against their gold references in parallel
+and gather the scores into a single lang x split x system results table.
+
+Predicted files are discovered with a regular expression whose named groups
+(``system``, ``lang``, ``split``, ...) are also used to fill in the path of the
+matching reference file.
+
+usage: python -m alignment_pipelines.benchmark ./outputs/ --reference './references/{lang}_{split}.tsv.gold'
+                                                --output results.csv
+"""
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import re
+import time
+
+from .calculate_metrics import StreamingAlignmentMetrics
+
+# matches e.g. "fast_align_pt_dev.pharaoh" -> system "fast_align", lang "pt", split "dev"
+DEFAULT_PATTERN = r'(?P<system>.+)_(?P<lang>[^_]+)_(?P<split>[^_.]+)\.pharaoh$'
+DEFAULT_REFERENCE = os.path.join('references', '{lang}_{split}.tsv.gold')
+METRICS = ("precision", "recall", "f1_score", "aer")
+
+
+def discover_runs(predicted_dir, pattern=DEFAULT_PATTERN, reference_template=DEFAULT_REFERENCE):
+    """
+    Pair every predicted file of ``predicted_dir`` matching ``pattern`` with its reference file.
+
+    :param predicted_dir: Directory holding the predicted alignment files.
+    :param pattern: Regular expression matched against file names; its named groups describe the run.
+    :param reference_template: Format string of the reference path, filled with the named groups.
+    :return: List of dicts with the named groups plus "predicted_file" and "reference_file".
+    """
+    regex = re.compile(pattern)
+    runs = []
+    for filename in sorted(os.listdir(predicted_dir)):
+        match = regex.search(filename)
+        if match is None:
+            continue
+        run = match.groupdict()
+        run["predicted_file"] = os.path.join(predicted_dir, filename)
+        run["reference_file"] = reference_template.format(**run)
+        if not os.path.exists(run["reference_file"]):
+            raise FileNotFoundError(f"No reference {run['reference_file']} for {run['predicted_file']}")
+        runs.append(run)
+    return runs
+
+
+def evaluate_run(run):
+    """
+    Evaluate a single run returned by ``discover_runs``.
+
+    :return: The run with flattened "micro_*"/"macro_*" scores and the evaluation time in "seconds".
+    """
+    start = time.perf_counter()
+    scores = StreamingAlignmentMetrics(run["predicted_file"], run["reference_file"]).evaluate()
+    row = dict(run)
+    for average in ("micro", "macro"):
+        for metric in METRICS:
+            row[f"{average}_{metric}"] = scores[f"{average}_average"][metric]
+    row["seconds"] = time.perf_counter() - start
+    return row
+
+
+def run_benchmark(runs, workers=None):
+    """
+    Evaluate runs across a pool of worker processes.
+
+    :param runs: Runs returned by ``discover_runs``.
+    :param workers: Number of processes, ``os.cpu_count()`` if not given.
+    :return: List of result rows sorted by lang, split and system.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        rows = list(executor.map(evaluate_run, runs))
+    return sorted(rows, key=lambda row: (row.get("lang", ""), row.get("split", ""), row.get("system", "")))
+
+
+def write_results(rows, output_fp):
+    """Write result rows as JSON (``.json``) or CSV (any other extension)."""
+    with open(output_fp, 'w', newline='') as outf:
+        if output_fp.endswith('.json'):
+            json.dump(rows, outf, indent=2)
+            return
+        fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+        writer = csv.DictWriter(outf, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('predicted_dir')
+    parser.add_argument('--pattern', default=DEFAULT_PATTERN,
+                        help="regex with named groups matched against predicted file names")
+    parser.add_argument('--reference', default=DEFAULT_REFERENCE,
+                        help="reference path template filled with the pattern's named groups")
+    parser.add_argument('--output', default='results.csv', help="results table, .json or .csv")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = run_benchmark(discover_runs(args.predicted_dir, args.pattern, args.reference), args.workers)
+    write_results(rows, args.output)
+    for row in sorted(rows, key=lambda row: row["seconds"], reverse=True):
+        print(f"{row['seconds']:8.3f}s  {row['predicted_file']}")
+    print(f"{len(rows)} files evaluated in {time.perf_counter() - start:.3f}s, results in {args.output}")
+
+
+if __name__ == '__main__':
+    main()
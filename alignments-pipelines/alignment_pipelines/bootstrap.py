@@ -0,0 +1,125 @@
+"""
+Bootstrap confidence intervals and paired significance tests for the alignment metrics.
+
+Every metric is a function of the per-sentence link counts returned by
+``alignment_arrays.sentence_counts`` (sure hits, possible hits, predicted
+links, sure reference links), so a bootstrap resample of the corpus never
+touches the links again: it is a vector of sentence multiplicities ``w`` and
+its micro totals are ``w @ counts``. Resamples are drawn in blocks as a
+(block, n_sentences) multiplicity matrix, which turns thousands of resamples
+over a full XL-WA split into a few matrix products.
+
+A paired test resamples the same sentences for both systems, so the
+variation shared by both (hard sentences, short sentences) cancels out of
+their difference.
+"""
+import numpy as np
+
+METRICS = ("precision", "recall", "f1_score", "aer")
+
+
+def micro_scores(totals):
+    """
+    Micro precision, recall, F1 score and AER of summed link counts.
+
+    :param totals: Array (..., 4) of (sure_hits, possible_hits, n_predicted, n_sure) totals.
+    :return: Array (..., 4) of (precision, recall, f1_score, aer), in METRICS order.
+    """
+    totals = np.asarray(totals, dtype=np.float64)
+    sure_hits, possible_hits, n_predicted, n_sure = np.moveaxis(totals, -1, 0)
+    zeros = np.zeros_like(sure_hits)
+    precision = np.divide(possible_hits, n_predicted, out=zeros.copy(), where=n_predicted > 0)
+    recall = np.divide(sure_hits, n_sure, out=zeros.copy(), where=n_sure > 0)
+    precision_recall = precision + recall
+    f1_score = np.divide(2 * precision * recall, precision_recall, out=zeros.copy(), where=precision_recall > 0)
+    n_total = n_predicted + n_sure
+    aer = 1 - np.divide(sure_hits + possible_hits, n_total, out=zeros.copy(), where=n_total > 0)
+    aer = np.where(n_total > 0, aer, 1.0)
+    return np.stack([precision, recall, f1_score, aer], axis=-1)
+
+
+def iter_resample_weights(n_sentences, n_resamples, seed=None, block_size=256):
+    """
+    Yield blocks of bootstrap resamples as sentence multiplicities.
+
+    :param n_sentences: Corpus size; every resample draws that many sentences with replacement.
+    :param n_resamples: Total number of resamples.
+    :param seed: Seed of the random generator, for reproducible intervals.
+    :param block_size: Resamples per block, bounds memory to block_size x n_sentences integers.
+    :return: Generator of float64 arrays (block, n_sentences) whose rows sum to ``n_sentences``.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_resamples, block_size):
+        size = min(block_size, n_resamples - start)
+        # one bincount for the whole block: resample r counts its draws in bins r * n_sentences + i
+        draws = rng.integers(0, n_sentences, size=(size, n_sentences), dtype=np.int64)
+        draws += np.arange(size, dtype=np.int64)[:, None] * n_sentences
+        yield np.bincount(draws.ravel(), minlength=size * n_sentences).reshape(size, n_sentences).astype(np.float64)
+
+
+def _is_single(counts):
+    if isinstance(counts, tuple):
+        return True
+    return isinstance(counts, np.ndarray) and counts.ndim == 2
+
+
+def bootstrap_scores(counts, n_resamples=1000, seed=None, sentence_scores=None):
+    """
+    Metrics of ``n_resamples`` bootstrap resamples of the corpus.
+
+    :param counts: Per-sentence counts, the tuple returned by ``sentence_counts`` or an
+                   array (n_sentences, 4), or a list of them to resample several systems
+                   on the same sentences.
+    :param n_resamples: Number of resamples.
+    :param seed: Seed of the random generator.
+    :param sentence_scores: Function from counts to per-sentence (precision, recall, f1_score, aer),
+                            e.g. ``AlignmentMetrics.sentence_scores``; macro averages are only
+                            resampled when given.
+    :return: Dictionary of arrays (n_systems, n_resamples, 4) of resampled metrics, in METRICS order:
+             "micro" (metrics of the summed counts) and "macro" (mean of the sentence metrics).
+    """
+    systems = [counts] if _is_single(counts) else list(counts)
+    columns = [np.column_stack(system).astype(np.float64) if isinstance(system, tuple) else
+               np.asarray(system, dtype=np.float64) for system in systems]
+    n_sentences = len(columns[0])
+    if n_sentences == 0 or any(len(column) != n_sentences for column in columns):
+        raise ValueError("Every system needs counts for the same, non-empty, sentences.")
+    if sentence_scores is not None:
+        columns += [np.column_stack(sentence_scores(*column.T)) for column in columns]
+    stacked = np.concatenate(columns, axis=1)
+
+    resampled = np.concatenate([weights @ stacked for weights in iter_resample_weights(n_sentences, n_resamples, seed)])
+    resampled = resampled.reshape(n_resamples, len(columns), 4).transpose(1, 0, 2)
+    scores = {"micro": micro_scores(resampled[:len(systems)])}
+    if sentence_scores is not None:
+        scores["macro"] = resampled[len(systems):] / n_sentences
+    return scores
+
+
+def confidence_interval(samples, confidence=0.95):
+    """Percentile interval (low, high) of bootstrap samples along axis 0."""
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(samples, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+
+def paired_test(samples_a, samples_b, estimate_a, estimate_b, confidence=0.95):
+    """
+    Compare two systems from bootstrap samples drawn on the same resamples.
+
+    :param samples_a: Array (n_resamples, 4) of resampled metrics of system A.
+    :param samples_b: Array (n_resamples, 4) of resampled metrics of system B.
+    :param estimate_a: Metrics of system A on the full corpus.
+    :param estimate_b: Metrics of system B on the full corpus.
+    :param confidence: Coverage of the interval of the difference.
+    :return: Dictionary per metric with both estimates, the difference B - A, its
+             confidence interval and the two-sided p-value of "no difference".
+    """
+    differences = samples_b - samples_a
+    low, high = confidence_interval(differences, confidence)
+    # share of resamples on either side of zero, doubled for a two-sided test
+    p_values = np.minimum(1.0, 2 * np.minimum((differences <= 0).mean(axis=0), (differences >= 0).mean(axis=0)))
+    return {metric: {"a": float(estimate_a[k]), "b": float(estimate_b[k]),
+                     "difference": float(estimate_b[k] - estimate_a[k]),
+                     "low": float(low[k]), "high": float(high[k]), "p_value": float(p_values[k])}
+            for k, metric in enumerate(METRICS)}
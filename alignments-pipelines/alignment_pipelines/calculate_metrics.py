@@ -1,3 +1,14 @@
+import functools
+import itertools
+import warnings
+
+import numpy as np
+
+from .alignment_arrays import AlignmentArrays, sentence_counts
+from .alignment_corpus import iter_alignment_chunks, load_alignment_file
+from .bootstrap import METRICS, bootstrap_scores, confidence_interval, micro_scores, paired_test
+
+
 class AlignmentMetrics:
     """
     A class to calculate alignment metrics (precision, recall, F1 score, and AER)
@@ -22,17 +33,21 @@ class AlignmentMetrics:
         alignments in the format "source_index-target_index", separated by spaces.
         
         Example line: "0-0 1-1 2-2" represents alignments for a sentence pair.
+        Gold files may mark possible (not sure) links as "0p1" or "0?1".
+        Binary alignment corpora (see alignment_corpus) are read directly.
         
         :param file_path: Path to the alignment file.
-        :return: List of sets of alignment pairs for each sentence pair.
+        :return: AlignmentArrays holding the links of every sentence pair; indexing it
+                 gives the set of alignment pairs of a sentence pair.
         """
-        alignments = []
-        with open(file_path, 'r') as file:
-            for line in file:
-                # Parse each alignment pair in the line as a tuple of integers
-                alignment_set = {tuple(map(int, pair.split('-'))) for pair in line.strip().split()}
-                alignments.append(alignment_set)
-        return alignments
+        return load_alignment_file(file_path)
+
+    @staticmethod
+    def as_arrays(alignments):
+        """Return alignments as AlignmentArrays, converting lists of alignment sets."""
+        if isinstance(alignments, AlignmentArrays):
+            return alignments
+        return AlignmentArrays.from_sets(alignments)
 
     def calculate_precision(self, predicted, reference):
         """Calculate precision for alignments."""
@@ -55,31 +70,41 @@ class AlignmentMetrics:
         true_positives = len(predicted & reference)
         total_predicted = len(predicted)
         total_reference = len(reference)
-        return 1 - (2 * true_positives) / (total_predicted + total_reference) if (total_predicted + total_reference) > 0 else 1.0
+        return self.calculate_aer_from_counts(true_positives, total_predicted, total_reference)
+
+    def calculate_aer_from_counts(self, true_positives, total_predicted, total_reference, possible_true_positives=None):
+        """
+        Calculate Alignment Error Rate (AER) from link counts.
+
+        With sure (S) and possible (P) reference links, ``true_positives`` counts the
+        predicted links in S, ``possible_true_positives`` those in P and ``total_reference``
+        is the size of S. Without possible links both counts are the same.
+        """
+        if possible_true_positives is None:
+            possible_true_positives = true_positives
+        total = total_predicted + total_reference
+        return 1 - (true_positives + possible_true_positives) / total if total > 0 else 1.0
 
     def calculate_micro_average(self, predicted_alignments, reference_alignments):
         """Calculate micro average precision, recall, F1 score, and AER."""
-        total_true_positives = total_false_positives = total_false_negatives = 0
-        total_predicted = total_reference = 0
-
-        for predicted, reference in zip(predicted_alignments, reference_alignments):
-            true_positives = len(predicted & reference)
-            false_positives = len(predicted - reference)
-            false_negatives = len(reference - predicted)
-
-            total_true_positives += true_positives
-            total_false_positives += false_positives
-            total_false_negatives += false_negatives
-            total_predicted += len(predicted)
-            total_reference += len(reference)
-
-        precision = total_true_positives / total_predicted if total_predicted > 0 else 0.0
-        recall = total_true_positives / total_reference if total_reference > 0 else 0.0
+        predicted_alignments = self.as_arrays(predicted_alignments)
+        reference_alignments = self.as_arrays(reference_alignments)
+        return self.calculate_micro_from_counts(*sentence_counts(predicted_alignments, reference_alignments))
+
+    def calculate_micro_from_counts(self, sure_hits, possible_hits, n_predicted, n_sure):
+        """
+        Calculate micro average precision, recall, F1 score, and AER from the
+        per-sentence link counts returned by ``sentence_counts``.
+        """
+        total_sure_hits = int(np.sum(sure_hits))
+        total_possible_hits = int(np.sum(possible_hits))
+        total_predicted = int(np.sum(n_predicted))
+        total_sure = int(np.sum(n_sure))
+
+        precision = total_possible_hits / total_predicted if total_predicted > 0 else 0.0
+        recall = total_sure_hits / total_sure if total_sure > 0 else 0.0
         f1_score = self.calculate_f1_score(precision, recall)
-        aer = self.calculate_aer(
-            set(pair for alignment in predicted_alignments for pair in alignment),
-            set(pair for alignment in reference_alignments for pair in alignment)
-        )
+        aer = self.calculate_aer_from_counts(total_sure_hits, total_predicted, total_sure, total_possible_hits)
 
         return {
             "precision": precision,
@@ -90,27 +115,42 @@ class AlignmentMetrics:
 
     def calculate_macro_average(self, predicted_alignments, reference_alignments):
         """Calculate macro average precision, recall, F1 score, and AER."""
-        total_precision, total_recall, total_f1, total_aer = 0.0, 0.0, 0.0, 0.0
+        predicted_alignments = self.as_arrays(predicted_alignments)
+        reference_alignments = self.as_arrays(reference_alignments)
         num_sentences = len(predicted_alignments)
 
-        for predicted, reference in zip(predicted_alignments, reference_alignments):
-            precision = self.calculate_precision(predicted, reference)
-            recall = self.calculate_recall(predicted, reference)
-            f1_score = self.calculate_f1_score(precision, recall)
-            aer = self.calculate_aer(predicted, reference)
-
-            total_precision += precision
-            total_recall += recall
-            total_f1 += f1_score
-            total_aer += aer
+        precision, recall, f1_score, aer = self.sentence_scores(*sentence_counts(predicted_alignments, reference_alignments))
 
+        # summed in sentence order, as a running Python total would
         return {
-            "precision": total_precision / num_sentences,
-            "recall": total_recall / num_sentences,
-            "f1_score": total_f1 / num_sentences,
-            "aer": total_aer / num_sentences
+            "precision": sum(precision.tolist()) / num_sentences,
+            "recall": sum(recall.tolist()) / num_sentences,
+            "f1_score": sum(f1_score.tolist()) / num_sentences,
+            "aer": sum(aer.tolist()) / num_sentences
         }
 
+    @staticmethod
+    def sentence_scores(sure_hits, possible_hits, n_predicted, n_sure):
+        """
+        Vectorized per-sentence precision, recall, F1 score, and AER from the link
+        counts returned by ``sentence_counts``.
+
+        :return: Tuple of float64 arrays (precision, recall, f1_score, aer).
+        """
+        sure_hits = np.asarray(sure_hits, dtype=np.float64)
+        possible_hits = np.asarray(possible_hits, dtype=np.float64)
+        n_predicted = np.asarray(n_predicted, dtype=np.float64)
+        n_sure = np.asarray(n_sure, dtype=np.float64)
+        n_total = n_predicted + n_sure
+
+        precision = np.divide(possible_hits, n_predicted, out=np.zeros_like(sure_hits), where=n_predicted > 0)
+        recall = np.divide(sure_hits, n_sure, out=np.zeros_like(sure_hits), where=n_sure > 0)
+        precision_recall = precision + recall
+        f1_score = np.divide(2 * precision * recall, precision_recall,
+                             out=np.zeros_like(sure_hits), where=precision_recall > 0)
+        aer = 1 - np.divide(sure_hits + possible_hits, n_total, out=np.zeros_like(sure_hits), where=n_total > 0)
+        return precision, recall, f1_score, aer
+
     def evaluate(self):
         """
         Evaluate the precision, recall, F1 score, and AER across all sentence pairs.
@@ -128,3 +168,160 @@ class AlignmentMetrics:
             "macro_average": macro_avg
         }
 
+    def sentence_counts(self):
+        """
+        Per-sentence link counts of the two files, see ``alignment_arrays.sentence_counts``.
+
+        :return: Tuple of int64 arrays (sure_hits, possible_hits, n_predicted, n_sure).
+        """
+        return sentence_counts(self.as_arrays(self.predicted_alignments), self.as_arrays(self.reference_alignments))
+
+    def _estimates(self, counts):
+        return {"micro": micro_scores([count.sum() for count in counts]),
+                "macro": np.array([scores.mean() for scores in self.sentence_scores(*counts)])}
+
+    def confidence_intervals(self, n_resamples=1000, confidence=0.95, seed=None):
+        """
+        Bootstrap confidence intervals of precision, recall, F1 score, and AER, resampling sentence pairs.
+
+        :param n_resamples: Number of bootstrap resamples.
+        :param confidence: Coverage of the intervals.
+        :param seed: Seed of the random generator, for reproducible intervals.
+        :return: Dictionary like ``evaluate()``'s, with {"estimate", "low", "high"} for every metric.
+        """
+        counts = self.sentence_counts()
+        estimates = self._estimates(counts)
+        samples = bootstrap_scores(counts, n_resamples, seed, self.sentence_scores)
+        intervals = {}
+        for average, estimate in estimates.items():
+            low, high = confidence_interval(samples[average][0], confidence)
+            intervals[f"{average}_average"] = {
+                metric: {"estimate": float(estimate[k]), "low": float(low[k]), "high": float(high[k])}
+                for k, metric in enumerate(METRICS)}
+        return intervals
+
+    def compare(self, other, n_resamples=1000, confidence=0.95, seed=None):
+        """
+        Paired bootstrap test of this system (A) against ``other`` (B) on the same reference.
+
+        Both systems are scored on the same resampled sentence pairs, so the
+        interval of the difference B - A only reflects how the systems differ.
+
+        :param other: AlignmentMetrics of another predicted file against the same reference file.
+        :param n_resamples: Number of bootstrap resamples.
+        :param confidence: Coverage of the intervals of the differences.
+        :param seed: Seed of the random generator.
+        :return: Dictionary like ``evaluate()``'s, with {"a", "b", "difference", "low", "high", "p_value"}
+                 for every metric; a p_value under 1 - confidence means the difference is significant.
+        """
+        counts_a, counts_b = self.sentence_counts(), other.sentence_counts()
+        if len(counts_a[3]) != len(counts_b[3]) or not np.array_equal(counts_a[3], counts_b[3]):
+            raise ValueError("Paired comparisons need both systems evaluated against the same reference.")
+        estimates_a, estimates_b = self._estimates(counts_a), self._estimates(counts_b)
+        samples = bootstrap_scores([counts_a, counts_b], n_resamples, seed, self.sentence_scores)
+        comparison = {}
+        for average in estimates_a:
+            samples_a, samples_b = samples[average]
+            comparison[f"{average}_average"] = paired_test(samples_a, samples_b, estimates_a[average],
+                                                           estimates_b[average], confidence)
+        return comparison
+
+
+
+class StreamingAlignmentMetrics(AlignmentMetrics):
+    """
+    Calculate the same metrics as AlignmentMetrics without loading the alignment files.
+
+    Both files are read side by side, ``chunk_size`` lines at a time, and only
+    running totals are kept, so memory does not grow with the corpus size.
+    """
+
+    def __init__(self, predicted_file, reference_file, chunk_size=10000, strict=True):
+        """
+        Initializes with paths to the predicted and reference alignment files.
+
+        :param predicted_file: Path to the file containing predicted alignments.
+        :param reference_file: Path to the file containing reference alignments.
+        :param chunk_size: Number of lines parsed at once.
+        :param strict: Raise a ValueError if the files have different numbers of lines,
+                       otherwise only warn and evaluate them like AlignmentMetrics does.
+        """
+        self.predicted_file = predicted_file
+        self.reference_file = reference_file
+        self.chunk_size = chunk_size
+        self.strict = strict
+
+    @functools.cached_property
+    def predicted_alignments(self):
+        """All predicted alignments, only loaded if a method of AlignmentMetrics asks for them."""
+        return self.load_alignments(self.predicted_file)
+
+    @functools.cached_property
+    def reference_alignments(self):
+        """All reference alignments, only loaded if a method of AlignmentMetrics asks for them."""
+        return self.load_alignments(self.reference_file)
+
+    def iter_chunk_pairs(self):
+        """
+        Read both files side by side, ``chunk_size`` lines at a time.
+
+        :return: Generator of (predicted, reference) AlignmentArrays; once the shorter file
+                 is exhausted, its chunks are empty.
+        """
+        empty = AlignmentArrays([], [], [0])
+        chunks = itertools.zip_longest(iter_alignment_chunks(self.predicted_file, self.chunk_size),
+                                       iter_alignment_chunks(self.reference_file, self.chunk_size),
+                                       fillvalue=empty)
+        for predicted, reference in chunks:
+            if self.strict and len(predicted) != len(reference):
+                raise ValueError(f"{self.predicted_file} and {self.reference_file} have different numbers of lines.")
+            yield predicted, reference
+
+    def evaluate(self):
+        """
+        Evaluate the precision, recall, F1 score, and AER across all sentence pairs.
+
+        :return: Dictionary containing the micro and macro averages of precision, recall, F1 score, and AER.
+        """
+        totals = np.zeros(4, dtype=np.int64)
+        total_precision, total_recall, total_f1, total_aer = 0.0, 0.0, 0.0, 0.0
+        num_predicted = num_reference = 0
+
+        for predicted, reference in self.iter_chunk_pairs():
+            num_predicted += len(predicted)
+            num_reference += len(reference)
+
+            counts = sentence_counts(predicted, reference)
+            totals += [count.sum() for count in counts]
+
+            precision, recall, f1_score, aer = self.sentence_scores(*counts)
+            total_precision = sum(precision.tolist(), total_precision)
+            total_recall = sum(recall.tolist(), total_recall)
+            total_f1 = sum(f1_score.tolist(), total_f1)
+            total_aer = sum(aer.tolist(), total_aer)
+
+        if num_predicted != num_reference:
+            warnings.warn(f"{self.predicted_file} has {num_predicted} lines but {self.reference_file} has "
+                          f"{num_reference}; only the first {min(num_predicted, num_reference)} are compared.")
+
+        return {
+            "micro_average": self.calculate_micro_from_counts(*totals),
+            "macro_average": {
+                "precision": total_precision / num_predicted,
+                "recall": total_recall / num_predicted,
+                "f1_score": total_f1 / num_predicted,
+                "aer": total_aer / num_predicted
+            }
+        }
+
+    def sentence_counts(self):
+        """
+        Per-sentence link counts of the two files, read chunk by chunk; only the
+        four count arrays are kept, not the links.
+
+        :return: Tuple of int64 arrays (sure_hits, possible_hits, n_predicted, n_sure).
+        """
+        chunk_counts = [sentence_counts(predicted, reference) for predicted, reference in self.iter_chunk_pairs()]
+        if not chunk_counts:
+            return tuple(np.zeros(0, dtype=np.int64) for _ in range(4))
+        return tuple(np.concatenate(counts) for counts in zip(*chunk_counts))
@@ -0,0 +1,216 @@
+"""
+Combine several alignments of the same corpus into one: symmetrize two
+directional alignments, or ensemble matching methods and aligners.
+
+    intersection         links found in every input
+    union                links found in any input
+    vote                 links found in at least ``min_votes`` inputs (a majority by default)
+    grow-diag            intersection grown towards the union through neighbouring links
+    grow-diag-final      grow-diag, then links of either input that align an unaligned word
+    grow-diag-final-and  grow-diag, then links of either input that align two unaligned words
+
+Every link is one int64 key (``sentence_id << 32 | source_index << 16 |
+target_index``, see AlignmentArrays.keys), so set operations over a whole
+chunk of sentences are sorted-array operations. The grow-diag family follows
+the sequential algorithm of Koehn et al. (2003), as Moses and fast_align's
+atools implement it, so its results are comparable with theirs: starting from
+the intersection, aligned points are scanned in (source, target) order and
+each adds its union neighbours that align a still unaligned word, a point
+added ahead of the scan being visited in the same pass, until a pass adds
+nothing. Only the sentences where the two inputs disagree go through that
+loop, one at a time; the others keep their intersection.
+
+The inputs (Pharaoh, XL-WA TSV outputs with their alignment column, or .algn
+files) are read side by side ``chunk_size`` sentences at a time, so memory
+does not grow with the corpus; the combined chunks are AlignmentArrays that
+can be written out or scored by AlignmentMetrics directly.
+
+usage: python -m alignment_pipelines.combine combined.pharaoh fwd.pharaoh rev.pharaoh --method grow-diag-final
+       python -m alignment_pipelines.combine voted.pharaoh mwmf.pharaoh inter.pharaoh itermax.pharaoh --method vote
+"""
+import argparse
+import bisect
+import functools
+import itertools
+
+import numpy as np
+
+from .alignment_arrays import INDEX_BITS, MAX_INDEX, SENTENCE_SHIFT, AlignmentArrays, unique_sorted
+from .alignment_corpus import EXTENSION, AlignmentCorpusWriter
+from .corpus_reader import iter_chunks
+
+METHODS = ("intersection", "union", "vote", "grow-diag", "grow-diag-final", "grow-diag-final-and")
+NEIGHBOURS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+# the same moves on ``source_index << 16 | target_index`` codes
+NEIGHBOUR_STEPS = tuple(d_src * (1 << INDEX_BITS) + d_tgt for d_src, d_tgt in NEIGHBOURS)
+LINK_MASK = (1 << SENTENCE_SHIFT) - 1
+
+
+def _symmetrize_sentence(forward, reverse, union, intersection, method):
+    """
+    Grow-diag(-final(-and)) of one sentence.
+
+    :param forward: Sorted ``source_index << 16 | target_index`` codes of the first alignment.
+    :param reverse: Sorted codes of the second alignment.
+    :param union: Codes of the union of both.
+    :param intersection: Codes of the intersection of both.
+    :return: Set of the codes of the symmetrized alignment.
+    """
+    aligned = set(intersection)
+    src_aligned = {code >> INDEX_BITS for code in aligned}
+    tgt_aligned = {code & MAX_INDEX for code in aligned}
+    candidates = set(union) - aligned
+    while True:
+        # words only ever get aligned: a link aligning no free word now never will
+        candidates = {code for code in candidates
+                      if code >> INDEX_BITS not in src_aligned or code & MAX_INDEX not in tgt_aligned}
+        # and only points next to one of them can add it (the neighbourhood is symmetric)
+        near = {code + step for code in candidates for step in NEIGHBOUR_STEPS}
+        points = sorted(aligned & near)
+        if not points:
+            break
+        added = False
+        k = 0
+        while k < len(points):
+            point = points[k]
+            k += 1
+            if point not in near:
+                continue
+            for step in NEIGHBOUR_STEPS:
+                code = point + step
+                if code not in candidates:
+                    continue
+                n_src, n_tgt = code >> INDEX_BITS, code & MAX_INDEX
+                if abs(n_tgt - (point & MAX_INDEX)) > 1:
+                    continue  # a step off the first or last target word wraps to another source word
+                if n_src not in src_aligned or n_tgt not in tgt_aligned:
+                    candidates.discard(code)
+                    aligned.add(code)
+                    src_aligned.add(n_src)
+                    tgt_aligned.add(n_tgt)
+                    added = True
+                    if code > point:  # still ahead of the scan, visited in this pass
+                        bisect.insort(points, code)
+        if not added:
+            break
+
+    if method == "grow-diag":
+        return aligned
+    both = method == "grow-diag-final-and"
+    for direction in (forward, reverse):
+        for code in direction:
+            src, tgt = code >> INDEX_BITS, code & MAX_INDEX
+            src_free, tgt_free = src not in src_aligned, tgt not in tgt_aligned
+            if code not in aligned and ((src_free and tgt_free) if both else (src_free or tgt_free)):
+                aligned.add(code)
+                src_aligned.add(src)
+                tgt_aligned.add(tgt)
+    return aligned
+
+
+def _symmetrize(forward, reverse, method):
+    union = unique_sorted(np.concatenate([forward, reverse]))
+    intersection = np.intersect1d(forward, reverse, assume_unique=True)
+    # sentences where the inputs agree have nothing to grow
+    sentences = unique_sorted(np.setdiff1d(union, intersection, assume_unique=True) >> SENTENCE_SHIFT)
+    if not len(sentences):
+        return intersection
+
+    inputs = [forward, reverse, union, intersection]
+    bounds = [np.searchsorted(keys >> SENTENCE_SHIFT, [sentences, sentences + 1]).T.tolist() for keys in inputs]
+    codes = [(keys & LINK_MASK).tolist() for keys in inputs]
+    symmetrized = [intersection[~np.isin(intersection >> SENTENCE_SHIFT, sentences)]]
+    for k, sentence in enumerate(sentences.tolist()):
+        aligned = _symmetrize_sentence(*(codes[i][slice(*bounds[i][k])] for i in range(len(inputs))), method)
+        symmetrized.append(sentence << SENTENCE_SHIFT | np.array(sorted(aligned), dtype=np.int64))
+    return np.sort(np.concatenate(symmetrized))
+
+
+def combine_keys(keys, method, min_votes=None):
+    """
+    Combine the link keys of several alignments of the same sentences.
+
+    :param keys: List of sorted, deduplicated int64 link keys, one array per input.
+    :param method: One of METHODS; the grow-diag family takes exactly two inputs (e.g. forward and reverse).
+    :param min_votes: Inputs that must agree on a link for "vote", a majority if not given.
+    :return: Sorted int64 link keys of the combined alignment.
+    """
+    if method not in METHODS:
+        raise ValueError(f"'method' must be one of {METHODS}.")
+    if method == "intersection":
+        return functools.reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), keys)
+    if method == "union":
+        return unique_sorted(np.concatenate(keys))
+    if method == "vote":
+        min_votes = min_votes or len(keys) // 2 + 1
+        unique, votes = unique_sorted(np.concatenate(keys), return_counts=True)
+        return unique[votes >= min_votes]
+
+    if len(keys) != 2:
+        raise ValueError(f"'{method}' combines exactly two alignments.")
+    return _symmetrize(*keys, method)
+
+
+def combine(alignments, method, min_votes=None):
+    """
+    Combine several AlignmentArrays of the same sentence pairs (all links are treated as sure).
+
+    :return: AlignmentArrays of the combined alignment.
+    """
+    n_sentences = len(alignments[0])
+    if any(len(alignment) != n_sentences for alignment in alignments):
+        raise ValueError("All alignments must cover the same sentence pairs.")
+    return AlignmentArrays.from_keys(combine_keys([alignment.keys() for alignment in alignments], method, min_votes),
+                                     n_sentences)
+
+
+def iter_combined(file_paths, method, min_votes=None, chunk_size=10000):
+    """
+    Read alignment files side by side and yield their combination chunk by chunk.
+
+    :param file_paths: Pharaoh, XL-WA TSV (alignment column) or .algn files of the same corpus.
+    :return: Generator of AlignmentArrays of up to ``chunk_size`` sentence pairs.
+    """
+    readers = [iter_chunks(file_path, chunk_size) for file_path in file_paths]
+    for chunks in itertools.zip_longest(*readers):
+        if any(chunk is None for chunk in chunks) or len({len(chunk) for chunk in chunks}) != 1:
+            raise ValueError(f"{', '.join(file_paths)} have different numbers of lines.")
+        if any(chunk.alignments is None for chunk in chunks):
+            raise ValueError("Every input must hold alignments.")
+        yield combine([chunk.alignments for chunk in chunks], method, min_votes)
+
+
+def combine_files(file_paths, output_fp, method, min_votes=None, chunk_size=10000):
+    """
+    Combine alignment files into a Pharaoh file, or a binary alignment corpus for ``.algn`` paths.
+
+    :return: Number of sentence pairs written.
+    """
+    written = 0
+    if output_fp.endswith(EXTENSION):
+        with AlignmentCorpusWriter(output_fp) as writer:
+            for combined in iter_combined(file_paths, method, min_votes, chunk_size):
+                writer.write_arrays(combined)
+                written += len(combined)
+        return written
+    with open(output_fp, 'w') as outf:
+        for combined in iter_combined(file_paths, method, min_votes, chunk_size):
+            outf.writelines(f"{line}\n" for line in combined.to_lines())
+            written += len(combined)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_fp", help="Pharaoh output, or .algn")
+    parser.add_argument("input_fps", nargs="+", help="Pharaoh, XL-WA TSV or .algn alignments of the same corpus")
+    parser.add_argument("--method", choices=METHODS, default="intersection")
+    parser.add_argument("--min-votes", type=int, default=None, help="for --method vote, a majority by default")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+    written = combine_files(args.input_fps, args.output_fp, args.method, args.min_votes, args.chunk_size)
+    print(f"{written} sentence pairs combined with {args.method} into {args.output_fp}")
+
+
+if __name__ == "__main__":
+    main()
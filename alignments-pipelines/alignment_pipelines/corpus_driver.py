@@ -0,0 +1,154 @@
+import itertools
+import json
+import os
+
+from .alignment_writer import OUTPUT_FORMATS, AlignmentWriter, model_id
+from .corpus_reader import read_sentence_pairs
+from .instrumentation import NULL_INSTRUMENTATION
+
+
+class CorpusAlignmentDriver:
+    '''
+        Given an aligner pipeline loaded once
+        align whole corpus files pair by pair
+        streaming one output file per matching method
+        with checkpoints so interrupted sweeps resume where they stopped
+    '''
+    def __init__(self, pipeline, tool_name="simalign", batch_size=32, checkpoint_every=256, output_format="tsv"):
+        """
+        Args:
+            pipeline: aligner exposing ``iter_batch(sentence_pairs, batch_size)``, e.g. SimAlignPipeline.
+            tool_name (str): first part of the output model ids.
+            batch_size (int): sentences per encoder forward pass.
+            checkpoint_every (int): number of pairs between two checkpoints.
+            output_format (str): "tsv" for ``src\\ttrg\\talignments`` rows, "pharaoh" for alignments only.
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"'output_format' must be one of {OUTPUT_FORMATS}.")
+        self.pipeline = pipeline
+        self.tool_name = tool_name
+        self.batch_size = batch_size
+        self.checkpoint_every = checkpoint_every
+        self.output_format = output_format
+
+    def model_id(self, matching_method):
+        return model_id(self.tool_name, self.pipeline.model, self.pipeline.token_type, matching_method)
+
+    def output_fp(self, output_prefix, matching_method):
+        return f"{output_prefix}-{self.model_id(matching_method)}.{self.output_format}"
+
+    @staticmethod
+    def checkpoint_fp(output_prefix):
+        return f"{output_prefix}.checkpoint"
+
+    def run_config(self, input_fp):
+        """What a checkpoint is only valid for: the input file and the outputs it was written to."""
+        return {"input_fp": os.path.abspath(input_fp), "tool_name": self.tool_name,
+                "model": str(self.pipeline.model), "token_type": self.pipeline.token_type,
+                "matching_methods": list(self.pipeline.aligner.matching_methods),
+                "output_format": self.output_format}
+
+    def load_checkpoint(self, output_prefix, config):
+        """
+        Load the checkpoint of ``output_prefix`` if it was recorded for ``config``.
+
+        A finished run of another configuration is not resumed: its outputs are finished
+        and the new one starts afresh.
+
+        Raises:
+            ValueError: the checkpoint belongs to an unfinished run of another configuration,
+                whose pairs and ``.tmp`` outputs do not line up with this one.
+        """
+        try:
+            with open(self.checkpoint_fp(output_prefix), 'r') as checkpointf:
+                checkpoint = json.load(checkpointf)
+        except FileNotFoundError:
+            checkpoint = None
+        if checkpoint is not None and checkpoint.get("config") != config:
+            if not checkpoint["done"]:
+                raise ValueError(f"{self.checkpoint_fp(output_prefix)} belongs to an unfinished run of "
+                                 f"{checkpoint.get('config')}; finish it, or remove the checkpoint to start over.")
+            if "config" in checkpoint:
+                self.finish_outputs(output_prefix, checkpoint)
+            checkpoint = None
+        return checkpoint or {"config": config, "completed": 0, "done": False, "sizes": {}}
+
+    def save_checkpoint(self, output_prefix, checkpoint, writer):
+        checkpoint["sizes"] = writer.flush()
+        tmp_fp = f"{self.checkpoint_fp(output_prefix)}.tmp"
+        with open(tmp_fp, 'w') as checkpointf:
+            json.dump(checkpoint, checkpointf)
+        os.replace(tmp_fp, self.checkpoint_fp(output_prefix))
+
+    def finish_outputs(self, output_prefix, checkpoint):
+        """
+        Rename the ``.tmp`` outputs left behind by a run that recorded "done" but
+        stopped before renaming them; they were flushed before the checkpoint, so they are complete.
+        Only the outputs of the configuration recorded in the checkpoint are renamed.
+        """
+        config = checkpoint["config"]
+        for matching_method in checkpoint["sizes"]:
+            output_fp = f"{output_prefix}-" \
+                        f"{model_id(config['tool_name'], config['model'], config['token_type'], matching_method)}" \
+                        f".{config['output_format']}"
+            if os.path.exists(f"{output_fp}.tmp"):
+                os.replace(f"{output_fp}.tmp", output_fp)
+
+    def align_file(self, input_fp, output_prefix):
+        """
+        Align every pair of ``input_fp`` into ``src\\ttrg\\talignments`` rows of
+        ``{output_prefix}-{tool}-{model}-{token_type}-{matching_method}.tsv``, or
+        into alignment lines of ``.pharaoh`` files for the "pharaoh" output format.
+
+        Rows are streamed to ``.tmp`` files that are renamed into place once the
+        whole file is aligned. Pairs already recorded in the checkpoint are
+        skipped, and rows written after the last checkpoint are discarded before resuming.
+        The checkpoint records the input file, model, token type, matching methods and
+        output format: an unfinished run is only resumed with the same ones.
+
+        Returns:
+            int: number of pairs aligned by this call.
+        """
+        checkpoint = self.load_checkpoint(output_prefix, self.run_config(input_fp))
+        if checkpoint["done"]:
+            self.finish_outputs(output_prefix, checkpoint)
+            return 0
+
+        # a run that has not reached its first checkpoint has no rows to keep
+        writer = AlignmentWriter(output_prefix, self.tool_name, self.pipeline.model, self.pipeline.token_type,
+                                 output_format=self.output_format,
+                                 matching_methods=self.pipeline.aligner.matching_methods,
+                                 sizes=checkpoint["sizes"] if checkpoint["completed"] else None)
+        try:
+            sentence_pairs = read_sentence_pairs(input_fp, skip=checkpoint["completed"])
+            text_pairs, token_pairs = itertools.tee(sentence_pairs)
+            instrumentation = getattr(self.pipeline, "instrumentation", NULL_INSTRUMENTATION)
+            aligned = 0
+            for (src, trg), alignments in zip(text_pairs, self.pipeline.iter_batch(token_pairs, self.batch_size)):
+                with instrumentation.stage("write"):
+                    writer.write(alignments, src, trg)
+                aligned += 1
+                checkpoint["completed"] += 1
+                if aligned % self.checkpoint_every == 0:
+                    self.save_checkpoint(output_prefix, checkpoint, writer)
+        except BaseException:
+            writer.abort(discard=False)
+            raise
+
+        # "done" is recorded once every sink is flushed; a crash before the renames is finished by the next run
+        checkpoint["done"] = True
+        self.save_checkpoint(output_prefix, checkpoint, writer)
+        writer.close()
+        return aligned
+
+    def run(self, jobs):
+        """
+        Align several corpus files with the same loaded pipeline.
+
+        Args:
+            jobs (iterable): ``(input_fp, output_prefix)`` pairs.
+
+        Returns:
+            dict: number of pairs aligned per input file.
+        """
+        return {input_fp: self.align_file(input_fp, output_prefix) for input_fp, output_prefix in jobs}
@@ -0,0 +1,172 @@
+"""
+One reader for every corpus format the pipelines take as input:
+
+    xlwa      XL-WA TSV, "src\\ttrg[\\tgold]" lines
+    parallel  "src ||| trg" lines (fast_align / awesome-align input)
+    pharaoh   alignment lines only, "0-0 1-1 2p2"
+    algn      binary alignment corpus (alignment_corpus.py), with or without text
+
+Files are read lazily in chunks of sentence pairs. A chunk keeps the text of
+all its sentences in one string buffer with int32 token offsets into it and
+integer sentence ids (the position of the pair in the file), rather than one
+Python list of words and a concatenated "src-trg" key per pair, and parses
+the gold column of a whole chunk at once into AlignmentArrays. Chunks are
+small and picklable, so they can be fed to the batched aligners or shipped to
+sharded workers as they are.
+"""
+import itertools
+
+import numpy as np
+
+from .alignment_arrays import AlignmentArrays
+from .alignment_corpus import AlignmentCorpus, is_alignment_corpus
+
+FORMATS = ("xlwa", "parallel", "pharaoh", "algn")
+PARALLEL_SEPARATOR = ' ||| '
+
+
+def detect_format(file_path):
+    """Guess the format of ``file_path`` (one of FORMATS) from its first line."""
+    if is_alignment_corpus(file_path):
+        return "algn"
+    with open(file_path, 'r') as file:
+        line = file.readline()
+    if '\t' in line:
+        return "xlwa"
+    if PARALLEL_SEPARATOR in line:
+        return "parallel"
+    return "pharaoh"
+
+
+class SentencePairChunk:
+    """
+    Consecutive sentence pairs of a corpus file.
+
+    The text of sentence ``2 * k`` (source) and ``2 * k + 1`` (target) of pair
+    ``k`` is stored in ``buffer`` as read. Its words, split on single spaces like
+    ``str.split(" ")`` so they line up with the word indices of the gold, are the tokens
+    ``sentence_offsets[s]`` to ``sentence_offsets[s + 1]``, and token ``t`` is
+    ``buffer[token_starts[t]:token_ends[t]]``.
+
+    Iterating yields ``(source words, target words)`` of every pair, the input of
+    the aligners' ``run_batch`` / ``iter_batch``.
+    """
+
+    def __init__(self, ids, sentences=None, alignments=None):
+        """
+        :param ids: Sentence id (position in the file) of every pair.
+        :param sentences: Source and target sentence of every pair, alternating, or None for alignment files.
+        :param alignments: AlignmentArrays of the gold (or Pharaoh) alignments, None if the file has none.
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.alignments = alignments
+        self.buffer = None
+        if sentences is not None:
+            self.buffer, self.token_starts, self.token_ends, self.sentence_offsets = self._index(sentences)
+
+    @staticmethod
+    def _index(sentences):
+        buffer = '\n'.join(sentences)
+        codes = np.frombuffer(buffer.encode('utf-32-le'), dtype=np.uint32)
+        separators = np.flatnonzero((codes == ord(' ')) | (codes == ord('\n'))).astype(np.int32)
+        starts = np.concatenate([np.zeros(1, dtype=np.int32), separators + 1])
+        ends = np.concatenate([separators, np.full(1, len(buffer), dtype=np.int32)])
+        # words are split on single spaces only, so repeated spaces leave empty words, as split(" ") does;
+        # an empty sentence leaves one empty token between its separators, but has no words
+        n_tokens = np.fromiter((sentence.count(' ') + 1 for sentence in sentences), dtype=np.int64,
+                               count=len(sentences))
+        non_empty = np.fromiter((bool(sentence) for sentence in sentences), dtype=bool, count=len(sentences))
+        kept = np.repeat(non_empty, n_tokens)
+        sentence_offsets = np.zeros(len(sentences) + 1, dtype=np.int64)
+        np.cumsum(np.where(non_empty, n_tokens, 0), out=sentence_offsets[1:])
+        return buffer, starts[kept], ends[kept], sentence_offsets
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def has_text(self):
+        return self.buffer is not None
+
+    def _text(self, s):
+        if not self.has_text:
+            raise ValueError("This chunk holds alignments only, no sentence text.")
+        first, last = self.sentence_offsets[s], self.sentence_offsets[s + 1]
+        if first == last:
+            return ''
+        return self.buffer[self.token_starts[first]:self.token_ends[last - 1]]
+
+    def src_text(self, k):
+        """Source sentence of pair ``k``, as read from the file."""
+        return self._text(2 * k)
+
+    def trg_text(self, k):
+        """Target sentence of pair ``k``, as read from the file."""
+        return self._text(2 * k + 1)
+
+    def sentence_pair(self, k):
+        """(source words, target words) of pair ``k``."""
+        src, trg = self.src_text(k), self.trg_text(k)
+        return src.split(' ') if src else [], trg.split(' ') if trg else []
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self.sentence_pair(k)
+
+
+def _split_line(line, file_format, line_number, file_path):
+    columns = line.split('\t') if file_format == "xlwa" else line.split(PARALLEL_SEPARATOR)
+    if len(columns) < 2 or (file_format == "xlwa" and len(columns) > 3) or \
+            (file_format == "parallel" and len(columns) > 2):
+        raise ValueError(f"{file_path}:{line_number + 1} is not a {file_format} sentence pair.")
+    return columns
+
+
+def iter_chunks(file_path, chunk_size=1024, skip=0, file_format=None):
+    """
+    Read a corpus file lazily, ``chunk_size`` sentence pairs at a time.
+
+    :param file_path: Path to a corpus file in one of FORMATS.
+    :param chunk_size: Most sentence pairs per chunk.
+    :param skip: Number of pairs to skip at the start, e.g. when resuming; ids still count them.
+    :param file_format: One of FORMATS, detected from the file if not given.
+    :return: Generator of SentencePairChunk.
+    """
+    file_format = file_format or detect_format(file_path)
+    if file_format not in FORMATS:
+        raise ValueError(f"'file_format' must be one of {FORMATS}.")
+
+    if file_format == "algn":
+        corpus = AlignmentCorpus(file_path)
+        for start in range(skip, len(corpus), chunk_size):
+            stop = min(start + chunk_size, len(corpus))
+            sentences = [text for i in range(start, stop) for text in corpus.sentence_text(i)] \
+                if corpus.has_text else None
+            yield SentencePairChunk(np.arange(start, stop), sentences, corpus.to_arrays(start, stop))
+        return
+
+    with open(file_path, 'r') as file:
+        lines_iter = itertools.islice(file, skip, None)
+        first = skip
+        for lines in iter(lambda: list(itertools.islice(lines_iter, chunk_size)), []):
+            lines = [line.rstrip('\r\n') for line in lines]
+            ids = np.arange(first, first + len(lines))
+            if file_format == "pharaoh":
+                yield SentencePairChunk(ids, alignments=AlignmentArrays.from_lines(lines))
+            else:
+                rows = [_split_line(line, file_format, i, file_path) for i, line in zip(ids.tolist(), lines)]
+                sentences = [sentence for row in rows for sentence in row[:2]]
+                gold = None
+                if file_format == "xlwa" and all(len(row) == 3 for row in rows):
+                    gold = AlignmentArrays.from_lines([row[2].strip() for row in rows])
+                yield SentencePairChunk(ids, sentences, gold)
+            first += len(lines)
+
+
+def read_sentence_pairs(file_path, skip=0, chunk_size=1024):
+    """
+    Yield (source words, target words) of every pair of a sentence file
+    (XL-WA TSV, "src ||| trg" or an ``.algn`` corpus with text), lazily, after skipping the first ``skip``.
+    """
+    for chunk in iter_chunks(file_path, chunk_size, skip):
+        yield from chunk
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Persistent on-disk store of per-sentence subword embeddings.
+
+    Entries live in ``cache_dir`` as one ``.npy`` file per sentence, grouped by
+    namespace (the encoder configuration, e.g. tool, model, token type and
+    layer) and named after a hash of the tokenized sentence. Hits are returned
+    memory-mapped, so reading them back costs no copy. When the store grows
+    over ``max_bytes`` the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None):
+        """
+        :param cache_dir: Directory holding the cache, created if missing.
+        :param max_bytes: Size bound of the stored embeddings, unbounded if not given.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(path) for path in self._entries())
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def namespace(*config):
+        """Build a namespace from the encoder configuration, e.g. ``(tool, model, token_type, layer)``."""
+        return '-'.join(str(field) for field in config)
+
+    def path(self, namespace, tokens):
+        """Location of the entry of a tokenized sentence (a list of words)."""
+        namespace_id = hashlib.sha1(namespace.encode('utf-8')).hexdigest()[:16]
+        sentence_id = hashlib.sha1(json.dumps(list(tokens), ensure_ascii=False).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, namespace_id, sentence_id[:2], f'{sentence_id}.npy')
+
+    def get(self, namespace, tokens):
+        """
+        :return: The memory-mapped embeddings of the sentence, or None if not cached.
+        """
+        path = self.path(namespace, tokens)
+        try:
+            embeddings = np.load(path, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return embeddings
+
+    def put(self, namespace, tokens, embeddings):
+        """Store the embeddings of a sentence, evicting old entries if the cache is full."""
+        path = self.path(namespace, tokens)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, so concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmpf:
+            np.save(tmpf, np.ascontiguousarray(embeddings))
+        size = os.path.getsize(tmp_path)
+        if os.path.exists(path):
+            self.total_bytes -= os.path.getsize(path)
+        os.replace(tmp_path, path)
+        self.total_bytes += size
+        if self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache is under 90% of ``max_bytes``."""
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # evicted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        target = 0.9 * self.max_bytes
+        for _, size, path in entries:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                if filename.endswith('.npy'):
+                    yield os.path.join(root, filename)
@@ -0,0 +1,140 @@
+"""
+Encoder forward passes shared by the pipelines: sliding windows over long
+sentences and length-packed batches.
+
+Sentences longer than ``max_length`` sub-words are not truncated but cut into
+windows of ``max_length`` sub-words starting every ``stride`` sub-words. Each
+window is encoded with its own [CLS]/[SEP] and every sub-word takes its
+vector from the window where it sits furthest from the edges, so the stitched
+sentence keeps one vector per sub-word and every word can be aligned.
+
+Windows are sorted by length and packed into forward passes bounded by
+``max_batch_size`` sequences and ``max_batch_tokens`` padded positions;
+PaddingStats reports the share of encoded positions that were real tokens.
+"""
+import numpy as np
+import torch
+
+from .instrumentation import NULL_INSTRUMENTATION
+from .tokenization import pad_batch
+
+
+def iter_windows(n_subwords, max_length, stride):
+    """
+    Cut ``n_subwords`` positions into overlapping windows.
+
+    Yields:
+        ``(start, end, keep_start, keep_end)``: the window covers ``[start, end)`` and
+        provides the vectors of ``[keep_start, keep_end)``; kept ranges tile the sentence.
+    """
+    if n_subwords <= max_length:
+        yield 0, n_subwords, 0, n_subwords
+        return
+    overlap = max_length - stride
+    start = 0
+    while True:
+        end = min(start + max_length, n_subwords)
+        last = end == n_subwords
+        keep_start = start + overlap // 2 if start else 0
+        keep_end = end if last else end - (overlap - overlap // 2)
+        yield start, end, keep_start, keep_end
+        if last:
+            break
+        start += stride
+
+
+def pack_by_length(lengths, max_batch_size, max_batch_tokens=None):
+    """
+    Group sequences of similar length into batches.
+
+    :param lengths: Length of every sequence.
+    :param max_batch_size: Most sequences per batch.
+    :param max_batch_tokens: Most padded positions (sequences x longest) per batch.
+    :return: Lists of sequence indices, shortest sequences first.
+    """
+    batches, batch = [], []
+    for i in np.argsort(lengths, kind='stable').tolist():
+        if batch and (len(batch) >= max_batch_size or
+                      (max_batch_tokens is not None and (len(batch) + 1) * lengths[i] > max_batch_tokens)):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class PaddingStats:
+    """Real and padded positions of the forward passes so far."""
+
+    def __init__(self):
+        self.real = self.padded = 0
+
+    def add(self, real, padded):
+        self.real += real
+        self.padded += padded
+
+    @property
+    def efficiency(self):
+        """Share of encoded positions holding a token rather than padding."""
+        return self.real / self.padded if self.padded else 1.0
+
+
+class WindowedEncoder:
+    """Hidden states of one encoder layer for tokenized sentences of any length."""
+
+    def __init__(self, model, tokenizer, layer, device=None, max_length=None, stride=None, max_batch_tokens=None):
+        """
+        :param model: transformers encoder.
+        :param tokenizer: Its tokenizer, for the special token ids.
+        :param layer: Hidden layer whose states are returned.
+        :param device: Torch device of the model, CPU if not given.
+        :param max_length: Sub-words per window, defaults to the longest input the model takes minus [CLS]/[SEP].
+        :param stride: Sub-words between the starts of two windows, defaults to 3/4 of ``max_length``.
+        :param max_batch_tokens: Most padded positions per forward pass, unbounded if not given.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.layer = layer
+        self.device = device or torch.device('cpu')
+        model_length = min(tokenizer.model_max_length, getattr(model.config, "max_position_embeddings", np.inf))
+        self.max_length = max_length or int(model_length) - 2
+        self.stride = stride or max(1, 3 * self.max_length // 4)
+        if not 0 < self.stride <= self.max_length:
+            raise ValueError("'stride' must be between 1 and 'max_length'.")
+        self.max_batch_tokens = max_batch_tokens
+        self.padding = PaddingStats()
+
+    def encode(self, tokenized, max_batch_size=32, instrumentation=NULL_INSTRUMENTATION):
+        """
+        :param tokenized: TokenizedSentence of every sentence.
+        :param max_batch_size: Most windows per forward pass.
+        :param instrumentation: Counts windows and real and padded positions.
+        :return: One (n_subwords, hidden size) tensor per sentence, on the model's device,
+                 without [CLS]/[SEP].
+        """
+        windows = [(k, *window) for k, tokens in enumerate(tokenized)
+                   for window in iter_windows(tokens.n_subwords, self.max_length, self.stride)]
+        lengths = [end - start for _, start, end, _, _ in windows]
+        instrumentation.count("windows", len(windows))
+
+        outputs = [None] * len(windows)
+        for batch in pack_by_length(lengths, max_batch_size, self.max_batch_tokens):
+            input_ids, attention_mask = pad_batch(
+                    [tokenized[windows[w][0]].ids[windows[w][1]:windows[w][2]] for w in batch],
+                    self.tokenizer.cls_token_id, self.tokenizer.sep_token_id, self.tokenizer.pad_token_id)
+            real = int(attention_mask.sum())
+            self.padding.add(real, attention_mask.size)
+            instrumentation.count("encoded_positions", real)
+            instrumentation.count("padded_positions", attention_mask.size)
+            with torch.no_grad():
+                hidden = self.model(input_ids=torch.from_numpy(input_ids).to(self.device),
+                                    attention_mask=torch.from_numpy(attention_mask).to(self.device),
+                                    output_hidden_states=True).hidden_states[self.layer].float()
+            for row, w in enumerate(batch):
+                outputs[w] = hidden[row, 1:lengths[w] + 1]
+
+        pieces = [[] for _ in tokenized]
+        for (k, start, _, keep_start, keep_end), output in zip(windows, outputs):
+            pieces[k].append(output[keep_start - start:keep_end - start])
+        return [parts[0] if len(parts) == 1 else torch.cat(parts) for parts in pieces]
@@ -0,0 +1,71 @@
+"""
+Reduced-precision and reduced-depth CPU inference for the aligner encoders.
+
+Alignments only read the hidden states of one layer, so every layer above it
+(and the pooler) is wasted compute and can be dropped without changing them.
+On top of that the encoder can run with
+
+    fp32   full precision, the reference
+    bf16   bfloat16 weights and activations, where the CPU supports it
+    int8   dynamic int8 quantization of the linear layers (weights int8,
+           activations quantized on the fly)
+
+bf16 and int8 change the embeddings slightly; benchmarks/inference_modes.py
+measures the resulting AER and speed on XL-WA.
+"""
+import warnings
+
+import torch
+
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+def truncate_layers(model, layer):
+    """
+    Drop the transformer layers above ``layer`` and the pooler; ``hidden_states[layer]`` is unchanged.
+
+    :return: The number of layers removed.
+    """
+    encoder_layers = getattr(getattr(model, "encoder", None), "layer", None)
+    if not isinstance(encoder_layers, torch.nn.ModuleList) or not 0 < layer <= len(encoder_layers):
+        warnings.warn(f"Cannot truncate {type(model).__name__} to layer {layer}, keeping all layers.")
+        return 0
+    removed = len(encoder_layers) - layer
+    model.encoder.layer = encoder_layers[:layer]
+    model.config.num_hidden_layers = layer
+    if getattr(model, "pooler", None) is not None:
+        model.pooler = None
+    return removed
+
+
+def bf16_available():
+    """Whether bfloat16 matrix multiplications run on this CPU."""
+    try:
+        x = torch.ones(2, 2, dtype=torch.bfloat16)
+        return bool(torch.isfinite(x @ x).all())
+    except RuntimeError:
+        return False
+
+
+def prepare_encoder(model, layer, precision="fp32", truncate=True):
+    """
+    Prepare an encoder for CPU inference.
+
+    :param model: transformers encoder, in eval mode.
+    :param layer: Hidden layer the alignments are taken from.
+    :param precision: One of PRECISIONS; bf16 falls back to fp32 when unsupported.
+    :param truncate: Drop the layers above ``layer``.
+    :return: The model to run, which is a new module for int8.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"'precision' must be one of {PRECISIONS}.")
+    if truncate:
+        truncate_layers(model, layer)
+    if precision == "bf16":
+        if bf16_available():
+            model = model.to(torch.bfloat16)
+        else:
+            warnings.warn("bfloat16 is not supported on this CPU, running in fp32.")
+    elif precision == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
@@ -0,0 +1,152 @@
+"""
+Stage timers, counters and profiling hooks for the aligner pipelines.
+
+Pipelines take an optional ``instrumentation`` object and wrap their hot
+paths in ``instrumentation.stage(name)`` ("tokenize", "encode", "similarity",
+"matching", "write") and ``instrumentation.count(name, n)`` ("pairs",
+"subwords", "truncations", ...). The default, NULL_INSTRUMENTATION, does
+nothing; pass an Instrumentation to collect a summary::
+
+    instrumentation = Instrumentation()
+    pipeline = SimAlignPipeline(model="bert", token_type="bpe", matching_methods="mai",
+                                instrumentation=instrumentation)
+    with profile("align.prof"):
+        pipeline.run_batch(sentence_pairs)
+    print(instrumentation.report())
+
+Nothing is printed by the pipelines themselves: they log to the
+"alignment_pipelines" logger, which stays silent unless configure_logging()
+or the application sets up a handler.
+"""
+import collections
+import contextlib
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+
+logger = logging.getLogger("alignment_pipelines")
+logger.addHandler(logging.NullHandler())
+
+
+class Instrumentation:
+    """Accumulates wall time per stage and named counters."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seconds = collections.Counter()
+        self.calls = collections.Counter()
+        self.counters = collections.Counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the enclosed block under ``name``; nested stages are counted in both."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def summary(self):
+        """:return: ``{"stages": {name: {"seconds", "calls"}}, "counters": {name: value}}``."""
+        return {
+            "stages": {name: {"seconds": self.seconds[name], "calls": self.calls[name]} for name in self.seconds},
+            "counters": dict(self.counters),
+        }
+
+    def report(self):
+        """Human readable table of the summary, slowest stage first."""
+        total = sum(self.seconds.values()) or 1.0
+        lines = [f"{'stage':<18}{'seconds':>10}{'share':>8}{'calls':>10}"]
+        for name, seconds in self.seconds.most_common():
+            lines.append(f"{name:<18}{seconds:10.3f}{100 * seconds / total:7.1f}%{self.calls[name]:10d}")
+        lines.extend(f"{name:<18}{value:>10}" for name, value in sorted(self.counters.items()))
+        if self.counters["padded_positions"]:
+            efficiency = self.counters["encoded_positions"] / self.counters["padded_positions"]
+            lines.append(f"{'padding efficiency':<18}{100 * efficiency:9.1f}%")
+        return "\n".join(lines)
+
+    def log_summary(self, level=logging.INFO):
+        logger.log(level, "instrumentation summary", extra={"summary": self.summary()})
+
+
+class NullInstrumentation(Instrumentation):
+    """Default instrumentation, records nothing."""
+
+    def stage(self, name):
+        return contextlib.nullcontext()
+
+    def count(self, name, value=1):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with any ``extra`` fields passed to the logger."""
+
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        entry.update({key: value for key, value in vars(record).items() if key not in self.RESERVED})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=logging.INFO, structured=False, stream=None):
+    """
+    Send the pipelines' log records to ``stream`` (stderr by default).
+
+    :param level: Lowest level logged, DEBUG also logs every aligned pair.
+    :param structured: Log JSON lines instead of plain text.
+    """
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonFormatter() if structured else
+                         logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
+
+
+@contextlib.contextmanager
+def profile(output_fp=None, use_torch=False, sort_by="cumulative", limit=25):
+    """
+    Profile the enclosed block with cProfile, or torch.profiler when ``use_torch``.
+
+    :param output_fp: Where to save the profile, a pstats dump (cProfile) or a
+                      chrome trace (torch.profiler); the top ``limit`` entries are logged either way.
+    :param sort_by: pstats sort key for the logged entries.
+    """
+    if use_torch:
+        import torch.profiler
+
+        with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True) as prof:
+            yield prof
+        if output_fp:
+            prof.export_chrome_trace(output_fp)
+        logger.info("torch profile\n%s", prof.key_averages().table(sort_by="cpu_time_total", row_limit=limit))
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if output_fp:
+            profiler.dump_stats(output_fp)
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats(sort_by).print_stats(limit)
+        logger.info("cProfile\n%s", text.getvalue())
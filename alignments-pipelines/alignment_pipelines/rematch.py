@@ -0,0 +1,262 @@
+"""
+Store SimAlign similarity matrices and re-run matching strategies on them.
+
+SimAlignPipeline can persist, for every sentence pair, the similarity matrix
+its matching methods run on, together with the word index of every row and
+column (sub-words map to their word when ``token_type="bpe"``). This module
+reads them back and applies argmax ("inter", "fwd", "rev"), "itermax", "mwmf"
+and awesome-align style "softmax" thresholding with NumPy, so trying another
+matching strategy or threshold does not need the transformer again.
+
+File layout (``.sim``), all integers little-endian::
+
+    header   magic b"SIMM", version (u16), dtype (u16, 0 float16 / 1 float32), n_pairs (u64)
+    shapes   u64[n_pairs, 2]        rows and columns of every matrix
+    maps     i32[sum(rows + cols)]  word index of every row, then of every column
+    data     float[sum(rows * cols)]
+
+usage: python -m alignment_pipelines.rematch pt_test.sim ./outputs/pt_test --methods inter,itermax,softmax
+"""
+import argparse
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+MAGIC = b'SIMM'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')
+DTYPES = {0: np.dtype('<f2'), 1: np.dtype('<f4')}
+MATCHING_METHODS = ("fwd", "rev", "inter", "itermax", "mwmf", "softmax")
+
+
+class SimilarityWriter:
+    """
+    Write similarity matrices one sentence pair at a time.
+
+    Maps and matrices are spooled to temporary files and assembled on ``close()``.
+    """
+
+    def __init__(self, file_path, dtype=np.float16):
+        """
+        :param file_path: Path of the ``.sim`` file to write.
+        :param dtype: Storage precision, float16 (default) or float32. float16 halves the
+                      size but rounding can flip near-tied argmax decisions.
+        """
+        self.file_path = file_path
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        self.dtype_code = {value: key for key, value in DTYPES.items()}[self.dtype]
+        directory = os.path.dirname(os.path.abspath(file_path))
+        self._maps = tempfile.TemporaryFile(dir=directory)
+        self._data = tempfile.TemporaryFile(dir=directory)
+        self.shapes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def write(self, sim, src_map, trg_map):
+        """
+        Append the similarity matrix of one sentence pair.
+
+        :param sim: (rows, cols) similarity matrix.
+        :param src_map: Word index of every row.
+        :param trg_map: Word index of every column.
+        """
+        sim = np.asarray(sim)
+        if sim.shape != (len(src_map), len(trg_map)):
+            raise ValueError("src_map and trg_map must have one entry per row and column of sim.")
+        self.shapes.append(sim.shape)
+        self._maps.write(np.concatenate([src_map, trg_map]).astype('<i4').tobytes())
+        self._data.write(sim.astype(self.dtype).tobytes())
+
+    def close(self):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.file_path)), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as outf:
+            outf.write(HEADER.pack(MAGIC, VERSION, self.dtype_code, len(self.shapes)))
+            outf.write(np.asarray(self.shapes, dtype='<u8').reshape(-1, 2).tobytes())
+            for spool in (self._maps, self._data):
+                spool.seek(0)
+                while chunk := spool.read(1 << 20):
+                    outf.write(chunk)
+        os.replace(tmp_path, self.file_path)
+        self._discard()
+
+    def _discard(self):
+        self._maps.close()
+        self._data.close()
+
+
+class SimilarityMatrices:
+    """Memory-mapped reader of a ``.sim`` file; ``matrices[i]`` is ``(sim, src_map, trg_map)``."""
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as file:
+            magic, version, dtype_code, n_pairs = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{file_path} is not a similarity matrix file.")
+        self.file_path = file_path
+        shapes_size = n_pairs * 2 * 8
+        self.shapes = np.fromfile(file_path, dtype='<u8', count=2 * n_pairs, offset=HEADER.size).reshape(-1, 2)
+        self.shapes = self.shapes.astype(np.int64)
+        self.map_offsets = np.concatenate([[0], np.cumsum(self.shapes.sum(1))])
+        self.data_offsets = np.concatenate([[0], np.cumsum(self.shapes.prod(1))])
+        maps_start = HEADER.size + shapes_size
+        data_start = maps_start + 4 * int(self.map_offsets[-1])
+        self.maps = np.memmap(file_path, dtype='<i4', mode='r', offset=maps_start,
+                              shape=(int(self.map_offsets[-1]),)) if self.map_offsets[-1] else np.zeros(0, '<i4')
+        dtype = DTYPES[dtype_code]
+        self.data = np.memmap(file_path, dtype=dtype, mode='r', offset=data_start,
+                              shape=(int(self.data_offsets[-1]),)) if self.data_offsets[-1] else np.zeros(0, dtype)
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __getitem__(self, i):
+        rows, cols = self.shapes[i]
+        maps = np.asarray(self.maps[self.map_offsets[i]:self.map_offsets[i + 1]])
+        sim = np.asarray(self.data[self.data_offsets[i]:self.data_offsets[i + 1]], dtype=np.float64)
+        return sim.reshape(rows, cols), maps[:rows], maps[rows:]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def argmax_matrices(sim):
+    """Forward (row-wise) and reverse (column-wise) argmax alignment matrices, as booleans."""
+    m, n = sim.shape
+    forward = np.zeros((m, n), dtype=bool)
+    backward = np.zeros((m, n), dtype=bool)
+    if sim.size:
+        forward[np.arange(m), sim.argmax(axis=1)] = True
+        backward[sim.argmax(axis=0), np.arange(n)] = True
+    return forward, backward
+
+
+def iter_max(sim, max_count=2, alpha_ratio=0.9):
+    """SimAlign's IterMax: repeat the argmax intersection on rows and columns left unaligned."""
+    m, n = sim.shape
+    forward, backward = argmax_matrices(sim)
+    inter = (forward & backward).astype(np.float64)
+    if min(m, n) <= 2:
+        return inter
+
+    count = 1
+    while count < max_count:
+        mask_x = 1.0 - inter.sum(1)[:, np.newaxis].clip(0.0, 1.0)
+        mask_y = 1.0 - inter.sum(0)[np.newaxis, :].clip(0.0, 1.0)
+        mask = ((alpha_ratio * mask_x) + (alpha_ratio * mask_y)).clip(0.0, 1.0)
+        mask_zeros = 1.0 - ((1.0 - mask_x) * (1.0 - mask_y))
+        if mask_x.sum() * n < 1.0 or mask_y.sum() * m < 1.0:
+            mask = mask * 0.0
+            mask_zeros = mask_zeros * 0.0
+
+        forward, backward = argmax_matrices(sim * mask)
+        new_inter = (forward & backward) * mask_zeros
+        if np.array_equal(inter + new_inter, inter):
+            break
+        inter = inter + new_inter
+        count += 1
+    return inter
+
+
+def max_weight_match(sim):
+    """Maximum weight matching ("mwmf") with maximal cardinality, via the Hungarian algorithm."""
+    from scipy.optimize import linear_sum_assignment
+
+    matching = np.zeros(sim.shape, dtype=bool)
+    if sim.size:
+        rows, cols = linear_sum_assignment(sim, maximize=True)
+        matching[rows, cols] = True
+    return matching
+
+
+def softmax_threshold(sim, threshold=1e-3, temperature=0.05):
+    """
+    awesome-align style alignment: both directional softmaxes above ``threshold``.
+
+    SimAlign similarities lie in [0, 1] rather than being raw dot products, hence
+    the ``temperature`` dividing them before the softmax.
+    """
+    if not sim.size:
+        return np.zeros(sim.shape, dtype=bool)
+    logits = sim / temperature
+    srctgt = np.exp(logits - logits.max(axis=1, keepdims=True))
+    srctgt /= srctgt.sum(axis=1, keepdims=True)
+    tgtsrc = np.exp(logits - logits.max(axis=0, keepdims=True))
+    tgtsrc /= tgtsrc.sum(axis=0, keepdims=True)
+    return (srctgt > threshold) & (tgtsrc > threshold)
+
+
+def to_word_alignments(matrix, src_map, trg_map):
+    """Sorted, deduplicated (source word, target word) links of a row x column alignment matrix."""
+    rows, cols = np.nonzero(matrix)
+    if not len(rows):
+        return []
+    links = np.unique(np.stack([np.asarray(src_map)[rows], np.asarray(trg_map)[cols]], axis=1), axis=0)
+    return list(map(tuple, links.tolist()))
+
+
+def match(sim, src_map, trg_map, matching_methods=("inter", "itermax", "mwmf"), threshold=1e-3, temperature=0.05):
+    """
+    Apply matching methods to one similarity matrix.
+
+    :return: ``{matching_method: word alignments}`` like SimAlignPipeline returns.
+    """
+    unknown = set(matching_methods) - set(MATCHING_METHODS)
+    if unknown:
+        raise ValueError(f"Unknown matching methods {sorted(unknown)}, expected some of {MATCHING_METHODS}.")
+    matrices = {}
+    if {"fwd", "rev", "inter"} & set(matching_methods):
+        matrices["fwd"], matrices["rev"] = argmax_matrices(sim)
+        matrices["inter"] = matrices["fwd"] & matrices["rev"]
+    if "itermax" in matching_methods:
+        matrices["itermax"] = iter_max(sim)
+    if "mwmf" in matching_methods:
+        matrices["mwmf"] = max_weight_match(sim)
+    if "softmax" in matching_methods:
+        matrices["softmax"] = softmax_threshold(sim, threshold, temperature)
+    return {method: to_word_alignments(matrices[method], src_map, trg_map) for method in matching_methods}
+
+
+def rematch(similarity_fp, matching_methods=("inter", "itermax", "mwmf"), threshold=1e-3, temperature=0.05):
+    """Yield ``{matching_method: word alignments}`` for every pair stored in ``similarity_fp``."""
+    for sim, src_map, trg_map in SimilarityMatrices(similarity_fp):
+        yield match(sim, src_map, trg_map, matching_methods, threshold, temperature)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("similarity_fp")
+    parser.add_argument("output_prefix", help="writes {output_prefix}-{matching_method}.pharaoh")
+    parser.add_argument("--methods", default="inter,itermax,mwmf")
+    parser.add_argument("--threshold", type=float, default=1e-3)
+    parser.add_argument("--temperature", type=float, default=0.05)
+    args = parser.parse_args(argv)
+
+    matching_methods = args.methods.split(",")
+    outputs = {method: open(f"{args.output_prefix}-{method}.pharaoh", "w") for method in matching_methods}
+    start = time.perf_counter()
+    n_pairs = 0
+    try:
+        for alignments in rematch(args.similarity_fp, matching_methods, args.threshold, args.temperature):
+            for method, outf in outputs.items():
+                outf.write(" ".join(f"{i}-{j}" for i, j in alignments[method]) + "\n")
+            n_pairs += 1
+    finally:
+        for outf in outputs.values():
+            outf.close()
+    elapsed = time.perf_counter() - start
+    print(f"{n_pairs} pairs re-matched in {elapsed:.3f}s ({1000 * elapsed / max(n_pairs, 1):.2f} ms/pair)")
+
+
+if __name__ == "__main__":
+    main()
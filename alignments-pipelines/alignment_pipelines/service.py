@@ -0,0 +1,326 @@
+"""
+Serve SimAlign alignments to other processes over local HTTP or a Unix socket.
+
+Incoming sentence pairs are queued and coalesced into micro-batches of at most
+``max_batch_size`` pairs, waiting at most ``max_wait_ms`` for a batch to fill.
+Batches run one at a time on the loaded pipeline in a worker thread, so the
+event loop keeps accepting requests while the encoder is busy and the next
+batch grows with the load. Once ``max_queue`` pairs are waiting new requests
+are rejected with 503 instead of piling up. Pairs with an empty side are
+rejected with 400 before they are queued; if the aligner still fails on a
+batch, it is retried pair by pair so only the requests of the failing pairs
+get a 500.
+
+Endpoints::
+
+    POST /align   {"src": "...", "trg": "..."}          -> {"alignments": {method: [[i, j], ...]}}
+                  {"pairs": [["...", "..."], ...]}       -> {"alignments": [{method: [[i, j], ...]}, ...]}
+    GET  /stats   queue depth, batch sizes and p50/p99 latency
+
+usage: python -m alignment_pipelines.service --model bert --port 8000
+       python -m alignment_pipelines.service --model bert --unix-socket /tmp/alignments.sock
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import time
+
+import numpy as np
+
+STATUS_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                  500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ServiceOverloaded(Exception):
+    """Raised when the request queue is full."""
+
+
+def is_sentence(sentence):
+    """True for a non-empty sentence, as a string or a list of words."""
+    if isinstance(sentence, str):
+        return bool(sentence.split())
+    return isinstance(sentence, list) and bool(sentence) and all(isinstance(word, str) for word in sentence)
+
+
+class LatencyStats:
+    """Latencies of the last ``window`` requests, in seconds."""
+
+    def __init__(self, window=10000):
+        self.latencies = collections.deque(maxlen=window)
+
+    def record(self, seconds):
+        self.latencies.append(seconds)
+
+    def percentile(self, q):
+        """:return: The ``q``-th percentile in milliseconds, or None before any request."""
+        if not self.latencies:
+            return None
+        return 1000 * float(np.percentile(np.fromiter(self.latencies, dtype=np.float64), q))
+
+
+class AlignmentService:
+    '''
+        Given a loaded aligner pipeline
+        queue the sentence pairs of concurrent requests
+        align them in micro-batches on a worker thread
+        resolving each request with its alignments
+    '''
+    def __init__(self, pipeline, max_batch_size=32, max_wait_ms=5, max_queue=1024):
+        """
+        Args:
+            pipeline: aligner exposing ``run_batch(sentence_pairs, batch_size)``, e.g. SimAlignPipeline.
+            max_batch_size (int): most pairs aligned together.
+            max_wait_ms (float): longest a pair waits for its batch to fill.
+            max_queue (int): most pairs waiting before requests are rejected.
+        """
+        if max_batch_size < 1:
+            raise ValueError("'max_batch_size' must be a positive integer.")
+        self.pipeline = pipeline
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.queue = None
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="aligner")
+        self.batcher = None
+        self.latency = LatencyStats()
+        self.counts = collections.Counter()
+
+    async def start(self):
+        """Start the batching loop on the running event loop."""
+        if self.batcher is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+            self.batcher = asyncio.create_task(self._batch_loop())
+
+    async def close(self):
+        if self.batcher is not None:
+            self.batcher.cancel()
+            try:
+                await self.batcher
+            except asyncio.CancelledError:
+                pass
+            self.batcher = None
+        self.executor.shutdown()
+
+    async def align(self, src_sentence_tokens, trg_sentence_tokens):
+        """
+        Align one sentence pair.
+
+        Returns:
+            dict: ``{matching_method: alignments}``, as ``SimAlignPipeline.run`` returns.
+        """
+        return (await self.align_many([(src_sentence_tokens, trg_sentence_tokens)]))[0]
+
+    async def align_many(self, sentence_pairs):
+        """
+        Align several sentence pairs, which may end up in different batches.
+
+        Raises:
+            ServiceOverloaded: if the queue has no room for all of them.
+        """
+        await self.start()
+        if self.queue.maxsize - self.queue.qsize() < len(sentence_pairs):
+            self.counts["rejected"] += 1
+            raise ServiceOverloaded(f"No room for {len(sentence_pairs)} sentence pairs, "
+                                    f"{self.queue.qsize()} of {self.queue.maxsize} already queued.")
+        self.counts["requests"] += 1
+        loop = asyncio.get_running_loop()
+        futures = []
+        for pair in sentence_pairs:
+            future = loop.create_future()
+            self.queue.put_nowait((pair, future, time.perf_counter()))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batch_loop(self):
+        while True:
+            batch = [item for item in await self._next_batch() if not item[1].done()]  # drop cancelled callers
+            if not batch:
+                continue
+            try:
+                await self._run_batch(batch)
+            except Exception as error:
+                # whatever failed, the callers of this batch get an error and the next batches still run
+                for _, future, _ in batch:
+                    if not future.done():
+                        self.counts["errors"] += 1
+                        future.set_exception(error)
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        pairs = [pair for pair, _, _ in batch]
+        try:
+            results = await loop.run_in_executor(self.executor, self.pipeline.run_batch, pairs, self.max_batch_size)
+            if len(results) != len(batch):
+                raise RuntimeError(f"{len(results)} alignments returned for {len(batch)} sentence pairs.")
+        except Exception:
+            # one bad pair must not fail the other callers of its batch: retry pair by pair
+            self.counts["failed_batches"] += 1
+            await self._run_one_by_one(batch)
+            return
+
+        now = time.perf_counter()
+        self.counts["batches"] += 1
+        self.counts["pairs"] += len(batch)
+        for (_, future, enqueued), alignments in zip(batch, results):
+            self.latency.record(now - enqueued)
+            if not future.done():
+                future.set_result(alignments)
+
+    async def _run_one_by_one(self, batch):
+        loop = asyncio.get_running_loop()
+        for pair, future, enqueued in batch:
+            if future.done():
+                continue
+            try:
+                alignments = (await loop.run_in_executor(self.executor, self.pipeline.run_batch, [pair], 1))[0]
+            except Exception as error:
+                self.counts["errors"] += 1
+                if not future.done():
+                    future.set_exception(error)
+                continue
+            self.counts["batches"] += 1
+            self.counts["pairs"] += 1
+            self.latency.record(time.perf_counter() - enqueued)
+            if not future.done():
+                future.set_result(alignments)
+
+    def stats(self):
+        return {
+            "requests": self.counts["requests"],
+            "rejected": self.counts["rejected"],
+            "pairs": self.counts["pairs"],
+            "batches": self.counts["batches"],
+            "failed_batches": self.counts["failed_batches"],
+            "errors": self.counts["errors"],
+            "mean_batch_size": self.counts["pairs"] / self.counts["batches"] if self.counts["batches"] else None,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "p50_ms": self.latency.percentile(50),
+            "p99_ms": self.latency.percentile(99),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": 1000 * self.max_wait,
+        }
+
+    async def serve(self, host="127.0.0.1", port=8000, unix_socket=None):
+        """Serve the HTTP endpoints until cancelled, on ``unix_socket`` if given, else on ``host:port``."""
+        await self.start()
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(self._handle_connection, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode('latin-1').split()
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                content_length = headers.get('content-length', '0')
+                if len(parts) != 3 or not content_length.isdigit():
+                    # the rest of the stream cannot be framed, answer and hang up
+                    await self._respond(writer, 400, {"error": "malformed HTTP request"}, keep_alive=False)
+                    break
+                method, path, version = parts
+                body = await reader.readexactly(int(content_length))
+
+                status, payload = await self._route(method, path, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        content = json.dumps(payload).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + content)
+        await writer.drain()
+
+    async def _route(self, method, path, body):
+        if path == "/stats":
+            return (200, self.stats()) if method == "GET" else (405, {"error": "use GET"})
+        if path != "/align":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        try:
+            request = json.loads(body)
+            single = "pairs" not in request
+            pairs = [(request["src"], request["trg"])] if single else [tuple(pair) for pair in request["pairs"]]
+            if any(len(pair) != 2 for pair in pairs):
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            return 400, {"error": 'expected {"src": ..., "trg": ...} or {"pairs": [[src, trg], ...]}'}
+        invalid = [k for k, pair in enumerate(pairs) if not all(is_sentence(sentence) for sentence in pair)]
+        if invalid:
+            return 400, {"error": "src and trg must be non-empty strings or lists of strings",
+                         "invalid_pairs": invalid}
+
+        try:
+            results = await self.align_many(pairs)
+        except ServiceOverloaded as error:
+            return 503, {"error": str(error)}
+        except Exception as error:
+            return 500, {"error": f"{type(error).__name__}: {error}"}
+        return 200, {"alignments": results[0] if single else results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="bert")
+    parser.add_argument("--token-type", default="bpe")
+    parser.add_argument("--matching-methods", default="mai")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--unix-socket", default=None)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--max-queue", type=int, default=1024)
+    args = parser.parse_args(argv)
+
+    from .simAlignPipeline import SimAlignPipeline
+
+    pipeline = SimAlignPipeline(model=args.model, token_type=args.token_type, matching_methods=args.matching_methods)
+    service = AlignmentService(pipeline, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                               max_queue=args.max_queue)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
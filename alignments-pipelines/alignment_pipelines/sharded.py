@@ -0,0 +1,174 @@
+"""
+Align a corpus across several processes, each holding its own SimAlign model.
+
+The input is cut into chunks of ``chunk_size`` pairs that are handed to a pool
+of ``workers`` processes, each one running PyTorch with ``threads_per_worker``
+intra-op threads. Results come back in input order and are streamed into one
+output file per matching method, so ``workers`` x ``threads_per_worker`` can be
+tuned to the machine without changing the outputs.
+
+usage: python -m alignment_pipelines.sharded ../data/XL-WA/data/pt/test.tsv ./outputs/pt_test.tsv
+                                             --workers 8 --threads 4
+"""
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import time
+
+from .alignment_writer import OUTPUT_FORMATS, AlignmentWriter
+from .corpus_reader import iter_chunks
+from .instrumentation import NULL_INSTRUMENTATION
+
+_pipeline = None
+
+
+def _init_worker(pipeline_kwargs, threads_per_worker):
+    import torch
+    from .simAlignPipeline import SimAlignPipeline
+
+    global _pipeline
+    torch.set_num_threads(threads_per_worker)
+    _pipeline = SimAlignPipeline(**pipeline_kwargs)
+
+
+def _align_chunk(chunk, batch_size):
+    return _pipeline.run_batch(list(chunk), batch_size=batch_size)
+
+
+class ShardedAligner:
+    '''
+        Given SimAlign configs
+        start a pool of worker processes, one aligner each
+        align corpus files chunk by chunk across the pool
+        merging the outputs back in input order
+    '''
+    def __init__(self, model, token_type, matching_methods, workers=None, threads_per_worker=None,
+                 chunk_size=256, batch_size=32, tool_name="simalign", output_format="tsv", instrumentation=None,
+                 precision="fp32"):
+        """
+        Args:
+            model (str): SimAlign model, e.g. "bert".
+            token_type (str): "bpe" or "word".
+            matching_methods (str): SimAlign matching methods, e.g. "mai".
+            workers (int): number of worker processes, defaults to 1.
+            threads_per_worker (int): torch intra-op threads per worker, defaults to cpu_count // workers.
+            chunk_size (int): pairs sent to a worker at once.
+            batch_size (int): sentences per encoder forward pass inside a worker.
+            tool_name (str): first part of the output model ids.
+            output_format (str): "tsv" for ``src\\ttrg\\talignments`` rows, "pharaoh" for alignments only.
+            instrumentation (instrumentation.Instrumentation): optionally times waiting on the
+                workers ("align") and writing the outputs ("write") in the main process.
+            precision (str): encoder inference backend of every worker, "fp32", "bf16" or "int8".
+        """
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"'output_format' must be one of {OUTPUT_FORMATS}.")
+        self.pipeline_kwargs = {"model": model, "token_type": token_type, "matching_methods": matching_methods,
+                                "precision": precision}
+        self.workers = workers or 1
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.tool_name = tool_name
+        self.output_format = output_format
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        self.executor = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """Start the worker processes; each loads the model once."""
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.pipeline_kwargs, self.threads_per_worker))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def writer(self, output_prefix):
+        return AlignmentWriter(output_prefix, self.tool_name, self.pipeline_kwargs["model"],
+                               self.pipeline_kwargs["token_type"], output_format=self.output_format)
+
+    def output_fp(self, output_prefix, matching_method):
+        return self.writer(output_prefix).output_fp(matching_method)
+
+    def align_file(self, input_fp, output_prefix):
+        """
+        Align every pair of ``input_fp`` into one file per matching method,
+        ``{output_prefix}-{tool}-{model}-{token_type}-{matching_method}.{tsv|pharaoh}``.
+
+        At most two chunks per worker are in flight, so memory stays bounded,
+        and output files are only renamed into place once complete.
+
+        Returns:
+            int: number of aligned pairs.
+        """
+        self.start()
+        chunks = iter_chunks(input_fp, self.chunk_size)
+        pending = collections.deque()
+        aligned = 0
+
+        def submit(n_chunks):
+            for chunk in itertools.islice(chunks, n_chunks):
+                pending.append((chunk, self.executor.submit(_align_chunk, chunk, self.batch_size)))
+
+        try:
+            with self.writer(output_prefix) as writer:
+                submit(2 * self.workers)
+                while pending:
+                    chunk, future = pending.popleft()
+                    with self.instrumentation.stage("align"):
+                        results = future.result()
+                    submit(1)
+
+                    with self.instrumentation.stage("write"):
+                        for k, alignments in enumerate(results):
+                            writer.write(alignments, chunk.src_text(k), chunk.trg_text(k))
+                    self.instrumentation.count("pairs", len(chunk))
+                    aligned += len(chunk)
+        except BaseException:
+            for pending_chunk, future in pending:
+                future.cancel()
+            raise
+        return aligned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_fp")
+    parser.add_argument("output_prefix")
+    parser.add_argument("--model", default="bert")
+    parser.add_argument("--token-type", default="bpe")
+    parser.add_argument("--matching-methods", default="mai")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=None, help="torch threads per worker")
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="tsv")
+    parser.add_argument("--precision", choices=("fp32", "bf16", "int8"), default="fp32")
+    args = parser.parse_args(argv)
+
+    with ShardedAligner(args.model, args.token_type, args.matching_methods, workers=args.workers,
+                        threads_per_worker=args.threads, chunk_size=args.chunk_size,
+                        batch_size=args.batch_size, output_format=args.format, precision=args.precision) as aligner:
+        start = time.perf_counter()
+        aligned = aligner.align_file(args.input_fp, args.output_prefix)
+        elapsed = time.perf_counter() - start
+    print(f"{aligned} pairs in {elapsed:.2f}s ({aligned / elapsed:.1f} pairs/s) with "
+          f"{aligner.workers} workers x {aligner.threads_per_worker} threads")
+
+
+if __name__ == "__main__":
+    main()
@@ -35,8 +35,18 @@ Todo:
    http://google.github.io/styleguide/pyguide.html
 
 """
+import itertools
+
+import numpy as np
 from simalign import SentenceAligner
 
+from .embedding_cache import EmbeddingCache
+from .encoding import WindowedEncoder
+from .inference import prepare_encoder
+from .instrumentation import NULL_INSTRUMENTATION, logger
+from .rematch import to_word_alignments
+from .tokenization import SubwordTokenizer
+
 class SimAlignPipeline:
     '''
         Given SimAlign configs
@@ -70,16 +80,168 @@ class SimAlignPipeline:
 
         self.aligner = SentenceAligner(model=self.model, token_type=self.token_type, matching_methods=self.matching_methods)
 
+        # inference backend: "fp32", "bf16" or "int8", dropping the layers above the one aligned on
+        self.precision = kwargs.get("precision", "fp32")
+        embed_loader = self.aligner.embed_loader
+        embed_loader.emb_model = prepare_encoder(embed_loader.emb_model, embed_loader.layer, self.precision,
+                                                 truncate=kwargs.get("truncate_layers", True))
+
+        # sub-word tokenization memoized per sentence, optionally persisted to a SQLite file
+        self.subword_tokenizer = SubwordTokenizer(self.aligner.embed_loader.tokenizer,
+                                                  cache_fp=kwargs.get("tokenization_cache_fp", None))
+
+        # optional instrumentation.Instrumentation collecting stage timers and counters
+        self.instrumentation = kwargs.get("instrumentation", None) or NULL_INSTRUMENTATION
+
+        # sentences longer than the encoder are encoded in overlapping windows instead of truncated
+        self.encoder = WindowedEncoder(embed_loader.emb_model, embed_loader.tokenizer, embed_loader.layer,
+                                       device=embed_loader.device,
+                                       max_length=kwargs.get("max_length", None),
+                                       stride=kwargs.get("window_stride", None),
+                                       max_batch_tokens=kwargs.get("max_batch_tokens", None))
+
+        # optional EmbeddingCache, lets reruns with other matching methods skip the encoder;
+        # the windowing is part of the namespace as it changes the vectors of long sentences
+        self.embedding_cache = kwargs.get("embedding_cache", None)
+        self.cache_namespace = EmbeddingCache.namespace(
+                "simalign", self.aligner.model, self.token_type, embed_loader.layer,
+                *([self.precision] if self.precision != "fp32" else []),
+                f"window{self.encoder.max_length}", f"stride{self.encoder.stride}")
+
     def __call__(self, src_sentence_tokens, trg_sentence_tokens):
         return self.run(src_sentence_tokens, trg_sentence_tokens)
 
     def run(self, src_sentence_tokens, trg_sentence_tokens):
-        alignments = self.aligner.get_word_aligns(src_sentence_tokens, trg_sentence_tokens)
-        print(src_sentence_tokens, trg_sentence_tokens)
-        for matching_method in alignments:
-            print('from inside',matching_method, ":", alignments[matching_method])
+        alignments = next(self.iter_batch([(src_sentence_tokens, trg_sentence_tokens)], batch_size=2))
+        logger.debug("aligned %s ||| %s: %s", src_sentence_tokens, trg_sentence_tokens, alignments)
         return alignments
 
+    def run_batch(self, sentence_pairs, batch_size=32, similarity_writer=None):
+        """Aligns many sentence pairs, encoding them in padded batches.
+
+        Args:
+            sentence_pairs (iterable): ``(src_sentence_tokens, trg_sentence_tokens)`` pairs.
+            batch_size (int): number of sentences encoded per forward pass.
+            similarity_writer (rematch.SimilarityWriter): optionally persists every similarity matrix.
+
+        Returns:
+            list: one ``{matching_method: alignments}`` dict per pair, in input order.
+        """
+        return list(self.iter_batch(sentence_pairs, batch_size=batch_size, similarity_writer=similarity_writer))
+
+    def iter_batch(self, sentence_pairs, batch_size=32, bucket_size=None, similarity_writer=None):
+        """Generator form of :meth:`run_batch`.
+
+        Pairs are read ``bucket_size`` at a time (defaults to ``8 * batch_size``);
+        inside a bucket the source and target sentences are sorted by subword
+        length so each padded forward pass wastes as little compute as possible,
+        and the results are yielded back in input order.
+
+        Args:
+            sentence_pairs (iterable): ``(src_sentence_tokens, trg_sentence_tokens)`` pairs.
+            batch_size (int): number of sentences encoded per forward pass.
+            bucket_size (int): number of pairs sorted together by length.
+            similarity_writer (rematch.SimilarityWriter): optionally persists every similarity matrix,
+                so other matching methods can be applied later with :mod:`rematch`.
+
+        Yields:
+            dict: ``{matching_method: alignments}`` for each pair, as :meth:`run` returns.
+        """
+        instrumentation = self.instrumentation
+        for sim, src_map, trg_map in self.iter_similarity(sentence_pairs, batch_size, bucket_size):
+            if similarity_writer is not None:
+                with instrumentation.stage("write"):
+                    similarity_writer.write(sim, src_map, trg_map)
+            with instrumentation.stage("matching"):
+                alignments = self._match(sim, src_map, trg_map)
+            instrumentation.count("pairs")
+            yield alignments
+
+    def iter_similarity(self, sentence_pairs, batch_size=32, bucket_size=None):
+        """Encodes sentence pairs like :meth:`iter_batch` and yields their similarity matrices.
+
+        The matrix is the one SimAlign's matching methods run on: sub-word by
+        sub-word for ``token_type="bpe"``, word by word for ``"word"``.
+
+        Yields:
+            tuple: ``(sim, src_map, trg_map)``, the similarity matrix and the word index
+            of each of its rows and columns.
+        """
+        if batch_size < 1:
+            raise ValueError("'batch_size' must be a positive integer.")
+        bucket_size = bucket_size or 8 * batch_size
+        pairs = iter(sentence_pairs)
+        while True:
+            bucket = list(itertools.islice(pairs, bucket_size))
+            if not bucket:
+                break
+            yield from self._similarity_bucket(bucket, batch_size)
+
+    def _similarity_bucket(self, bucket, batch_size):
+        instrumentation = self.instrumentation
+        with instrumentation.stage("tokenize"):
+            sentences = [sentence.split() if isinstance(sentence, str) else sentence
+                         for pair in bucket for sentence in pair]
+            tokenized = self.subword_tokenizer.tokenize(sentences)
+            n_subwords = [tokens.n_subwords for tokens in tokenized]
+        instrumentation.count("sentences", len(sentences))
+        instrumentation.count("subwords", sum(n_subwords))
+        instrumentation.count("windowed_sentences", sum(n > self.encoder.max_length for n in n_subwords))
+
+        with instrumentation.stage("encode"):
+            vectors = [None] * len(sentences)
+            if self.embedding_cache is not None:
+                vectors = [self.embedding_cache.get(self.cache_namespace, sentence) for sentence in sentences]
+
+            missing = [i for i in range(len(sentences)) if vectors[i] is None]
+            instrumentation.count("encoded_sentences", len(missing))
+            embeddings = self.encoder.encode([tokenized[i] for i in missing], batch_size, instrumentation)
+            for i, embedding in zip(missing, embeddings):
+                vectors[i] = embedding.cpu().numpy()
+                if self.embedding_cache is not None:
+                    self.embedding_cache.put(self.cache_namespace, sentences[i], vectors[i])
+
+        for k in range(len(bucket)):
+            src, trg = 2 * k, 2 * k + 1
+            with instrumentation.stage("similarity"):
+                similarity = self._similarity(vectors[src], vectors[trg], tokenized[src], tokenized[trg])
+            yield similarity
+
+    def _similarity(self, src_vectors, trg_vectors, src_tokenized, trg_tokenized):
+        """Builds the similarity matrix of already encoded subword vectors.
+
+        Mirrors ``SentenceAligner.get_word_aligns`` after its encoder call.
+        """
+        aligner = self.aligner
+        if aligner.token_type == "word":
+            src_vectors, trg_vectors = (
+                np.array([vectors[start:end].mean(0) for start, end in zip(offsets[:-1], offsets[1:])])
+                for vectors, offsets in ((src_vectors, src_tokenized.word_offsets),
+                                         (trg_vectors, trg_tokenized.word_offsets)))
+
+        sim = aligner.get_similarity(src_vectors, trg_vectors)
+        sim = aligner.apply_distortion(sim, aligner.distortion)
+
+        if aligner.token_type == "bpe":
+            src_map, trg_map = src_tokenized.sub2word(), trg_tokenized.sub2word()
+        else:
+            src_map, trg_map = np.arange(src_tokenized.n_words), np.arange(trg_tokenized.n_words)
+        return sim, src_map[:sim.shape[0]], trg_map[:sim.shape[1]]
+
+    def _match(self, sim, src_map, trg_map):
+        """Runs SimAlign's matching methods on a similarity matrix."""
+        aligner = self.aligner
+        all_mats = {}
+        all_mats["fwd"], all_mats["rev"] = aligner.get_alignment_matrix(sim)
+        all_mats["inter"] = all_mats["fwd"] * all_mats["rev"]
+        if "mwmf" in aligner.matching_methods:
+            all_mats["mwmf"] = aligner.get_max_weight_match(sim)
+        if "itermax" in aligner.matching_methods:
+            all_mats["itermax"] = aligner.iter_max(sim)
+
+        return {matching_method: to_word_alignments(all_mats[matching_method] > 0, src_map, trg_map)
+                for matching_method in aligner.matching_methods}
+
 if __name__ == '__main__':
    pipeline = SimAlignPipeline();
    pipeline.run('../data/en-es.pharaoh')
@@ -0,0 +1,171 @@
+"""
+Sub-word tokenization shared by the aligner pipelines.
+
+Sentences (lists of words) are tokenized a whole batch at a time with the
+model's fast tokenizer, and every result is kept as two NumPy arrays: the
+sub-word ids and the word offsets, so the sub-words of word ``w`` are
+``ids[word_offsets[w]:word_offsets[w + 1]]``. Results are memoized per
+tokenizer in an LRU bounded by ``max_cached`` sentences and, optionally,
+persisted in a SQLite file so reruns over the same splits skip tokenization.
+"""
+import collections
+import json
+import sqlite3
+from typing import NamedTuple
+
+import numpy as np
+
+
+class TokenizedSentence(NamedTuple):
+    ids: np.ndarray
+    word_offsets: np.ndarray
+
+    @property
+    def n_words(self):
+        return len(self.word_offsets) - 1
+
+    @property
+    def n_subwords(self):
+        return len(self.ids)
+
+    def sub2word(self):
+        """Word index of every sub-word."""
+        return np.repeat(np.arange(self.n_words), np.diff(self.word_offsets))
+
+
+class TokenizationStore:
+    """SQLite table of tokenized sentences, keyed by tokenizer namespace and sentence."""
+
+    def __init__(self, file_path):
+        self.connection = sqlite3.connect(file_path, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tokenized (namespace TEXT, sentence TEXT, ids BLOB, "
+                                "word_offsets BLOB, PRIMARY KEY (namespace, sentence))")
+
+    @staticmethod
+    def key(words):
+        return json.dumps(list(words), ensure_ascii=False)
+
+    def get(self, namespace, words):
+        row = self.connection.execute("SELECT ids, word_offsets FROM tokenized WHERE namespace = ? AND sentence = ?",
+                                      (namespace, self.key(words))).fetchone()
+        if row is None:
+            return None
+        return TokenizedSentence(np.frombuffer(row[0], dtype='<i4'), np.frombuffer(row[1], dtype='<i4'))
+
+    def put_many(self, namespace, items):
+        """Store ``(words, TokenizedSentence)`` items in one transaction."""
+        with self.connection:
+            self.connection.executemany(
+                    "INSERT OR REPLACE INTO tokenized VALUES (?, ?, ?, ?)",
+                    [(namespace, self.key(words), tokenized.ids.astype('<i4').tobytes(),
+                      tokenized.word_offsets.astype('<i4').tobytes()) for words, tokenized in items])
+
+    def close(self):
+        self.connection.close()
+
+
+class SubwordTokenizer:
+    """
+    Memoizing batch tokenizer around a transformers tokenizer.
+
+    Fast tokenizers tokenize a batch in one call and give the word of every
+    sub-word; slow ones fall back to tokenizing word by word, with the same result.
+    """
+
+    def __init__(self, tokenizer, max_cached=100000, cache_fp=None):
+        """
+        :param tokenizer: transformers tokenizer of the encoder.
+        :param max_cached: Most sentences kept in memory.
+        :param cache_fp: Optional SQLite file persisting the tokenized sentences.
+        """
+        self.tokenizer = tokenizer
+        self.max_cached = max_cached
+        self.namespace = f"{type(tokenizer).__name__}-{tokenizer.name_or_path}-{len(tokenizer)}"
+        self.store = TokenizationStore(cache_fp) if cache_fp else None
+        self.memo = collections.OrderedDict()
+        self.hits = self.misses = 0
+
+    def tokenize(self, sentences):
+        """
+        :param sentences: Lists of words, or whitespace tokenized strings.
+        :return: One TokenizedSentence per sentence.
+        """
+        keys = [tuple(sentence.split() if isinstance(sentence, str) else sentence) for sentence in sentences]
+        results = {}
+        for key in keys:
+            if key in results:
+                continue
+            tokenized = self.memo.get(key)
+            if tokenized is not None:
+                self.memo.move_to_end(key)
+            elif self.store is not None:
+                tokenized = self.store.get(self.namespace, key)
+            if tokenized is not None:
+                self.hits += 1
+                results[key] = tokenized
+
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+        self.misses += len(missing)
+        if missing:
+            computed = self._tokenize_batch(missing)
+            results.update(zip(missing, computed))
+            if self.store is not None:
+                self.store.put_many(self.namespace, zip(missing, computed))
+
+        for key in results:
+            self.memo[key] = results[key]
+            self.memo.move_to_end(key)
+        while len(self.memo) > self.max_cached:
+            self.memo.popitem(last=False)
+        return [results[key] for key in keys]
+
+    def _tokenize_batch(self, word_lists):
+        tokenizer = self.tokenizer
+        tokenized = [TokenizedSentence(np.zeros(0, np.int32), np.zeros(1, np.int32))] * len(word_lists)
+        non_empty = [k for k, words in enumerate(word_lists) if words]
+        if not non_empty:
+            return tokenized
+
+        if getattr(tokenizer, "is_fast", False):
+            encodings = tokenizer([list(word_lists[k]) for k in non_empty], is_split_into_words=True,
+                                  add_special_tokens=False)
+            for row, k in enumerate(non_empty):
+                word_ids = np.asarray(encodings.word_ids(row), dtype=np.int64)
+                counts = np.bincount(word_ids, minlength=len(word_lists[k]))
+                tokenized[k] = TokenizedSentence(np.asarray(encodings["input_ids"][row], dtype=np.int32),
+                                                 np.concatenate([[0], np.cumsum(counts)]).astype(np.int32))
+            return tokenized
+
+        for k in non_empty:
+            word_tokens = [tokenizer.tokenize(word) for word in word_lists[k]]
+            ids = tokenizer.convert_tokens_to_ids([token for word in word_tokens for token in word])
+            counts = [len(word) for word in word_tokens]
+            tokenized[k] = TokenizedSentence(np.asarray(ids, dtype=np.int32),
+                                             np.concatenate([[0], np.cumsum(counts)]).astype(np.int32))
+        return tokenized
+
+
+def pad_batch(id_arrays, cls_token_id, sep_token_id, pad_token_id):
+    """
+    Pack sub-word id sequences into encoder inputs with [CLS]/[SEP] around each.
+
+    :return: ``(input_ids, attention_mask)`` int64 arrays.
+    """
+    longest = max((len(ids) for ids in id_arrays), default=0)
+    input_ids = np.full((len(id_arrays), longest + 2), pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros((len(id_arrays), longest + 2), dtype=np.int64)
+    for row, ids in enumerate(id_arrays):
+        input_ids[row, 0] = cls_token_id
+        input_ids[row, 1:len(ids) + 1] = ids
+        input_ids[row, len(ids) + 1] = sep_token_id
+        attention_mask[row, :len(ids) + 2] = 1
+    return input_ids, attention_mask
+
+
+def pad_sub2word(tokenized):
+    """Sub-word to word maps of tokenized sentences, padded with -1 to the longest."""
+    sub2word = np.full((len(tokenized), max((tokens.n_subwords for tokens in tokenized), default=0)), -1,
+                       dtype=np.int64)
+    for row, tokens in enumerate(tokenized):
+        sub2word[row, :tokens.n_subwords] = tokens.sub2word()
+    return sub2word
@@ -0,0 +1,106 @@
+"""
+Accuracy versus speed of the encoder inference modes on XL-WA.
+
+Every mode aligns the same sentence pairs with SimAlign and/or awesome-align;
+alignment time (model loading excluded) and the AER, F1 against the XL-WA gold
+alignments are reported next to the full-depth fp32 reference, so a mode can
+be picked with a known AER cost.
+
+    fp32-full   all encoder layers, fp32 (reference)
+    fp32        layers above the alignment layer dropped
+    bf16        dropped layers, bfloat16
+    int8        dropped layers, dynamic int8 quantization
+
+usage: python benchmarks/inference_modes.py [path/to/XL-WA/data] --lang pt --pairs 500 [--output modes.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from alignment_pipelines import AlignmentMetrics  # noqa: E402
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'XL-WA', 'data')
+MODES = {
+    "fp32-full": {"precision": "fp32", "truncate_layers": False},
+    "fp32": {"precision": "fp32", "truncate_layers": True},
+    "bf16": {"precision": "bf16", "truncate_layers": True},
+    "int8": {"precision": "int8", "truncate_layers": True},
+}
+
+
+def align_simalign(model, mode, sentences_fp, batch_size):
+    from alignment_pipelines.simAlignPipeline import SimAlignPipeline
+
+    pipeline = SimAlignPipeline(model=model, token_type="bpe", matching_methods="a", **MODES[mode])
+    with open(sentences_fp, 'r') as file:
+        pairs = [line.split('\t')[:2] for line in file]
+    start = time.perf_counter()
+    alignments = pipeline.run_batch([(src.split(" "), trg.split(" ")) for src, trg in pairs], batch_size=batch_size)
+    return [alignment["inter"] for alignment in alignments], time.perf_counter() - start
+
+
+def align_awesome(model, mode, sentences_fp, batch_size):
+    from alignment_pipelines.awesomeAlignPipeline import AwesomeAlignPipeline
+
+    pipeline = AwesomeAlignPipeline(sentences_fp, model=model, batch_size=batch_size, **MODES[mode])
+    start = time.perf_counter()
+    alignments = list(pipeline.iter_alignments())
+    return alignments, time.perf_counter() - start
+
+
+PIPELINES = {"simalign": align_simalign, "awesome": align_awesome}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_dir', nargs='?', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--lang', default='pt')
+    parser.add_argument('--split', default='test')
+    parser.add_argument('--pairs', type=int, default=500)
+    parser.add_argument('--model', default='bert-base-multilingual-cased')
+    parser.add_argument('--pipelines', default='simalign,awesome')
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--output', default=None, help="optional JSON file with every result")
+    args = parser.parse_args(argv)
+
+    tmp_dir = tempfile.mkdtemp()
+    sentences_fp = os.path.join(tmp_dir, 'sentences.tsv')
+    gold_fp = os.path.join(tmp_dir, 'gold.pharaoh')
+    with open(os.path.join(args.data_dir, args.lang, f'{args.split}.tsv'), 'r') as inpf, \
+            open(sentences_fp, 'w') as sentencesf, open(gold_fp, 'w') as goldf:
+        for _, line in zip(range(args.pairs), inpf):
+            src, trg, gold = line.rstrip('\n').split('\t')
+            sentencesf.write(f"{src}\t{trg}\n")
+            goldf.write(f"{gold}\n")
+
+    results = []
+    print(f"{'pipeline':10}{'mode':11}{'seconds':>9}{'pairs/s':>9}{'speedup':>9}{'aer':>8}{'d_aer':>8}{'f1':>8}")
+    for pipeline in args.pipelines.split(','):
+        reference = None
+        for mode in args.modes.split(','):
+            alignments, seconds = PIPELINES[pipeline](args.model, mode, sentences_fp, args.batch_size)
+            predicted_fp = os.path.join(tmp_dir, f'{pipeline}-{mode}.pharaoh')
+            with open(predicted_fp, 'w') as outf:
+                outf.writelines(' '.join(f'{i}-{j}' for i, j in alignment) + '\n' for alignment in alignments)
+            micro = AlignmentMetrics(predicted_fp, gold_fp).evaluate()["micro_average"]
+            reference = reference or {"seconds": seconds, "aer": micro["aer"]}
+            result = {"pipeline": pipeline, "mode": mode, "pairs": len(alignments), "seconds": seconds,
+                      "pairs_per_second": len(alignments) / seconds, "speedup": reference["seconds"] / seconds,
+                      "aer": micro["aer"], "delta_aer": micro["aer"] - reference["aer"], "f1": micro["f1_score"]}
+            results.append(result)
+            print(f"{pipeline:10}{mode:11}{seconds:9.2f}{result['pairs_per_second']:9.1f}{result['speedup']:8.2f}x"
+                  f"{result['aer']:8.4f}{result['delta_aer']:+8.4f}{result['f1']:8.4f}")
+
+    if args.output:
+        with open(args.output, 'w') as outf:
+            json.dump({"lang": args.lang, "split": args.split, "model": args.model, "results": results}, outf,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    main()
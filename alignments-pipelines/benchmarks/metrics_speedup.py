@@ -0,0 +1,138 @@
+"""
+Compare the NumPy AlignmentMetrics engine against the original set-of-tuples
+implementation on the XL-WA gold alignments.
+
+For every XL-WA file the gold column is used as reference and a perturbed copy
+(some links dropped, some shifted) as prediction. Both engines must produce the
+same numbers; their load and evaluation times are reported.
+
+usage: python benchmarks/metrics_speedup.py [path/to/XL-WA/data] [--repeat N]
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from alignment_pipelines import AlignmentMetrics  # noqa: E402
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'XL-WA', 'data')
+
+
+class SetAlignmentMetrics:
+    """The set-based engine AlignmentMetrics used before it moved to NumPy arrays."""
+
+    def __init__(self, predicted_file, reference_file):
+        self.predicted_alignments = self.load_alignments(predicted_file)
+        self.reference_alignments = self.load_alignments(reference_file)
+
+    def load_alignments(self, file_path):
+        alignments = []
+        with open(file_path, 'r') as file:
+            for line in file:
+                alignments.append({tuple(map(int, pair.split('-'))) for pair in line.strip().split()})
+        return alignments
+
+    def calculate_f1_score(self, precision, recall):
+        return (2 * precision * recall) / (precision + recall) if (precision + recall) > 0 else 0.0
+
+    def calculate_aer(self, predicted, reference):
+        true_positives = len(predicted & reference)
+        total = len(predicted) + len(reference)
+        return 1 - (2 * true_positives) / total if total > 0 else 1.0
+
+    def evaluate(self):
+        total_true_positives = total_predicted = total_reference = 0
+        total_precision = total_recall = total_f1 = total_aer = 0.0
+        for predicted, reference in zip(self.predicted_alignments, self.reference_alignments):
+            true_positives = len(predicted & reference)
+            total_true_positives += true_positives
+            total_predicted += len(predicted)
+            total_reference += len(reference)
+            precision = true_positives / len(predicted) if len(predicted) > 0 else 0.0
+            recall = true_positives / len(reference) if len(reference) > 0 else 0.0
+            total_precision += precision
+            total_recall += recall
+            total_f1 += self.calculate_f1_score(precision, recall)
+            total_aer += self.calculate_aer(predicted, reference)
+
+        precision = total_true_positives / total_predicted if total_predicted > 0 else 0.0
+        recall = total_true_positives / total_reference if total_reference > 0 else 0.0
+        num_sentences = len(self.predicted_alignments)
+        return {
+            "micro_average": {
+                "precision": precision,
+                "recall": recall,
+                "f1_score": self.calculate_f1_score(precision, recall),
+                "aer": 1 - (2 * total_true_positives) / (total_predicted + total_reference)
+                if (total_predicted + total_reference) > 0 else 1.0,
+            },
+            "macro_average": {
+                "precision": total_precision / num_sentences,
+                "recall": total_recall / num_sentences,
+                "f1_score": total_f1 / num_sentences,
+                "aer": total_aer / num_sentences,
+            },
+        }
+
+
+def write_gold_and_prediction(tsv_fp, out_dir, rng):
+    """Write the gold column of an XL-WA TSV and a perturbed prediction next to it."""
+    name = os.path.relpath(tsv_fp, os.path.dirname(os.path.dirname(tsv_fp))).replace(os.sep, '_')
+    gold_fp = os.path.join(out_dir, f'{name}.gold')
+    predicted_fp = os.path.join(out_dir, f'{name}.pharaoh')
+    with open(tsv_fp) as inpf, open(gold_fp, 'w') as goldf, open(predicted_fp, 'w') as predf:
+        for line in inpf:
+            links = line.rstrip('\n').split('\t')[2].split()
+            goldf.write(' '.join(links) + '\n')
+            predicted = []
+            for link in links:
+                if rng.random() < 0.15:
+                    continue
+                if rng.random() < 0.15:
+                    i, j = map(int, link.split('-'))
+                    link = f'{i}-{j + 1}'
+                predicted.append(link)
+            predf.write(' '.join(predicted) + '\n')
+    return predicted_fp, gold_fp
+
+
+def time_engine(engine, predicted_fp, gold_fp, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = engine(predicted_file=predicted_fp, reference_file=gold_fp).evaluate()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_dir', nargs='?', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    total_sets = total_arrays = 0.0
+    with tempfile.TemporaryDirectory() as out_dir:
+        print(f"{'file':<16}{'sentences':>10}{'sets (s)':>12}{'numpy (s)':>12}{'speedup':>10}")
+        for tsv_fp in sorted(glob.glob(os.path.join(args.data_dir, '*', '*.tsv'))):
+            predicted_fp, gold_fp = write_gold_and_prediction(tsv_fp, out_dir, rng)
+            sets_time, expected = time_engine(SetAlignmentMetrics, predicted_fp, gold_fp, args.repeat)
+            arrays_time, result = time_engine(AlignmentMetrics, predicted_fp, gold_fp, args.repeat)
+            if result != expected:
+                raise AssertionError(f"{tsv_fp}: {result} != {expected}")
+            with open(gold_fp) as goldf:
+                n_sentences = sum(1 for _ in goldf)
+            name = os.path.basename(gold_fp)[:-len('.tsv.gold')]
+            print(f"{name:<16}{n_sentences:>10}{sets_time:>12.4f}{arrays_time:>12.4f}{sets_time / arrays_time:>9.1f}x")
+            total_sets += sets_time
+            total_arrays += arrays_time
+    print(f"{'total':<16}{'':>10}{total_sets:>12.4f}{total_arrays:>12.4f}{total_sets / total_arrays:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
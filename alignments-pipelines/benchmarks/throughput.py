@@ -0,0 +1,243 @@
+"""
+Throughput and latency benchmark of the aligners and the metrics engine.
+
+Runs offline: the encoder is a small randomly initialised BERT (seeded, with a
+WordPiece vocabulary built from the corpus) saved under ``--model-dir``, and
+the corpus is the XL-WA sentences, or seeded synthetic sentences when the
+data is not available. For every benchmark and corpus size it measures
+
+    pairs/s, tokens/s     sub-words per second for the aligners, links per second for the metrics
+    peak RSS              of a fresh process running only that case
+    stage latency         ms per pair of each instrumented stage (tokenize, encode, similarity, ...)
+
+Results are written as JSON. Given ``--baseline``, cases slower (or using more
+memory) than the baseline beyond ``--tolerance`` are flagged and the exit
+status is 1, so the suite can gate changes.
+
+usage: python benchmarks/throughput.py --sizes 100,1000 --repeats 3 --output results.json
+       python benchmarks/throughput.py --sizes 100,1000 --baseline baseline.json
+"""
+import argparse
+import collections
+import concurrent.futures
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'XL-WA', 'data')
+DEFAULT_MODEL_DIR = os.path.join(tempfile.gettempdir(), 'alignments-benchmark-bert')
+BENCHMARKS = ("simalign", "awesome", "metrics")
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+
+
+def load_corpus(data_dir, size, seed=0):
+    """
+    First ``size`` XL-WA rows ("src\\ttrg\\tgold") over all languages and splits,
+    or seeded synthetic rows when the data is missing or too small.
+    """
+    rows = []
+    for tsv_fp in sorted(glob.glob(os.path.join(data_dir, '*', '*.tsv'))):
+        with open(tsv_fp, 'r') as file:
+            rows.extend(line.rstrip('\n') for line in file)
+        if len(rows) >= size:
+            return rows[:size]
+
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    while len(rows) < size:
+        src = [''.join(rng.choices(letters, k=rng.randint(2, 10))) for _ in range(rng.randint(5, 30))]
+        trg = [''.join(rng.choices(letters, k=rng.randint(2, 10))) for _ in range(rng.randint(5, 30))]
+        gold = sorted({(rng.randrange(len(src)), rng.randrange(len(trg))) for _ in range(len(src))})
+        rows.append(f"{' '.join(src)}\t{' '.join(trg)}\t{' '.join(f'{i}-{j}' for i, j in gold)}")
+    return rows
+
+
+def build_model(model_dir, rows, seed=0, hidden_size=64, layers=8, vocab_size=4000):
+    """
+    Save a random BERT and a WordPiece tokenizer built from ``rows`` to ``model_dir`` (once).
+    Eight layers, as SimAlign aligns with the hidden states of layer 8.
+    """
+    if os.path.exists(os.path.join(model_dir, 'config.json')):
+        return model_dir
+    import torch
+    import transformers
+
+    counts = collections.Counter(word for row in rows for sentence in row.split('\t')[:2] for word in sentence.split())
+    characters = sorted({character for word in counts for character in word})
+    words = [word for word, _ in counts.most_common(vocab_size)]
+    vocab = list(dict.fromkeys(SPECIAL_TOKENS + characters + [f"##{character}" for character in characters] + words))
+    os.makedirs(model_dir, exist_ok=True)
+    with open(os.path.join(model_dir, 'vocab.txt'), 'w') as vocabf:
+        vocabf.write('\n'.join(vocab) + '\n')
+
+    torch.manual_seed(seed)
+    config = transformers.BertConfig(vocab_size=len(vocab), hidden_size=hidden_size, num_hidden_layers=layers,
+                                     num_attention_heads=4, intermediate_size=4 * hidden_size)
+    transformers.BertModel(config).save_pretrained(model_dir)
+    transformers.BertTokenizerFast(os.path.join(model_dir, 'vocab.txt'), do_lower_case=False).save_pretrained(model_dir)
+    return model_dir
+
+
+def peak_rss_mb():
+    """
+    High-water resident memory of this process. ru_maxrss is inherited through
+    fork/exec from the (larger) parent on Linux, so /proc's VmHWM is preferred.
+    """
+    try:
+        with open('/proc/self/status', 'r') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_case(benchmark, rows, model_dir, matching_methods, batch_size):
+    """Run one benchmark in the current (fresh) process and measure it."""
+    import torch
+
+    from alignment_pipelines.instrumentation import Instrumentation
+
+    torch.manual_seed(0)
+    instrumentation = Instrumentation()
+    tmp_dir = tempfile.mkdtemp()
+    sentences_fp = os.path.join(tmp_dir, 'sentences.tsv')
+    with open(sentences_fp, 'w') as outf:
+        outf.writelines(f"{row}\n" for row in rows)
+
+    if benchmark == "simalign":
+        from alignment_pipelines.simAlignPipeline import SimAlignPipeline
+
+        pipeline = SimAlignPipeline(model=model_dir, token_type="bpe", matching_methods=matching_methods,
+                                    instrumentation=instrumentation)
+        pairs = [row.split('\t')[:2] for row in rows]
+        start = time.perf_counter()
+        pipeline.run_batch([(src.split(" "), trg.split(" ")) for src, trg in pairs], batch_size=batch_size)
+        seconds = time.perf_counter() - start
+        tokens = instrumentation.counters["subwords"]
+    elif benchmark == "awesome":
+        from alignment_pipelines.awesomeAlignPipeline import AwesomeAlignPipeline
+
+        pipeline = AwesomeAlignPipeline(sentences_fp, model=model_dir, batch_size=batch_size,
+                                        instrumentation=instrumentation)
+        start = time.perf_counter()
+        pipeline.run(os.path.join(tmp_dir, 'awesome.pharaoh'))
+        seconds = time.perf_counter() - start
+        tokens = instrumentation.counters["subwords"]
+    else:
+        from alignment_pipelines import AlignmentMetrics
+
+        reference_fp = os.path.join(tmp_dir, 'reference.pharaoh')
+        predicted_fp = os.path.join(tmp_dir, 'predicted.pharaoh')
+        rng = random.Random(0)
+        with open(reference_fp, 'w') as referencef, open(predicted_fp, 'w') as predictedf:
+            for row in rows:
+                links = row.split('\t')[2].split()
+                referencef.write(' '.join(links) + '\n')
+                predictedf.write(' '.join(link for link in links if rng.random() > 0.2) + '\n')
+        start = time.perf_counter()
+        with instrumentation.stage("load"):
+            metrics = AlignmentMetrics(predicted_fp, reference_fp)
+        with instrumentation.stage("evaluate"):
+            metrics.evaluate()
+        seconds = time.perf_counter() - start
+        tokens = sum(len(links) for links in metrics.reference_alignments)
+
+    return {
+        "benchmark": benchmark,
+        "pairs": len(rows),
+        "seconds": seconds,
+        "pairs_per_second": len(rows) / seconds,
+        "tokens_per_second": tokens / seconds,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages_ms_per_pair": {name: 1000 * value / len(rows) for name, value in instrumentation.seconds.items()},
+    }
+
+
+def compare(results, baseline, tolerance):
+    """:return: Messages for every case slower or heavier than its baseline beyond ``tolerance``."""
+    previous = {(result["benchmark"], result["pairs"]): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        base = previous.get((result["benchmark"], result["pairs"]))
+        if base is None:
+            continue
+        if result["pairs_per_second"] < (1 - tolerance) * base["pairs_per_second"]:
+            regressions.append(f"{result['benchmark']} x{result['pairs']}: {result['pairs_per_second']:.1f} pairs/s, "
+                               f"baseline {base['pairs_per_second']:.1f}")
+        if result["peak_rss_mb"] > (1 + tolerance) * base["peak_rss_mb"]:
+            regressions.append(f"{result['benchmark']} x{result['pairs']}: {result['peak_rss_mb']:.0f} MB peak RSS, "
+                               f"baseline {base['peak_rss_mb']:.0f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR)
+    parser.add_argument('--benchmarks', default=','.join(BENCHMARKS))
+    parser.add_argument('--sizes', default='100,1000', help="corpus sizes, in sentence pairs")
+    parser.add_argument('--matching-methods', default='ai')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--repeats', type=int, default=1, help="runs per case, the fastest is kept")
+    parser.add_argument('--output', default='throughput.json')
+    parser.add_argument('--baseline', default=None, help="JSON results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="allowed relative slowdown")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    corpus = load_corpus(args.data_dir, max(sizes))
+    model_dir = build_model(args.model_dir, corpus)
+
+    import numpy
+    import torch
+
+    results = []
+    print(f"{'benchmark':10}{'pairs':>7}{'pairs/s':>10}{'tokens/s':>11}{'peak MB':>9}  stages (ms/pair)")
+    for benchmark in args.benchmarks.split(','):
+        for size in sizes:
+            runs = []
+            for _ in range(args.repeats):
+                # a fresh process per run, so the peak RSS is that case's only
+                with concurrent.futures.ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    runs.append(pool.submit(run_case, benchmark, corpus[:size], model_dir, args.matching_methods,
+                                            args.batch_size).result())
+            result = max(runs, key=lambda run: run["pairs_per_second"])
+            results.append(result)
+            stages = ' '.join(f"{name}={value:.2f}" for name, value in result["stages_ms_per_pair"].items())
+            print(f"{benchmark:10}{size:7d}{result['pairs_per_second']:10.1f}{result['tokens_per_second']:11.0f}"
+                  f"{result['peak_rss_mb']:9.0f}  {stages}")
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count(), "torch": torch.__version__, "numpy": numpy.__version__,
+                        "torch_threads": torch.get_num_threads()},
+        "config": {"sizes": sizes, "matching_methods": args.matching_methods, "batch_size": args.batch_size,
+                   "repeats": args.repeats, "model_dir": model_dir},
+        "results": results,
+    }
+    with open(args.output, 'w') as outf:
+        json.dump(report, outf, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as baselinef:
+            regressions = compare(results, json.load(baselinef), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regression beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+import pytest
+
+
+@pytest.fixture
+def write_lines(tmp_path):
+    """Write ``lines`` to ``file_name`` in the test's tmp_path, one per line, and return its path as a string."""
+    def write(file_name, lines):
+        file_path = tmp_path / file_name
+        with open(file_path, 'w') as outf:
+            outf.writelines(f"{line}\n" for line in lines)
+        return str(file_path)
+    return write
+
+
+@pytest.fixture(scope="session")
+def tiny_model(tmp_path_factory):
+    """A randomly initialized 8-layer BERT saved like a pretrained model, small enough to align with in tests."""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    model_dir = tmp_path_factory.mktemp("tinybert")
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = ["the", "cat", "sat", "on", "mat", "o", "gato", "sentou", "no", "tapete"]
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *letters, *(f"##{letter}" for letter in letters), *words]
+    (model_dir / "vocab.txt").write_text("\n".join(vocab) + "\n")
+    transformers.BertTokenizer(str(model_dir / "vocab.txt"), do_lower_case=False).save_pretrained(model_dir)
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=8,
+                                     num_attention_heads=2, intermediate_size=64)
+    transformers.BertModel(config).save_pretrained(model_dir)
+    return str(model_dir)
+
+
+@pytest.fixture
+def xlwa_corpus(write_lines):
+    """A small XL-WA TSV with gold alignments, some sentences longer than the tiny model's words."""
+    return write_lines("corpus.tsv", [
+        "the cat sat on the mat\to gato sentou no tapete\t0-0 1-1 2-2 3-3 5-4",
+        "the cat\to gato\t0-0 1-1",
+        "cats sat\tgatos sentou\t0-0 1-1",
+        "on the mat the cat sat\tno tapete o gato sentou\t0-0 2-1 4-3 5-4",
+        "mat\ttapete\t0-0",
+        "the zebra sat quietly on a mat\ta zebra sentou quieta no tapete\t1-1 2-2 3-3 4-4 6-5",
+        "cat\tgato\t0-0",
+    ])
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from alignment_pipelines.alignment_arrays import AlignmentArrays, sentence_counts
+from alignment_pipelines.calculate_metrics import AlignmentMetrics, StreamingAlignmentMetrics
+
+
+def reference_aer(predicted_lines, gold_lines):
+    """Micro AER of Och and Ney (2003), 1 - (|A & S| + |A & P|) / (|A| + |S|), with sets of tuples."""
+    hits = total = 0
+    for predicted_line, gold_line in zip(predicted_lines, gold_lines):
+        predicted = {tuple(map(int, link.split('-'))) for link in predicted_line.split()}
+        sure = {tuple(map(int, link.split('-'))) for link in gold_line.split() if '-' in link}
+        possible = sure | {tuple(map(int, link.replace('?', 'p').split('p'))) for link in gold_line.split()
+                           if '-' not in link}
+        hits += len(predicted & sure) + len(predicted & possible)
+        total += len(predicted) + len(sure)
+    return 1 - hits / total if total else 1.0
+
+
+def test_sure_possible_counts(write_lines):
+    predicted = write_lines("predicted.pharaoh", ["0-0 1-1 2-2 3-3"])
+    gold = write_lines("gold.pharaoh", ["0-0 1p1 2?2 4-4"])
+    counts = sentence_counts(AlignmentArrays.from_file(predicted), AlignmentArrays.from_file(gold))
+    assert [count.tolist() for count in counts] == [[1], [3], [4], [2]]
+
+    scores = AlignmentMetrics(predicted, gold).evaluate()["micro_average"]
+    assert scores["precision"] == pytest.approx(3 / 4)
+    assert scores["recall"] == pytest.approx(1 / 2)
+    assert scores["aer"] == pytest.approx(1 - (1 + 3) / (4 + 2))
+
+
+def test_micro_aer_counts_links_per_sentence(write_lines):
+    # the same link in two sentences is two links, not one
+    predicted = write_lines("predicted.pharaoh", ["0-0", "0-0"])
+    gold = write_lines("gold.pharaoh", ["0-0", "1-1"])
+    assert AlignmentMetrics(predicted, gold).evaluate()["micro_average"]["aer"] == pytest.approx(0.5)
+
+
+def test_micro_aer_matches_reference(write_lines):
+    rng = random.Random(5)
+    predicted_lines = [" ".join(f"{rng.randrange(6)}-{rng.randrange(6)}" for _ in range(rng.randint(0, 5)))
+                       for _ in range(300)]
+    gold_lines = [" ".join(f"{rng.randrange(6)}{rng.choice('-p?')}{rng.randrange(6)}" for _ in range(rng.randint(0, 5)))
+                  for _ in range(300)]
+    # a link may not be both sure and possible in a gold file
+    gold_lines = [" ".join({link.replace('?', 'p').replace('p', '-'): link for link in line.split()}.values())
+                  for line in gold_lines]
+    predicted = write_lines("predicted.pharaoh", predicted_lines)
+    gold = write_lines("gold.pharaoh", gold_lines)
+
+    expected = reference_aer(predicted_lines, gold_lines)
+    assert AlignmentMetrics(predicted, gold).evaluate()["micro_average"]["aer"] == pytest.approx(expected)
+    assert StreamingAlignmentMetrics(predicted, gold, chunk_size=16).evaluate()["micro_average"]["aer"] == \
+        pytest.approx(expected)
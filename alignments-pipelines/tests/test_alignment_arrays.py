@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from alignment_pipelines.alignment_arrays import AlignmentArrays
+from alignment_pipelines.calculate_metrics import AlignmentMetrics
+
+
+def reference_scores(predicted_alignments, reference_alignments):
+    """Per-sentence and micro scores computed with sets of tuples, as the metrics were before AlignmentArrays."""
+    sentences = []
+    hits = n_predicted = n_reference = 0
+    for predicted, reference in zip(predicted_alignments, reference_alignments):
+        true_positives = len(predicted & reference)
+        precision = true_positives / len(predicted) if predicted else 0.0
+        recall = true_positives / len(reference) if reference else 0.0
+        f1_score = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+        total = len(predicted) + len(reference)
+        aer = 1 - 2 * true_positives / total if total > 0 else 1.0
+        sentences.append((precision, recall, f1_score, aer))
+        hits += true_positives
+        n_predicted += len(predicted)
+        n_reference += len(reference)
+    precision = hits / n_predicted if n_predicted else 0.0
+    recall = hits / n_reference if n_reference else 0.0
+    f1_score = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+    macro = [sum(scores) / len(sentences) for scores in zip(*sentences)]
+    return {"precision": precision, "recall": recall, "f1_score": f1_score}, \
+        dict(zip(("precision", "recall", "f1_score", "aer"), macro))
+
+
+def random_alignments(rng, n_sentences):
+    return [{(rng.randrange(8), rng.randrange(8)) for _ in range(rng.randint(0, 6))} for _ in range(n_sentences)]
+
+
+def to_lines(alignments):
+    return [" ".join(f"{s}-{t}" for s, t in sorted(alignment)) for alignment in alignments]
+
+
+def test_from_lines_round_trip():
+    lines = ["0-0 1-1 2p2", "", "3?1 0-4"]
+    alignments = AlignmentArrays.from_lines(lines)
+    assert len(alignments) == 3
+    assert alignments[0] == {(0, 0), (1, 1), (2, 2)}
+    assert alignments[1] == set()
+    assert alignments[-1] == {(3, 1), (0, 4)}
+    assert alignments.sure.tolist() == [True, True, False, False, True]
+    assert alignments.to_lines() == ["0-0 1-1 2p2", "", "3p1 0-4"]
+    with pytest.raises(ValueError):
+        AlignmentArrays.from_lines(["0-0 1"])
+
+
+def test_from_sets_and_keys_round_trip():
+    sets = random_alignments(random.Random(0), 50)
+    alignments = AlignmentArrays.from_sets(sets)
+    assert list(alignments) == sets
+    rebuilt = AlignmentArrays.from_keys(alignments.keys(), len(sets))
+    assert list(rebuilt) == sets
+
+
+def test_metrics_match_set_based_engine(write_lines):
+    rng = random.Random(1)
+    predicted, reference = random_alignments(rng, 300), random_alignments(rng, 300)
+    predicted_fp = write_lines("predicted.pharaoh", to_lines(predicted))
+    reference_fp = write_lines("reference.pharaoh", to_lines(reference))
+
+    metrics = AlignmentMetrics(predicted_fp, reference_fp)
+    results = metrics.evaluate()
+    micro, macro = reference_scores(predicted, reference)
+    for metric, value in micro.items():
+        assert results["micro_average"][metric] == pytest.approx(value)
+    for metric, value in macro.items():
+        assert results["macro_average"][metric] == pytest.approx(value)
+
+    # the sets of tuples the metrics took before are still accepted
+    assert metrics.calculate_macro_average(predicted, reference) == pytest.approx(macro)
+    assert metrics.calculate_micro_average(predicted, reference)["f1_score"] == pytest.approx(micro["f1_score"])
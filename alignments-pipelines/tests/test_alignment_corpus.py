@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from alignment_pipelines.alignment_arrays import AlignmentArrays
+from alignment_pipelines.alignment_corpus import (AlignmentCorpus, AlignmentCorpusWriter, convert_pharaoh,
+                                                  convert_xlwa_tsv, is_alignment_corpus, iter_alignment_chunks,
+                                                  load_alignment_file)
+
+LINES = ["0-0 1-1 2p2", "", "3?1 0-4", "5-5"]
+
+
+def test_writer_round_trip(tmp_path):
+    file_path = str(tmp_path / "corpus.algn")
+    with AlignmentCorpusWriter(file_path, with_text=True) as writer:
+        writer.write([(0, 0), (1, 2)], [True, False], "a b", ["c", "d", "e"])
+        writer.write([], src="", tgt="f")
+        writer.write([(2, 0)], src="g h ĳ", tgt="k")
+
+    corpus = AlignmentCorpus(file_path)
+    assert is_alignment_corpus(file_path)
+    assert len(corpus) == 3
+    assert list(corpus) == [{(0, 0), (1, 2)}, set(), {(2, 0)}]
+    assert corpus[-1] == {(2, 0)}
+    assert corpus.sentence_text(0) == ("a b", "c d e")
+    assert corpus.sentence_text(2) == ("g h ĳ", "k")
+    assert list(corpus.sentence_pairs())[1] == ([], ["f"])
+    assert corpus.to_arrays().to_lines() == ["0-0 1p2", "", "2-0"]
+    assert corpus.to_arrays(1, 3).to_lines() == ["", "2-0"]
+    with pytest.raises(IndexError):
+        corpus[3]
+
+
+def test_writer_discards_on_error(tmp_path):
+    file_path = str(tmp_path / "corpus.algn")
+    with pytest.raises(ValueError):
+        with AlignmentCorpusWriter(file_path) as writer:
+            writer.write([(0, 70000)])
+    assert os.listdir(tmp_path) == []
+
+
+
+def test_close_removes_the_partial_output_on_error(tmp_path, monkeypatch):
+    file_path = str(tmp_path / "corpus.algn")
+    writer = AlignmentCorpusWriter(file_path)
+    writer.write([(0, 0)])
+
+    def fail(size):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(writer._links, "read", fail)
+    with pytest.raises(OSError):
+        writer.close()
+    assert os.listdir(tmp_path) == []
+
+def test_convert_pharaoh(tmp_path, write_lines):
+    pharaoh_fp = write_lines("gold.pharaoh", LINES)
+    output_fp = str(tmp_path / "gold.algn")
+    convert_pharaoh(pharaoh_fp, output_fp)
+
+    corpus = AlignmentCorpus(output_fp)
+    assert not corpus.has_text
+    assert corpus.to_arrays().to_lines() == AlignmentArrays.from_lines(LINES).to_lines()
+    assert load_alignment_file(output_fp).to_lines() == load_alignment_file(pharaoh_fp).to_lines()
+    assert [chunk.to_lines() for chunk in iter_alignment_chunks(output_fp, 3)] == \
+        [chunk.to_lines() for chunk in iter_alignment_chunks(pharaoh_fp, 3)]
+
+
+def test_convert_xlwa_tsv(tmp_path, write_lines):
+    tsv_fp = write_lines("test.tsv", [f"w{k} x y\tz{k} t\t{line}" for k, line in enumerate(LINES)])
+    output_fp = str(tmp_path / "test.algn")
+    convert_xlwa_tsv(tsv_fp, output_fp)
+
+    corpus = AlignmentCorpus(output_fp)
+    assert corpus.has_text
+    assert corpus.sentence_text(3) == ("w3 x y", "z3 t")
+    assert corpus.to_arrays().to_lines() == ["0-0 1-1 2p2", "", "3p1 0-4", "5-5"]
+
+    no_gold_fp = write_lines("no_gold.tsv", ["a\tb"])
+    with pytest.raises(ValueError):
+        convert_xlwa_tsv(no_gold_fp, str(tmp_path / "no_gold.algn"))
+    assert not os.path.exists(tmp_path / "no_gold.algn")
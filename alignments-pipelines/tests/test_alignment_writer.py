@@ -0,0 +1,165 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from alignment_pipelines.alignment_writer import AlignmentWriter
+from alignment_pipelines.corpus_driver import CorpusAlignmentDriver
+
+PAIRS = [("a b", "c d"), ("e", "f g"), ("h i j", "k")]
+
+
+def alignments(src, trg):
+    return {"inter": [(0, 0)], "mwmf": [(i, i) for i in range(min(len(src.split()), len(trg.split())))]}
+
+
+def read(fp):
+    with open(fp, 'r') as file:
+        return file.read()
+
+
+def test_close_renames_complete_outputs(tmp_path):
+    prefix = str(tmp_path / "out")
+    with AlignmentWriter(prefix, "simalign", "bert", "bpe") as writer:
+        for src, trg in PAIRS:
+            writer.write(alignments(src, trg), src, trg)
+    assert read(writer.output_fp("inter")) == "a b\tc d\t0-0\ne\tf g\t0-0\nh i j\tk\t0-0\n"
+    assert read(writer.output_fp("mwmf")).splitlines()[0] == "a b\tc d\t0-0 1-1"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_abort_discards_or_keeps_tmp_files(tmp_path):
+    prefix = str(tmp_path / "out")
+    with pytest.raises(RuntimeError):
+        with AlignmentWriter(prefix, "simalign", "bert", "bpe", output_format="pharaoh") as writer:
+            writer.write({"inter": [(0, 0)]})
+            raise RuntimeError
+    assert os.listdir(tmp_path) == []
+
+    writer = AlignmentWriter(prefix, "simalign", "bert", "bpe", output_format="pharaoh")
+    writer.write({"inter": [(0, 0)]})
+    writer.abort(discard=False)
+    assert read(f"{writer.output_fp('inter')}.tmp") == "0-0\n"
+    assert not os.path.exists(writer.output_fp("inter"))
+
+
+def test_resume_truncates_rows_after_the_checkpoint(tmp_path):
+    prefix = str(tmp_path / "out")
+    writer = AlignmentWriter(prefix, "simalign", "bert", "bpe", output_format="pharaoh")
+    writer.write({"inter": [(0, 0)]})
+    sizes = writer.flush()
+    writer.write({"inter": [(5, 5)]})  # lost in the interruption
+    writer.abort(discard=False)
+
+    with AlignmentWriter(prefix, "simalign", "bert", "bpe", output_format="pharaoh", sizes=sizes) as writer:
+        writer.write({"inter": [(1, 1)]})
+    assert read(writer.output_fp("inter")) == "0-0\n1-1\n"
+
+
+
+def test_resume_refuses_missing_or_short_tmp_files(tmp_path):
+    prefix = str(tmp_path / "out")
+    writer = AlignmentWriter(prefix, "simalign", "bert", "bpe", output_format="pharaoh", matching_methods=["inter"])
+    writer.write({"inter": [(0, 0)]})
+    sizes = writer.flush()
+    writer.abort(discard=False)
+    tmp_fp = f"{writer.output_fp('inter')}.tmp"
+
+    with pytest.raises(ValueError):  # not recorded in the checkpoint
+        AlignmentWriter(prefix, "simalign", "bert", "bpe", output_format="pharaoh", matching_methods=["inter", "mwmf"],
+                        sizes=sizes)
+    with pytest.raises(ValueError):  # shorter than recorded: never padded
+        AlignmentWriter(prefix, "simalign", "bert", "bpe", output_format="pharaoh", matching_methods=["inter"],
+                        sizes={"inter": sizes["inter"] + 10})
+    assert read(tmp_fp) == "0-0\n"
+    os.remove(tmp_fp)
+    with pytest.raises(ValueError):
+        AlignmentWriter(prefix, "simalign", "bert", "bpe", output_format="pharaoh", matching_methods=["inter"],
+                        sizes=sizes)
+    assert not os.path.exists(tmp_fp)
+
+class StubPipeline:
+    token_type = "bpe"
+
+    def __init__(self, fail_after=None, model="bert", matching_methods=("inter", "mwmf")):
+        self.fail_after = fail_after
+        self.model = model
+        self.aligner = SimpleNamespace(matching_methods=list(matching_methods))
+
+    def iter_batch(self, sentence_pairs, batch_size=32):
+        for k, (src, trg) in enumerate(sentence_pairs):
+            if k == self.fail_after:
+                raise KeyboardInterrupt
+            links = alignments(" ".join(src), " ".join(trg))
+            yield {method: links[method] for method in self.aligner.matching_methods}
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    input_fp = tmp_path / "corpus.tsv"
+    input_fp.write_text("".join(f"{src}\t{trg}\n" for src, trg in PAIRS * 10))
+    return str(input_fp)
+
+
+def test_driver_resumes_to_the_same_output(tmp_path, corpus):
+    reference = CorpusAlignmentDriver(StubPipeline())
+    reference.align_file(corpus, str(tmp_path / "reference"))
+
+    prefix = str(tmp_path / "resumed")
+    with pytest.raises(KeyboardInterrupt):
+        CorpusAlignmentDriver(StubPipeline(fail_after=17), checkpoint_every=5).align_file(corpus, prefix)
+    assert CorpusAlignmentDriver(StubPipeline(), checkpoint_every=5).align_file(corpus, prefix) == 15
+    for method in ("inter", "mwmf"):
+        assert read(reference.output_fp(prefix, method)) == read(reference.output_fp(str(tmp_path / "reference"),
+                                                                                     method))
+
+
+def test_driver_finishes_outputs_left_as_tmp_after_done(tmp_path, corpus, monkeypatch):
+    prefix = str(tmp_path / "out")
+    driver = CorpusAlignmentDriver(StubPipeline())
+    monkeypatch.setattr(AlignmentWriter, "close", lambda writer: writer.abort(discard=False))  # crash before renaming
+    driver.align_file(corpus, prefix)
+    assert not os.path.exists(driver.output_fp(prefix, "inter"))
+    monkeypatch.undo()
+
+    assert driver.align_file(corpus, prefix) == 0
+    assert len(read(driver.output_fp(prefix, "inter")).splitlines()) == 30
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_driver_starts_afresh_after_a_finished_run_of_another_config(tmp_path, corpus):
+    prefix = str(tmp_path / "out")
+    CorpusAlignmentDriver(StubPipeline(matching_methods=["inter"])).align_file(corpus, prefix)
+
+    driver = CorpusAlignmentDriver(StubPipeline(matching_methods=["mwmf"]))
+    assert driver.align_file(corpus, prefix) == 30
+    assert len(read(driver.output_fp(prefix, "inter")).splitlines()) == 30
+    assert len(read(driver.output_fp(prefix, "mwmf")).splitlines()) == 30
+    assert driver.align_file(corpus, prefix) == 0
+
+
+@pytest.mark.parametrize("changed", [{"model": "xlmr"}, {"matching_methods": ["inter"]}, {"input": True}])
+def test_driver_refuses_to_resume_another_config(tmp_path, corpus, changed):
+    prefix = str(tmp_path / "out")
+    with pytest.raises(KeyboardInterrupt):
+        CorpusAlignmentDriver(StubPipeline(fail_after=17), checkpoint_every=5).align_file(corpus, prefix)
+    tmp_files = {name: read(tmp_path / name) for name in os.listdir(tmp_path) if name.endswith(".tmp")}
+
+    input_fp = corpus
+    if changed.pop("input", False):
+        input_fp = str(tmp_path / "other.tsv")
+        os.replace(corpus, input_fp)
+    with pytest.raises(ValueError):
+        CorpusAlignmentDriver(StubPipeline(**changed), checkpoint_every=5).align_file(input_fp, prefix)
+    assert {name: read(tmp_path / name) for name in os.listdir(tmp_path) if name.endswith(".tmp")} == tmp_files
+
+
+def test_driver_refuses_to_resume_without_its_tmp_files(tmp_path, corpus):
+    prefix = str(tmp_path / "out")
+    driver = CorpusAlignmentDriver(StubPipeline(), checkpoint_every=5)
+    with pytest.raises(KeyboardInterrupt):
+        CorpusAlignmentDriver(StubPipeline(fail_after=17), checkpoint_every=5).align_file(corpus, prefix)
+    os.remove(f"{driver.output_fp(prefix, 'mwmf')}.tmp")
+    with pytest.raises(ValueError):
+        driver.align_file(corpus, prefix)
+    assert not os.path.exists(f"{driver.output_fp(prefix, 'mwmf')}.tmp")
@@ -0,0 +1,83 @@
+import random
+
+import numpy as np
+import pytest
+
+from alignment_pipelines.bootstrap import METRICS, bootstrap_scores, iter_resample_weights, micro_scores, paired_test
+from alignment_pipelines.calculate_metrics import AlignmentMetrics
+
+
+def random_lines(rng, n_sentences):
+    return [" ".join(f"{rng.randrange(6)}-{rng.randrange(6)}" for _ in range(rng.randint(0, 5)))
+            for _ in range(n_sentences)]
+
+
+@pytest.fixture
+def files(write_lines):
+    rng = random.Random(21)
+    gold = write_lines("gold.pharaoh", random_lines(rng, 120))
+    system_a = write_lines("a.pharaoh", random_lines(rng, 120))
+    system_b = write_lines("b.pharaoh", random_lines(rng, 120))
+    return gold, system_a, system_b
+
+
+def test_resample_weights():
+    blocks = list(iter_resample_weights(50, 600, seed=0, block_size=256))
+    assert [len(block) for block in blocks] == [256, 256, 88]
+    assert all(np.all(block.sum(axis=1) == 50) for block in blocks)
+    assert all(np.array_equal(a, b) for a, b in zip(blocks, iter_resample_weights(50, 600, seed=0, block_size=256)))
+
+
+def test_bootstrap_scores(files):
+    gold, system_a, _ = files
+    metrics = AlignmentMetrics(system_a, gold)
+    counts = metrics.sentence_counts()
+
+    samples = bootstrap_scores(counts, 300, seed=1, sentence_scores=metrics.sentence_scores)
+    assert samples["micro"].shape == samples["macro"].shape == (1, 300, len(METRICS))
+    np.testing.assert_array_equal(samples["micro"], bootstrap_scores(counts, 300, seed=1)["micro"])
+
+    # scores of the summed counts are the micro averages of evaluate()
+    micro = micro_scores([count.sum() for count in counts])
+    expected = metrics.evaluate()["micro_average"]
+    assert micro.tolist() == pytest.approx([expected[metric] for metric in METRICS])
+
+    with pytest.raises(ValueError):
+        bootstrap_scores([counts, tuple(count[:-1] for count in counts)], 10)
+
+
+def test_confidence_intervals_contain_estimate(files):
+    gold, system_a, _ = files
+    intervals = AlignmentMetrics(system_a, gold).confidence_intervals(500, seed=2)
+    for average in ("micro_average", "macro_average"):
+        for scores in intervals[average].values():
+            assert scores["low"] <= scores["estimate"] <= scores["high"]
+
+
+def test_paired_test_identical_systems(files):
+    gold, system_a, _ = files
+    comparison = AlignmentMetrics(system_a, gold).compare(AlignmentMetrics(system_a, gold), 200, seed=3)
+    for average in ("micro_average", "macro_average"):
+        for scores in comparison[average].values():
+            assert scores["difference"] == scores["low"] == scores["high"] == 0.0
+            assert scores["p_value"] == 1.0
+
+
+def test_paired_test_different_systems(files):
+    gold, system_a, system_b = files
+    comparison = AlignmentMetrics(system_a, gold).compare(AlignmentMetrics(system_b, gold), 500, seed=4)
+    for scores in comparison["micro_average"].values():
+        assert scores["difference"] == pytest.approx(scores["b"] - scores["a"])
+        assert scores["low"] <= scores["high"]
+        assert 0.0 <= scores["p_value"] <= 1.0
+
+    samples = np.zeros((4, len(METRICS)))
+    result = paired_test(samples, samples + 1.0, np.zeros(4), np.ones(4))
+    assert all(scores["p_value"] == 0.0 and scores["difference"] == 1.0 for scores in result.values())
+
+
+def test_compare_needs_same_reference(write_lines, files):
+    gold, system_a, _ = files
+    other_gold = write_lines("other_gold.pharaoh", random_lines(random.Random(0), 120))
+    with pytest.raises(ValueError):
+        AlignmentMetrics(system_a, gold).compare(AlignmentMetrics(system_a, other_gold), 10)
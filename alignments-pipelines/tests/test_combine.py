@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from alignment_pipelines.alignment_arrays import AlignmentArrays
+from alignment_pipelines.combine import METHODS, combine, combine_files
+
+NEIGHBOURS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def reference_symmetrize(forward, reverse, n_src, n_tgt, method):
+    """Grow-diag(-final(-and)) as in the pseudo-code of Koehn et al. (2003), scanning the whole grid."""
+    union = forward | reverse
+    alignment = forward & reverse
+    src_aligned = {s for s, _ in alignment}
+    tgt_aligned = {t for _, t in alignment}
+
+    def add(s, t):
+        alignment.add((s, t))
+        src_aligned.add(s)
+        tgt_aligned.add(t)
+
+    added = True
+    while added:
+        added = False
+        for s in range(n_src):
+            for t in range(n_tgt):
+                if (s, t) not in alignment:
+                    continue
+                for d_src, d_tgt in NEIGHBOURS:
+                    n_s, n_t = s + d_src, t + d_tgt
+                    if (n_s not in src_aligned or n_t not in tgt_aligned) and (n_s, n_t) in union:
+                        add(n_s, n_t)
+                        added = True
+    if method == "grow-diag":
+        return alignment
+    for direction in (forward, reverse):
+        for s in range(n_src):
+            for t in range(n_tgt):
+                if (s, t) not in direction or (s, t) in alignment:
+                    continue
+                if method == "grow-diag-final-and":
+                    free = s not in src_aligned and t not in tgt_aligned
+                else:
+                    free = s not in src_aligned or t not in tgt_aligned
+                if free:
+                    add(s, t)
+    return alignment
+
+
+def random_pair(rng):
+    """A forward and a reverse alignment that agree on part of a noisy diagonal, like SimAlign's."""
+    n_src, n_tgt = rng.randint(1, 12), rng.randint(1, 12)
+    links = [{(s, min(n_tgt - 1, max(0, round(s * n_tgt / n_src) + rng.randint(-1, 1))))
+              for s in range(n_src) if rng.random() < 0.9} for _ in range(2)]
+    for direction in links:
+        direction.update((rng.randrange(n_src), rng.randrange(n_tgt)) for _ in range(rng.randint(0, 3)))
+    return links[0], links[1], n_src, n_tgt
+
+
+@pytest.fixture(scope="module")
+def pairs():
+    rng = random.Random(0)
+    return [random_pair(rng) for _ in range(3000)]
+
+
+@pytest.mark.parametrize("method", ["grow-diag", "grow-diag-final", "grow-diag-final-and"])
+def test_grow_diag_matches_the_sequential_reference(pairs, method):
+    forward = AlignmentArrays.from_sets([pair[0] for pair in pairs])
+    reverse = AlignmentArrays.from_sets([pair[1] for pair in pairs])
+    combined = combine([forward, reverse], method)
+    assert [set(links) for links in combined] == [reference_symmetrize(*pair, method) for pair in pairs]
+
+
+def test_set_methods(pairs):
+    systems = [AlignmentArrays.from_sets([pair[k] for pair in pairs]) for k in range(2)]
+    systems.append(AlignmentArrays.from_sets([pair[0] ^ pair[1] for pair in pairs]))
+    sets = [list(system) for system in systems]
+    assert list(combine(systems, "intersection")) == [a & b & c for a, b, c in zip(*sets)]
+    assert list(combine(systems, "union")) == [a | b | c for a, b, c in zip(*sets)]
+    assert list(combine(systems, "vote")) == [(a & b) | (a & c) | (b & c) for a, b, c in zip(*sets)]
+    assert list(combine(systems, "vote", min_votes=1)) == list(combine(systems, "union"))
+
+
+def test_grow_diag_needs_two_inputs(pairs):
+    system = AlignmentArrays.from_sets([pair[0] for pair in pairs])
+    with pytest.raises(ValueError):
+        combine([system, system, system], "grow-diag")
+    with pytest.raises(ValueError):
+        combine([system], "unknown")
+
+
+def test_combine_files_streams_chunks(tmp_path, pairs):
+    fps = []
+    for k in range(2):
+        fps.append(str(tmp_path / f"{k}.pharaoh"))
+        with open(fps[-1], 'w') as outf:
+            outf.writelines(" ".join(f"{s}-{t}" for s, t in sorted(pair[k])) + "\n" for pair in pairs)
+    output_fp = str(tmp_path / "combined.pharaoh")
+    assert combine_files(fps, output_fp, "grow-diag-final", chunk_size=700) == len(pairs)
+    combined = AlignmentArrays.from_file(output_fp)
+    assert [set(links) for links in combined] == [reference_symmetrize(*pair, "grow-diag-final") for pair in pairs]
+    assert "grow-diag-final" in METHODS
@@ -0,0 +1,69 @@
+import pytest
+
+from alignment_pipelines.alignment_corpus import convert_xlwa_tsv
+from alignment_pipelines.corpus_reader import detect_format, iter_chunks, read_sentence_pairs
+
+XLWA = ["a b\tc d\t0-0 1-1", "e\tf g\t0p1", "h i j\tk\t", "l\tm\t0-0"]
+
+
+def test_detect_format(tmp_path, write_lines):
+    assert detect_format(write_lines("test.tsv", XLWA)) == "xlwa"
+    assert detect_format(write_lines("test.txt", ["a b ||| c d"])) == "parallel"
+    assert detect_format(write_lines("test.pharaoh", ["0-0 1-1"])) == "pharaoh"
+    convert_xlwa_tsv(write_lines("gold.tsv", XLWA), str(tmp_path / "test.algn"))
+    assert detect_format(str(tmp_path / "test.algn")) == "algn"
+
+
+def test_xlwa_chunks(write_lines):
+    chunks = list(iter_chunks(write_lines("test.tsv", XLWA), chunk_size=3))
+    assert [chunk.ids.tolist() for chunk in chunks] == [[0, 1, 2], [3]]
+    assert list(chunks[0]) == [(["a", "b"], ["c", "d"]), (["e"], ["f", "g"]), (["h", "i", "j"], ["k"])]
+    assert chunks[0].src_text(2) == "h i j" and chunks[0].trg_text(1) == "f g"
+    assert chunks[0].alignments.to_lines() == ["0-0 1-1", "0p1", ""]
+    assert chunks[1].alignments.to_lines() == ["0-0"]
+
+
+def test_words_are_split_on_single_spaces_only(write_lines):
+    # like the str.split(" ") the XL-WA gold word indices are counted with
+    sentences = ["a  b", " c d ", "e\u00a0f g", ""]
+    input_fp = write_lines("test.tsv", [f"{sentence}\tx" for sentence in sentences])
+    pairs = list(read_sentence_pairs(input_fp))
+    assert [src for src, _ in pairs] == [sentence.split(" ") if sentence else [] for sentence in sentences]
+    chunk = next(iter_chunks(input_fp))
+    assert [chunk.src_text(k) for k in range(len(chunk))] == sentences
+
+
+def test_other_formats(tmp_path, write_lines):
+    chunk, = iter_chunks(write_lines("test.txt", ["a b ||| c", "d ||| e f"]))
+    assert list(chunk) == [(["a", "b"], ["c"]), (["d"], ["e", "f"])]
+    assert chunk.alignments is None
+
+    chunk, = iter_chunks(write_lines("test.pharaoh", ["0-0 1-1", ""]))
+    assert not chunk.has_text
+    assert chunk.alignments.to_lines() == ["0-0 1-1", ""]
+    with pytest.raises(ValueError):
+        chunk.src_text(0)
+
+    convert_xlwa_tsv(write_lines("gold.tsv", XLWA), str(tmp_path / "test.algn"))
+    algn_chunks = list(iter_chunks(str(tmp_path / "test.algn"), chunk_size=3))
+    tsv_chunks = list(iter_chunks(write_lines("gold.tsv", XLWA), chunk_size=3))
+    for algn_chunk, tsv_chunk in zip(algn_chunks, tsv_chunks):
+        assert list(algn_chunk) == list(tsv_chunk)
+        assert algn_chunk.ids.tolist() == tsv_chunk.ids.tolist()
+        assert algn_chunk.alignments.to_lines() == tsv_chunk.alignments.to_lines()
+
+    with pytest.raises(ValueError):
+        list(iter_chunks(write_lines("bad.tsv", ["a\tb\tc\td"])))
+
+
+@pytest.mark.parametrize("file_format", ["xlwa", "algn"])
+def test_skip_resumes_at_the_same_pairs(tmp_path, write_lines, file_format):
+    input_fp = write_lines("test.tsv", XLWA)
+    if file_format == "algn":
+        convert_xlwa_tsv(input_fp, str(tmp_path / "test.algn"))
+        input_fp = str(tmp_path / "test.algn")
+    everything = list(read_sentence_pairs(input_fp))
+    for skip in range(len(XLWA) + 1):
+        assert list(read_sentence_pairs(input_fp, skip=skip, chunk_size=2)) == everything[skip:]
+        ids = [chunk.ids.tolist() for chunk in iter_chunks(input_fp, chunk_size=2, skip=skip)]
+        assert sum(ids, []) == list(range(skip, len(XLWA)))
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+
+from alignment_pipelines.embedding_cache import EmbeddingCache
+from alignment_pipelines.instrumentation import Instrumentation
+
+PAIRS = [("the cat sat".split(), "o gato sentou".split()), ("on the mat".split(), "no tapete".split())]
+
+
+def test_miss_then_hit(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"))
+    embeddings = np.arange(12, dtype=np.float32).reshape(3, 4)
+    assert cache.get("simalign-bert", ["a", "b"]) is None
+    cache.put("simalign-bert", ["a", "b"], embeddings)
+
+    cached = cache.get("simalign-bert", ["a", "b"])
+    np.testing.assert_array_equal(cached, embeddings)
+    assert isinstance(cached, np.memmap)
+    assert cache.get("simalign-xlmr", ["a", "b"]) is None  # other encoder configuration
+    assert cache.get("simalign-bert", ["a", "c"]) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert EmbeddingCache(str(tmp_path / "cache")).total_bytes == cache.total_bytes > 0
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"))
+    for k, word in enumerate("abc"):
+        cache.put("ns", [word], np.zeros((64, 4), dtype=np.float32))
+        os.utime(cache.path("ns", [word]), (k, k))
+    entry_bytes = cache.total_bytes // 3
+    os.utime(cache.path("ns", ["a"]), (10, 10))  # "b" then "c" are now the least recently used
+
+    # a fourth entry goes over the bound, eviction goes down to 90% of it: two entries
+    cache.max_bytes = 3 * entry_bytes
+    cache.put("ns", ["d"], np.zeros((64, 4), dtype=np.float32))
+    assert [cache.get("ns", [word]) is not None for word in "abcd"] == [True, False, False, True]
+    assert cache.total_bytes <= cache.max_bytes
+
+
+def test_pipeline_reruns_skip_the_encoder(tmp_path, tiny_model):
+    from alignment_pipelines.simAlignPipeline import SimAlignPipeline  # imports torch
+
+    cache = EmbeddingCache(str(tmp_path / "cache"))
+    pipeline = SimAlignPipeline(model=tiny_model, token_type="bpe", matching_methods="mai", embedding_cache=cache)
+    pipeline.instrumentation = first_run = Instrumentation()
+    expected = pipeline.run_batch(PAIRS)
+    assert first_run.counters["encoded_sentences"] == 4 and cache.misses == 4
+
+    pipeline.instrumentation = second_run = Instrumentation()
+    assert pipeline.run_batch(PAIRS) == expected
+    assert second_run.counters["encoded_sentences"] == 0 and cache.hits == 4
+
+    uncached = SimAlignPipeline(model=tiny_model, token_type="bpe", matching_methods="mai")
+    assert uncached.run_batch(PAIRS) == expected
@@ -0,0 +1,29 @@
+import pytest
+
+from alignment_pipelines.encoding import iter_windows, pack_by_length
+
+
+@pytest.mark.parametrize("max_length, stride", [(1, 1), (4, 4), (4, 1), (5, 3), (8, 6), (10, 7), (510, 382)])
+def test_windows_tile_every_sentence(max_length, stride):
+    for n_subwords in list(range(1, 60)) + [509, 510, 511, 1000, 1021]:
+        windows = list(iter_windows(n_subwords, max_length, stride))
+        kept = [position for _, _, keep_start, keep_end in windows for position in range(keep_start, keep_end)]
+        assert kept == list(range(n_subwords))
+        for start, end, keep_start, keep_end in windows:
+            assert 0 <= start <= keep_start < keep_end <= end <= n_subwords
+            assert end - start <= max_length
+        assert windows[-1][1] == n_subwords
+
+
+def test_short_sentences_are_one_window():
+    assert list(iter_windows(5, 8, 6)) == [(0, 5, 0, 5)]
+
+
+def test_pack_by_length_bounds_batches():
+    lengths = [5, 1, 9, 3, 3, 7, 2, 8]
+    batches = pack_by_length(lengths, max_batch_size=3, max_batch_tokens=16)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) <= 3
+        assert len(batch) == 1 or len(batch) * max(lengths[i] for i in batch) <= 16
+    assert [lengths[i] for batch in batches for i in batch] == sorted(lengths)
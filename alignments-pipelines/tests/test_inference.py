@@ -0,0 +1,57 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from alignment_pipelines.inference import bf16_available, prepare_encoder, truncate_layers  # noqa: E402
+
+LAYER = 4
+
+
+@pytest.fixture
+def encoder(tiny_model):
+    return transformers.AutoModel.from_pretrained(tiny_model).eval()
+
+
+@pytest.fixture(scope="module")
+def inputs():
+    generator = torch.Generator().manual_seed(0)
+    return {"input_ids": torch.randint(5, 60, (3, 9), generator=generator),
+            "attention_mask": torch.ones(3, 9, dtype=torch.long)}
+
+
+def hidden_states(model, inputs):
+    with torch.inference_mode():
+        return model(**inputs, output_hidden_states=True).hidden_states
+
+
+def test_truncation_keeps_the_align_layer(encoder, inputs):
+    expected = hidden_states(encoder, inputs)[LAYER]
+    assert truncate_layers(encoder, LAYER) == 4
+    assert len(encoder.encoder.layer) == LAYER and encoder.pooler is None
+    states = hidden_states(encoder, inputs)
+    assert len(states) == LAYER + 1
+    torch.testing.assert_close(states[LAYER], expected, rtol=0, atol=0)
+
+    with pytest.warns(UserWarning):
+        assert truncate_layers(encoder, LAYER + 1) == 0
+
+
+@pytest.mark.parametrize("precision", ["fp32", "bf16", "int8"])
+def test_reduced_precision_stays_close(encoder, inputs, precision):
+    expected = hidden_states(encoder, inputs)[LAYER]
+    model = prepare_encoder(encoder, LAYER, precision)
+    assert len(model.encoder.layer) == LAYER
+    if precision == "bf16" and bf16_available():
+        assert next(model.parameters()).dtype == torch.bfloat16
+    if precision == "int8":
+        assert not any(type(module) is torch.nn.Linear for module in model.modules())
+
+    states = hidden_states(model, inputs)[LAYER].float()
+    cosine = torch.nn.functional.cosine_similarity(states, expected, dim=-1)
+    assert cosine.min() > (0.9999 if precision == "fp32" else 0.95)
+
+
+def test_unknown_precision(encoder):
+    with pytest.raises(ValueError):
+        prepare_encoder(encoder, LAYER, "fp8")
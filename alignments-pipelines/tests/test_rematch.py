@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from alignment_pipelines.rematch import SimilarityMatrices, SimilarityWriter, main, match, rematch
+
+PAIRS = [("the cat sat on the mat".split(), "o gato sentou no tapete".split()),
+         ("cats sat".split(), "gatos sentou".split()),
+         ("mat".split(), "tapete".split()),
+         ("the zebra sat quietly on a mat".split(), "a zebra sentou quieta no tapete".split())]
+
+
+def random_matrices(rng, n_pairs):
+    for _ in range(n_pairs):
+        rows, cols = rng.integers(1, 12, size=2)
+        yield rng.random((rows, cols)), np.sort(rng.integers(0, rows, rows)), np.arange(cols)
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float16])
+def test_round_trip(tmp_path, dtype):
+    matrices = list(random_matrices(np.random.default_rng(0), 20))
+    with SimilarityWriter(str(tmp_path / "test.sim"), dtype=dtype) as writer:
+        for sim, src_map, trg_map in matrices:
+            writer.write(sim, src_map, trg_map)
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((2, 2)), [0], [0, 1])
+
+    stored = SimilarityMatrices(str(tmp_path / "test.sim"))
+    assert len(stored) == len(matrices)
+    for (sim, src_map, trg_map), (stored_sim, stored_src_map, stored_trg_map) in zip(matrices, stored):
+        np.testing.assert_allclose(stored_sim, sim.astype(dtype), rtol=0)
+        assert stored_src_map.tolist() == src_map.tolist() and stored_trg_map.tolist() == trg_map.tolist()
+
+
+def test_unknown_matching_method():
+    with pytest.raises(ValueError):
+        match(np.ones((2, 2)), [0, 1], [0, 1], ["argmax"])
+
+
+@pytest.mark.parametrize("token_type", ["bpe", "word"])
+def test_rematch_equals_a_pipeline_run(tmp_path, tiny_model, token_type):
+    from alignment_pipelines.simAlignPipeline import SimAlignPipeline  # imports torch
+
+    pipeline = SimAlignPipeline(model=tiny_model, token_type=token_type, matching_methods="mai")
+    with SimilarityWriter(str(tmp_path / "test.sim"), dtype=np.float32) as writer:
+        expected = pipeline.run_batch(PAIRS, batch_size=3, similarity_writer=writer)
+
+    assert list(rematch(str(tmp_path / "test.sim"), ("mwmf", "inter", "itermax"))) == expected
+    assert any(alignments["inter"] for alignments in expected)
+
+    main([str(tmp_path / "test.sim"), str(tmp_path / "out"), "--methods", "inter,softmax"])
+    with open(tmp_path / "out-inter.pharaoh") as inter:
+        assert inter.read().splitlines() == [" ".join(f"{i}-{j}" for i, j in alignments["inter"])
+                                             for alignments in expected]
+    assert (tmp_path / "out-softmax.pharaoh").read_text().count("\n") == len(PAIRS)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from alignment_pipelines.service import AlignmentService
+
+
+class StubPipeline:
+    """Aligns word i to word i, fails on empty sentences like the real similarity does."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def run_batch(self, sentence_pairs, batch_size=32):
+        self.batch_sizes.append(len(sentence_pairs))
+        results = []
+        for src, trg in sentence_pairs:
+            src, trg = (sentence.split() if isinstance(sentence, str) else sentence for sentence in (src, trg))
+            if not src or not trg:
+                raise ValueError("empty sentence")
+            results.append({"inter": [[i, i] for i in range(min(len(src), len(trg)))]})
+        return results
+
+
+async def request(port, body):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    content = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+    writer.write(b"POST /align HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % len(content) + content)
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+def serve_and(client):
+    async def main():
+        service = AlignmentService(StubPipeline(), max_batch_size=8, max_wait_ms=50)
+        server = await asyncio.start_server(service._handle_connection, "127.0.0.1", 0)
+        await service.start()
+        try:
+            return await client(service, server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+            await service.close()
+    return asyncio.run(main())
+
+
+def test_empty_sentence_is_rejected_before_batching():
+    async def client(service, port):
+        return await asyncio.gather(request(port, {"src": "a b", "trg": "c d"}),
+                                    request(port, {"src": "", "trg": "c d"}),
+                                    request(port, {"pairs": [["a", "b"], [[], ["c"]]]}))
+    good, empty, pairs = serve_and(client)
+    assert good == (200, {"alignments": {"inter": [[0, 0], [1, 1]]}})
+    assert empty[0] == 400
+    assert pairs[0] == 400 and pairs[1]["invalid_pairs"] == [1]
+
+
+def test_failing_pair_only_fails_its_own_request():
+    async def client(service, port):
+        service.pipeline.run_batch = _fail_on("boom", service.pipeline.run_batch)
+        return await asyncio.gather(request(port, {"src": "a b", "trg": "c d"}),
+                                    request(port, {"src": "boom", "trg": "c"}),
+                                    request(port, {"src": "e", "trg": "f"}))
+    first, failing, last = serve_and(client)
+    assert first == (200, {"alignments": {"inter": [[0, 0], [1, 1]]}})
+    assert failing[0] == 500
+    assert last == (200, {"alignments": {"inter": [[0, 0]]}})
+
+
+def test_malformed_request_gets_a_response():
+    async def client(service, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GARBAGE\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+        return response
+    assert serve_and(client).startswith(b"HTTP/1.1 400")
+
+
+
+def test_unexpected_errors_do_not_stop_the_batching_loop():
+    async def client(service, port):
+        record = service.latency.record
+
+        def record_once(latency):
+            service.latency.record = record
+            raise RuntimeError("bookkeeping failed")
+        service.latency.record = record_once
+        broken = await asyncio.wait_for(request(port, {"src": "a", "trg": "b"}), 10)
+
+        run_batch = service.pipeline.run_batch
+        service.pipeline.run_batch = lambda sentence_pairs, batch_size=32: []  # no alignments at all
+        missing = await asyncio.wait_for(request(port, {"src": "a", "trg": "b"}), 10)
+
+        service.pipeline.run_batch = run_batch
+        recovered = await asyncio.wait_for(request(port, {"src": "a", "trg": "b"}), 10)
+        return broken, missing, recovered, service.stats()
+    broken, missing, recovered, stats = serve_and(client)
+    assert broken[0] == 500 and missing[0] == 500
+    assert recovered == (200, {"alignments": {"inter": [[0, 0]]}})
+    assert stats["errors"] == 2
+
+def _fail_on(word, run_batch):
+    def failing(sentence_pairs, batch_size=32):
+        if any(src == word for src, _ in sentence_pairs):
+            raise RuntimeError(f"cannot align {word}")
+        return run_batch(sentence_pairs, batch_size)
+    return failing
@@ -0,0 +1,27 @@
+import pytest
+
+from alignment_pipelines.corpus_driver import CorpusAlignmentDriver
+from alignment_pipelines.sharded import ShardedAligner
+
+
+def test_sharded_outputs_equal_a_single_process_run(tmp_path, tiny_model, xlwa_corpus):
+    from alignment_pipelines.simAlignPipeline import SimAlignPipeline  # imports torch
+
+    driver = CorpusAlignmentDriver(SimAlignPipeline(model=tiny_model, token_type="bpe", matching_methods="mai"),
+                                   batch_size=4)
+    assert driver.align_file(xlwa_corpus, str(tmp_path / "single")) == 7
+
+    with ShardedAligner(tiny_model, "bpe", "mai", workers=2, threads_per_worker=1, chunk_size=2,
+                        batch_size=3) as aligner:
+        assert aligner.align_file(xlwa_corpus, str(tmp_path / "sharded")) == 7
+    for method in ("mwmf", "inter", "itermax"):
+        with open(driver.output_fp(str(tmp_path / "single"), method)) as single, \
+                open(aligner.output_fp(str(tmp_path / "sharded"), method)) as sharded:
+            rows = single.read()
+            assert sharded.read() == rows
+            assert rows.count("\n") == 7 and "-" in rows
+
+
+def test_unknown_output_format():
+    with pytest.raises(ValueError):
+        ShardedAligner("bert", "bpe", "mai", output_format="json")
@@ -0,0 +1,55 @@
+import random
+
+import pytest
+
+from alignment_pipelines.calculate_metrics import AlignmentMetrics, StreamingAlignmentMetrics
+
+
+def random_lines(rng, n_sentences):
+    return [" ".join(f"{rng.randrange(8)}-{rng.randrange(8)}" for _ in range(rng.randint(0, 6)))
+            for _ in range(n_sentences)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 10000])
+def test_streaming_matches_in_memory(write_lines, chunk_size):
+    rng = random.Random(chunk_size)
+    predicted = write_lines("predicted.pharaoh", random_lines(rng, 200))
+    reference = write_lines("reference.pharaoh", random_lines(rng, 200))
+
+    expected = AlignmentMetrics(predicted, reference)
+    streaming = StreamingAlignmentMetrics(predicted, reference, chunk_size=chunk_size)
+    results, expected_results = streaming.evaluate(), expected.evaluate()
+    for average in ("micro_average", "macro_average"):
+        assert results[average] == pytest.approx(expected_results[average])
+    for streamed, loaded in zip(streaming.sentence_counts(), expected.sentence_counts()):
+        assert streamed.tolist() == loaded.tolist()
+
+
+def test_streaming_line_count_mismatch(write_lines):
+    predicted = write_lines("predicted.pharaoh", ["0-0", "1-1", "2-2"])
+    reference = write_lines("reference.pharaoh", ["0-0", "1-0"])
+
+    with pytest.raises(ValueError):
+        StreamingAlignmentMetrics(predicted, reference, chunk_size=2).evaluate()
+    with pytest.raises(ValueError):
+        StreamingAlignmentMetrics(predicted, reference, chunk_size=2).sentence_counts()
+
+    with pytest.warns(UserWarning):
+        results = StreamingAlignmentMetrics(predicted, reference, chunk_size=2, strict=False).evaluate()
+    assert results["micro_average"]["precision"] == pytest.approx(0.5)
+    counts = StreamingAlignmentMetrics(predicted, reference, chunk_size=1, strict=False).sentence_counts()
+    assert [count.tolist() for count in counts] == \
+        [count.tolist() for count in AlignmentMetrics(predicted, reference).sentence_counts()]
+
+
+def test_streaming_inherits_the_in_memory_methods(write_lines):
+    rng = random.Random(3)
+    predicted = write_lines("predicted.pharaoh", random_lines(rng, 50))
+    reference = write_lines("reference.pharaoh", random_lines(rng, 50))
+
+    expected = AlignmentMetrics(predicted, reference)
+    streaming = StreamingAlignmentMetrics(predicted, reference, chunk_size=8)
+    assert list(streaming.predicted_alignments) == list(expected.predicted_alignments)
+    assert streaming.calculate_macro_average(streaming.predicted_alignments, streaming.reference_alignments) == \
+        pytest.approx(expected.evaluate()["macro_average"])
+    assert streaming.confidence_intervals(100, seed=0) == expected.confidence_intervals(100, seed=0)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from alignment_pipelines.tokenization import SubwordTokenizer, TokenizedSentence, pad_batch, pad_sub2word
+
+SENTENCES = [["the", "cats", "sat"], [], "o gato sentou no tapete", ["zebra", "mat", "the"], ["the", "cats", "sat"]]
+
+
+class WordByWordTokenizer:
+    """A tokenizer without batch word ids, like the slow transformers tokenizers."""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.name_or_path = tokenizer.name_or_path
+
+    def __len__(self):
+        return len(self.tokenizer)
+
+    def tokenize(self, word):
+        return self.tokenizer.tokenize(word)
+
+    def convert_tokens_to_ids(self, tokens):
+        return self.tokenizer.convert_tokens_to_ids(tokens)
+
+
+@pytest.fixture
+def tokenizers(tiny_model):
+    transformers = pytest.importorskip("transformers")
+    fast = transformers.AutoTokenizer.from_pretrained(tiny_model)
+    assert fast.is_fast
+    return fast, WordByWordTokenizer(fast)
+
+
+def test_word_offsets(tokenizers):
+    for tokenizer in tokenizers:
+        for words, tokenized in zip(SENTENCES, SubwordTokenizer(tokenizer).tokenize(SENTENCES)):
+            words = words.split() if isinstance(words, str) else words
+            word_tokens = [tokenizer.tokenize(word) for word in words]
+            assert tokenized.n_words == len(words)
+            assert tokenized.n_subwords == sum(len(tokens) for tokens in word_tokens)
+            for w, tokens in enumerate(word_tokens):
+                ids = tokenized.ids[tokenized.word_offsets[w]:tokenized.word_offsets[w + 1]]
+                assert ids.tolist() == tokenizer.convert_tokens_to_ids(tokens)
+            assert tokenized.sub2word().tolist() == [w for w, tokens in enumerate(word_tokens) for _ in tokens]
+
+    assert tokenized.n_subwords > tokenized.n_words  # "cats" is split into sub-words
+
+
+def test_memo_and_store(tmp_path, tokenizers):
+    fast, _ = tokenizers
+    tokenizer = SubwordTokenizer(fast, max_cached=2, cache_fp=str(tmp_path / "tokens.sqlite"))
+    expected = tokenizer.tokenize(SENTENCES)
+    assert (tokenizer.hits, tokenizer.misses) == (0, 4)  # the repeated sentence is tokenized once
+    assert len(tokenizer.memo) == 2
+
+    tokenizer.tokenize([SENTENCES[3]])
+    assert tokenizer.hits == 1
+
+    rerun = SubwordTokenizer(fast, cache_fp=str(tmp_path / "tokens.sqlite"))
+    for tokenized, cached in zip(expected, rerun.tokenize(SENTENCES)):
+        assert tokenized.ids.tolist() == cached.ids.tolist()
+        assert tokenized.word_offsets.tolist() == cached.word_offsets.tolist()
+    assert (rerun.hits, rerun.misses) == (4, 0)
+
+
+def test_pad_batch():
+    input_ids, attention_mask = pad_batch([np.array([7, 8]), np.array([], dtype=np.int32)], 2, 3, 0)
+    assert input_ids.tolist() == [[2, 7, 8, 3], [2, 3, 0, 0]]
+    assert attention_mask.tolist() == [[1, 1, 1, 1], [1, 1, 0, 0]]
+
+    tokenized = [TokenizedSentence(np.array([5, 6, 7]), np.array([0, 2, 3])),
+                 TokenizedSentence(np.array([5]), np.array([0, 1]))]
+    assert pad_sub2word(tokenized).tolist() == [[0, 0, 1], [0, -1, -1]]
@@ -1,10 +1,10 @@
 from alignment_pipelines import AwesomeAlignPipeline
-from dataclasses import dataclass, asdict
-from collections import defaultdict
+from dataclasses import dataclass
 import os
 
 @dataclass
 class AwesomeAlignConfig:
+    TOOL_NAME: str = "awesome"
     INP_FP: str = None
     OUT_FOLDER: str = None
     OUT_FP: str = None
@@ -39,60 +39,33 @@ class AwesomeAlignConfig:
 if __name__ == "__main__":
     import itertools
     import os
+    from alignment_pipelines.alignment_writer import AlignmentWriter
+    from alignment_pipelines.corpus_reader import iter_chunks
     langs = ["bg","da","es","et","hu","it","nl","pt","ru","sl"]
     file_type = ["dev","train","test"]
     combinations = itertools.product(langs, file_type)
+    configs = []
     for (lang, filetype_) in combinations: 
         config_dict = {
                 "INP_FP": f"../../data/XL-WA/data/{lang}/{filetype_}.tsv", 
                 "OUT_FOLDER": f'./outputs/XL-WA/data/{lang}/', 
-                "MODEL": "bert",
+                "MODEL": "bert-base-multilingual-cased",
                 "TOKEN_TYPE": "bpe",
-                "MATCHING_METHODS": "mai",
+                "MATCHING_METHODS": "softmax",
                 }
-        simAlignConfig = SimAlignConfig(**config_dict)
-        os.system(f'mkdir -p {config_dict["OUT_FOLDER"]}')
-        
-        # making an instance of our model.
-        # You can specify the embedding model and all alignment settings in the constructor.
-        pipeline = SimAlignPipeline(config=simAlignConfig)
-        models = defaultdict(
-                lambda: {
-                    "model_id": None,
-                    "alignments":{},
-                    }
-                )
+        configs.append(AwesomeAlignConfig(**config_dict))
+        os.makedirs(config_dict["OUT_FOLDER"], exist_ok=True)
+
+    # making an instance of our model, once for every file.
+    pipeline = AwesomeAlignPipeline(configs[0].INP_FP, model=configs[0].MODEL)
 
-        # The source and target sentences should be tokenized to words.
-        with open(simAlignConfig.INP_FP) as inpf:
-            for line in inpf:
-                print(line)
-                src, trg, gold = line.split("\t")
-                parallel_sent_pair_id = f"{src}-{trg}" 
-                src_sentence_tokens = src.split(" ")
-                trg_sentence_tokens = trg.split(" ")
-                print(src_sentence_tokens, trg_sentence_tokens)
-                alignments = pipeline(src_sentence_tokens, trg_sentence_tokens)
-                
-                print(alignments)
-                for matching_method in alignments:
-                    model_strategy_id = f"{simAlignConfig.MODEL}-{simAlignConfig.TOKEN_TYPE}-{matching_method}"
-                    print(matching_method, ":", alignments[matching_method])
-                    models[model_strategy_id]["model_id"] = model_strategy_id
-                    models[model_strategy_id]["alignments"][parallel_sent_pair_id] = alignments[matching_method]
-                print(models)
-                print(gold)
-            # The output is a dictionary with different matching methods.
-            # Each method has a list of pairs indicating the indexes of aligned words (The alignments are zero-indexed).
-            # Expected output:
-            # mwmf (Match): [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
-            # inter (ArgMax): [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
-            # itermax (IterMax): [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
-            for model_id, model_data in models.items():
-                m = model_data
-                model_output_fp = f'{simAlignConfig.OUT_FP}-{model_id}.tsv'
-                with open(model_output_fp,"w") as outf:
-                    for parallel_sent_pair_id, alignments_lst in m["alignments"].items():
-                        alignments_str = " ".join([f"{sIdx}-{tIdx}" for sIdx, tIdx in alignments_lst]) 
-                        tsv_row=f'{parallel_sent_pair_id}\t{alignments_str}\n'
-                        outf.write(tsv_row)
+    # Each file gets one "src\ttrg\talignments" output, e.g. {OUT_FP}-awesome-bert-base-multilingual-cased-bpe-softmax.tsv,
+    # written batch by batch in input order (one row per pair, line-aligned with the gold file)
+    # and renamed into place once the whole file is aligned.
+    for awesomeAlignConfig in configs:
+        with AlignmentWriter(awesomeAlignConfig.OUT_FP, awesomeAlignConfig.TOOL_NAME, awesomeAlignConfig.MODEL,
+                             awesomeAlignConfig.TOKEN_TYPE) as writer:
+            for chunk in iter_chunks(awesomeAlignConfig.INP_FP, pipeline.batch_size):
+                for k, alignments in enumerate(pipeline.align_batch(list(chunk))):
+                    writer.write({awesomeAlignConfig.MATCHING_METHODS: alignments},
+                                 chunk.src_text(k), chunk.trg_text(k))
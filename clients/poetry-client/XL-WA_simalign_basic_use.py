@@ -1,6 +1,5 @@
 from alignment_pipelines import SimAlignPipeline
-from dataclasses import dataclass, asdict
-from collections import defaultdict
+from dataclasses import dataclass
 import os
 
 @dataclass
@@ -40,9 +39,11 @@ class SimAlignConfig:
 if __name__ == "__main__":
     import itertools
     import os
+    from alignment_pipelines.corpus_driver import CorpusAlignmentDriver
     langs = ["bg","da","es","et","hu","it","nl","pt","ru","sl"]
     file_type = ["dev","train","test"]
     combinations = itertools.product(langs, file_type)
+    configs = []
     for (lang, filetype_) in combinations: 
         config_dict = {
                 "INP_FP": f"../../data/XL-WA/data/{lang}/{filetype_}.tsv", 
@@ -51,49 +52,19 @@ if __name__ == "__main__":
                 "TOKEN_TYPE": "bpe",
                 "MATCHING_METHODS": "mai",
                 }
-        simAlignConfig = SimAlignConfig(**config_dict)
-        os.system(f'mkdir -p {config_dict["OUT_FOLDER"]}')
-        
-        # making an instance of our model.
-        # You can specify the embedding model and all alignment settings in the constructor.
-        pipeline = SimAlignPipeline(config=simAlignConfig)
-        models = defaultdict(
-                lambda: {
-                    "model_id": None,
-                    "alignments":{},
-                    }
-                )
+        configs.append(SimAlignConfig(**config_dict))
+        os.makedirs(config_dict["OUT_FOLDER"], exist_ok=True)
+
+    # making an instance of our model, once for every file.
+    # You can specify the embedding model and all alignment settings in the constructor.
+    pipeline = SimAlignPipeline(config=configs[0])
+    driver = CorpusAlignmentDriver(pipeline, tool_name=configs[0].TOOL_NAME)
 
-        # The source and target sentences should be tokenized to words.
-        with open(simAlignConfig.INP_FP) as inpf:
-            for line in inpf:
-                print(line)
-                src, trg, gold = line.split("\t")
-                parallel_sent_pair_id = f"{src}-{trg}" 
-                src_sentence_tokens = src.split(" ")
-                trg_sentence_tokens = trg.split(" ")
-                print(src_sentence_tokens, trg_sentence_tokens)
-                alignments = pipeline(src_sentence_tokens, trg_sentence_tokens)
-                
-                print(alignments)
-                for matching_method in alignments:
-                    model_strategy_id = f"{simAlignConfig.TOOL_NAME}-{simAlignConfig.MODEL}-{simAlignConfig.TOKEN_TYPE}-{matching_method}"
-                    print(matching_method, ":", alignments[matching_method])
-                    models[model_strategy_id]["model_id"] = model_strategy_id
-                    models[model_strategy_id]["alignments"][parallel_sent_pair_id] = alignments[matching_method]
-                print(models)
-                print(gold)
-            # The output is a dictionary with different matching methods.
-            # Each method has a list of pairs indicating the indexes of aligned words (The alignments are zero-indexed).
-            # Expected output:
-            # mwmf (Match): [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
-            # inter (ArgMax): [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
-            # itermax (IterMax): [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
-            for model_id, model_data in models.items():
-                m = model_data
-                model_output_fp = f'{simAlignConfig.OUT_FP}-{model_id}.tsv'
-                with open(model_output_fp,"w") as outf:
-                    for parallel_sent_pair_id, alignments_lst in m["alignments"].items():
-                        alignments_str = " ".join([f"{sIdx}-{tIdx}" for sIdx, tIdx in alignments_lst]) 
-                        tsv_row=f'{src}\t{trg}\t{alignments_str}\n'
-                        outf.write(tsv_row)
+    # Each file gets one "src\ttrg\talignments" output per matching method,
+    # e.g. {OUT_FP}-simalign-bert-bpe-mwmf.tsv, written as pairs are aligned.
+    # Rerunning after an interruption resumes from the last checkpoint.
+    # Expected alignments:
+    # mwmf (Match): [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
+    # inter (ArgMax): [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
+    # itermax (IterMax): [(0, 0), (1, 1), (2, 2), (3, 3), (4, 4)]
+    driver.run((simAlignConfig.INP_FP, simAlignConfig.OUT_FP) for simAlignConfig in configs)